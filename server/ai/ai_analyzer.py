@@ -4,20 +4,42 @@ Analisador de IA para Oportunidades de Milhas
 
 import asyncio
 import json
+import time
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from openai import AsyncOpenAI
 import logging
 
-from config import OPENAI_API_KEY, OPENAI_MODEL, OPPORTUNITY_THRESHOLD
+from config import (
+    OPENAI_API_KEY, OPENAI_MODEL, OPENAI_BASE_URL, OPPORTUNITY_THRESHOLD, MARKET_MOVE_THRESHOLD,
+    LOCAL_CLASSIFIER_ENABLED, LOCAL_CLASSIFIER_MIN_CONFIDENCE
+)
+from local_classifier import LocalClassifier
+from message_parser import offer_from_analysis
+from snapshot import json_section, read_json
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AIAnalyzer:
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+        self.client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
         self.market_data = self._load_market_data()
+        self.market_version = 1
+        # Referência do último aviso aos listeners: deriva lenta acumula contra ela
+        self._market_anchors: Dict[str, float] = {
+            program: reference['avg_price'] for program, reference in self.market_data.items()
+        }
+        self._market_listeners: List[Callable[[str, int], None]] = []
+        
+        # Filtro local treinado com vereditos anteriores da OpenAI
+        self.local_classifier = LocalClassifier.load() if LOCAL_CLASSIFIER_ENABLED else None
+        self.analysis_stats = {'local_skips': 0, 'llm_calls': 0, 'budget_skips': 0}
+        
+        # Orçamento da LLM por rendimento de canal (definido pelo monitor do Telegram)
+        self.budget_scheduler = None
+        # Sem orçamento neste processo (monitor em processo separado): repassa o uso ao monitor
+        self.usage_listener: Optional[Callable[[str, Dict, float], None]] = None
         
     def _load_market_data(self) -> Dict:
         """Carrega dados de mercado para análise"""
@@ -30,14 +52,114 @@ class AIAnalyzer:
             'avios': {'avg_price': 52.0, 'price_range': (48.0, 56.0)}
         }
     
-    async def analyze_opportunity(self, message_data: Dict) -> Optional[Dict]:
+    def snapshot_section(self) -> Tuple[Dict, bytes]:
+        """Referências de mercado para o snapshot de warm start"""
+        return json_section({'market_data': self.market_data, 'market_version': self.market_version,
+                             'market_anchors': self._market_anchors})
+    
+    def restore_section(self, meta: Dict, payload, created_at: float) -> bool:
+        """Restaura referências de mercado e versão (mantém válidas as chaves dos caches)"""
+        state = read_json(payload)
+        self.market_data = {
+            program: {**reference, 'price_range': tuple(reference.get('price_range') or ())}
+            for program, reference in state['market_data'].items()
+        }
+        self.market_version = state['market_version']
+        self._market_anchors = state.get('market_anchors') or {
+            program: reference['avg_price'] for program, reference in self.market_data.items()
+        }
+        return True
+    
+    def add_market_listener(self, listener: Callable[[str, int], None]):
+        """Registra callback chamado quando o preço de referência muda significativamente"""
+        self._market_listeners.append(listener)
+    
+    def update_market_reference(self, program: str, avg_price: float,
+                                price_range: Optional[tuple] = None) -> bool:
+        """Atualiza preço de referência; retorna True se a variação foi significativa"""
+        program = program.lower()
+        current = self.market_data.get(program) or {}
+        anchor = self._market_anchors.get(program)
+        
+        # Variação medida contra a referência do último aviso, não contra a atualização anterior
+        if anchor:
+            variation = abs(avg_price - anchor) / anchor
+        else:
+            variation = 1.0
+        
+        if price_range:
+            price_range = tuple(price_range)
+        elif current.get('avg_price') and current.get('price_range'):
+            # Sem faixa informada: desloca a faixa anterior na mesma proporção do preço
+            scale = avg_price / current['avg_price']
+            price_range = tuple(round(bound * scale, 2) for bound in current['price_range'])
+        else:
+            price_range = (avg_price, avg_price)
+        
+        self.market_data[program] = {'avg_price': avg_price, 'price_range': price_range}
+        
+        if variation < MARKET_MOVE_THRESHOLD:
+            return False
+        
+        self._market_anchors[program] = avg_price
+        self.market_version += 1
+        logger.info(f"Referência de mercado alterada: {program} ({variation:.1%}), versão {self.market_version}")
+        
+        for listener in self._market_listeners:
+            try:
+                listener(program, self.market_version)
+            except Exception as e:
+                logger.error(f"Erro em listener de mercado: {e}")
+        
+        return True
+    
+    async def analyze_opportunity(self, message_data: Dict, raise_errors: bool = False) -> Optional[Dict]:
         """Analisa se a mensagem representa uma oportunidade de negócio"""
         try:
+            # Negativos com alta confiança são descartados sem chamar a OpenAI
+            if self.local_classifier and message_data.get('text'):
+                prediction = self.local_classifier.predict(message_data['text'])
+                if not prediction['is_opportunity'] and prediction['confidence'] >= LOCAL_CLASSIFIER_MIN_CONFIDENCE:
+                    message_data['verdict_source'] = 'local'
+                    self.analysis_stats['local_skips'] += 1
+                    return None
+            
+            # Toda chamada passa pelo orçamento; análises manuais (API) podem usar o orçamento inteiro
+            reservation = None
+            channel = message_data.get('channel')
+            manual = message_data.get('message_id') is None
+            if self.budget_scheduler:
+                reservation = await self.budget_scheduler.acquire(channel, ceiling=1.0 if manual else None)
+                if reservation is None:
+                    message_data['verdict_source'] = 'budget'
+                    self.analysis_stats['budget_skips'] += 1
+                    return None
+            
+            message_data['verdict_source'] = 'llm'
+            self.analysis_stats['llm_calls'] += 1
+            
             # Prepara contexto para IA
             context = self._prepare_analysis_context(message_data)
             
             # Chama OpenAI para análise
-            analysis = await self._call_openai_analysis(context)
+            usage = {}
+            started = time.monotonic()
+            analysis = await self._call_openai_analysis(context, raise_errors, usage)
+            
+            if analysis is None:
+                # Falha da API ou JSON inválido: sem veredito (não é um "não é oportunidade")
+                message_data['verdict_source'] = 'error'
+            
+            elapsed = time.monotonic() - started
+            if reservation is not None:
+                # Análise manual consome orçamento mas não entra no rendimento dos canais
+                self.budget_scheduler.record(
+                    channel, reservation, usage,
+                    None if analysis is None or manual else bool(analysis.get('is_opportunity', False)),
+                    elapsed
+                )
+            elif self.usage_listener and usage:
+                self.usage_listener(channel, usage, elapsed)
             
             if analysis and analysis.get('is_opportunity', False):
                 return self._format_analysis_result(analysis, message_data)
@@ -46,6 +168,9 @@ class AIAnalyzer:
             
         except Exception as e:
             logger.error(f"Erro na análise de IA: {e}")
+            message_data['verdict_source'] = 'error'
+            if raise_errors:
+                raise
             return None
     
     def _prepare_analysis_context(self, message_data: Dict) -> str:
@@ -84,7 +209,7 @@ class AIAnalyzer:
             "opportunity_type": "compra" ou "venda",
             "program": "nome do programa",
             "quantity": número de milhas,
-            "price_per_mile": preço por milha,
+            "price_per_thousand": preço por mil milhas em R$ (mesma unidade dos dados de mercado),
             "total_price": preço total,
             "cpf_count": número de CPFs,
             "market_comparison": {{
@@ -101,7 +226,8 @@ class AIAnalyzer:
         
         return context
     
-    async def _call_openai_analysis(self, context: str) -> Optional[Dict]:
+    async def _call_openai_analysis(self, context: str, raise_errors: bool = False,
+                                    usage: Optional[Dict] = None) -> Optional[Dict]:
         """Chama OpenAI para análise"""
         try:
             response = await self.client.chat.completions.create(
@@ -131,6 +257,11 @@ class AIAnalyzer:
             
             content = response.choices[0].message.content
             
+            # Consumo real de tokens (orçamento da LLM)
+            if usage is not None and getattr(response, 'usage', None):
+                usage['prompt_tokens'] = response.usage.prompt_tokens
+                usage['completion_tokens'] = response.usage.completion_tokens
+            
             # Tenta extrair JSON da resposta
             try:
                 # Remove markdown se presente
@@ -144,16 +275,26 @@ class AIAnalyzer:
                 
             except json.JSONDecodeError:
                 logger.error(f"Erro ao decodificar JSON da IA: {content}")
+                if raise_errors:
+                    raise
                 return None
                 
         except Exception as e:
             logger.error(f"Erro na chamada para OpenAI: {e}")
+            if raise_errors:
+                raise
             return None
     
     def _format_analysis_result(self, analysis: Dict, message_data: Dict) -> Dict:
         """Formata resultado da análise"""
+        # Id determinístico para mensagens do Telegram: reprocessar não duplica
+        if message_data.get('message_id') is not None:
+            opportunity_id = f"opp_{message_data.get('channel')}_{message_data['message_id']}"
+        else:
+            opportunity_id = f"opp_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_unknown"
+        
         return {
-            'id': f"opp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{message_data.get('message_id', 'unknown')}",
+            'id': opportunity_id,
             'timestamp': datetime.now().isoformat(),
             'source': {
                 'channel': message_data.get('channel'),
@@ -166,9 +307,16 @@ class AIAnalyzer:
             'is_opportunity': analysis.get('is_opportunity', False),
             'summary': analysis.get('summary', ''),
             'recommendation': analysis.get('recommendation', 'aguardar'),
-            'risk_level': analysis.get('risk_assessment', 'médio')
+            'risk_level': analysis.get('risk_assessment', 'médio'),
+            # Oferta normalizada da mensagem; sem capturas de regex, usa os números da IA
+            'offer': message_data.get('offer') or offer_from_analysis(analysis)
         }
     
+    def reload_local_classifier(self):
+        """Recarrega o classificador local do disco (após retreino)"""
+        if LOCAL_CLASSIFIER_ENABLED:
+            self.local_classifier = LocalClassifier.load()
+    
     async def analyze_market_trends(self, historical_data: List[Dict]) -> Dict:
         """Analisa tendências do mercado"""
         try:
@@ -236,7 +384,7 @@ class AIAnalyzer:
             RECOMENDAÇÕES PERSONALIZADAS DE MILHAS
             
             PERFIL DO USUÁRIO:
-            {json.dumps(user_profile, indent=2)}
+            {json.dumps(user_profile, indent=2, default=str)}
             
             DADOS DE MERCADO:
             {json.dumps(self.market_data, indent=2)}
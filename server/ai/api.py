@@ -2,17 +2,35 @@
 API FastAPI para Sistema de IA de Milhas
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 import asyncio
 import logging
-from datetime import datetime
+from datetime import date, datetime
 
 from telegram_monitor import TelegramMonitor
 from ai_analyzer import AIAnalyzer
 from database import DatabaseManager
+from recommendation_cache import RecommendationCache
+from expiry_scheduler import OpportunityExpiryScheduler
+from response_cache import ResponseCache, serialize
+from batch_analyzer import analyze_batch
+from message_archive import MessageArchive
+from price_alerts import PriceAlertIndex
+from monitor_supervisor import MonitorSupervisor
+from local_classifier import run_retraining_loop
+from snapshot import SnapshotManager
+from search_index import SearchIndex
+from rescorer import OpportunityRescorer
+from market_reference import MarketReferenceUpdater
+from config import (
+    RECOMMENDATION_PRECOMPUTE_ENABLED, ANALYZE_BATCH_MAX_ITEMS, ARCHIVE_ENABLED, MONITOR_MODE,
+    LOCAL_CLASSIFIER_ENABLED, SNAPSHOT_ENABLED, SEARCH_ENABLED, RESCORE_ENABLED,
+    MARKET_REFERENCE_ENABLED
+)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -33,6 +51,58 @@ app.add_middleware(
 ai_analyzer = AIAnalyzer()
 db_manager = DatabaseManager()
 telegram_monitor = None
+recommendation_cache = RecommendationCache()
+precompute_task = None
+expiry_scheduler = OpportunityExpiryScheduler(db_manager)
+expiry_task = None
+retraining_task = None
+response_cache = ResponseCache()
+message_archive = MessageArchive(db_manager)
+alert_index = PriceAlertIndex(db_manager)
+search_index = SearchIndex(db_manager) if SEARCH_ENABLED else None
+search_task = None
+rescorer = OpportunityRescorer(db_manager, ai_analyzer) if RESCORE_ENABLED else None
+market_reference = MarketReferenceUpdater(db_manager) if MARKET_REFERENCE_ENABLED else None
+market_reference_task = None
+# Referências de mercado e recomendações preservadas entre reinícios
+snapshots = SnapshotManager('api') if SNAPSHOT_ENABLED else None
+snapshot_task = None
+if snapshots:
+    snapshots.register('market', ai_analyzer.snapshot_section, ai_analyzer.restore_section)
+    snapshots.register('recommendations', recommendation_cache.snapshot_section, recommendation_cache.restore_section)
+# Em modo 'process', escritas do monitor chegam por IPC e disparam os mesmos listeners
+monitor_supervisor = MonitorSupervisor(on_write=db_manager.notify_write) if MONITOR_MODE == 'process' else None
+if monitor_supervisor:
+    # Orçamento da LLM fica no processo do monitor: chamadas da API entram na mesma janela
+    ai_analyzer.usage_listener = lambda channel, usage, elapsed: monitor_supervisor.send(
+        ('llm_usage', channel, usage, elapsed)
+    )
+
+def on_database_write(collection: str, document: Dict):
+    """Propaga escritas do banco para os caches"""
+    if collection == 'user_profiles':
+        recommendation_cache.invalidate(document.get('user_id'))
+    elif collection == 'market_data' and document.get('program') and document.get('avg_price') is not None:
+        ai_analyzer.update_market_reference(
+            document['program'],
+            document['avg_price'],
+            document.get('price_range')
+        )
+        # O analisador do processo do monitor tem suas próprias referências
+        if monitor_supervisor:
+            monitor_supervisor.send(
+                ('market_reference', document['program'], document['avg_price'], document.get('price_range'))
+            )
+
+db_manager.add_write_listener(on_database_write)
+db_manager.add_write_listener(expiry_scheduler.on_database_write)
+db_manager.add_write_listener(response_cache.on_database_write)
+if search_index:
+    db_manager.add_write_listener(search_index.on_database_write)
+ai_analyzer.add_market_listener(lambda program, version: recommendation_cache.clear())
+if rescorer:
+    # Referência moveu além de MARKET_MOVE_THRESHOLD: recalcula as oportunidades ativas do programa
+    ai_analyzer.add_market_listener(rescorer.on_market_move)
 
 # Modelos Pydantic
 class OpportunityResponse(BaseModel):
@@ -44,6 +114,34 @@ class OpportunityResponse(BaseModel):
     summary: str
     recommendation: str
     risk_level: str
+    offer: Optional[Dict] = None
+
+class OpportunityCardSource(BaseModel):
+    channel: Optional[str] = None
+    message_id: Optional[int] = None
+    author: Optional[str] = None
+
+class OpportunityCardAnalysis(BaseModel):
+    program: Optional[str] = None
+    opportunity_type: Optional[str] = None
+    quantity: Optional[int] = None
+    price_per_thousand: Optional[float] = None
+    price_per_mile: Optional[float] = None
+    total_price: Optional[float] = None
+    cpf_count: Optional[int] = None
+    market_comparison: Optional[Dict] = None
+
+class OpportunityCard(BaseModel):
+    """Campos de OPPORTUNITY_CARD_PROJECTION (listagem compacta)"""
+    id: str
+    timestamp: str
+    confidence: float
+    summary: str
+    recommendation: str
+    risk_level: str
+    source: OpportunityCardSource
+    analysis: OpportunityCardAnalysis
+    offer: Optional[Dict] = None
 
 class MarketDataRequest(BaseModel):
     program: str
@@ -59,6 +157,25 @@ class AIAnalysisRequest(BaseModel):
     text: str
     context: Optional[Dict] = None
 
+class PriceAlertRequest(BaseModel):
+    user_id: str
+    program: str
+    min_price: float
+    max_price: float
+    min_quantity: int = 0
+    side: str  # tipo de oferta observada: "compra" ou "venda"
+
+class AIBatchAnalysisRequest(BaseModel):
+    texts: List[str]
+    context: Optional[Dict] = None
+    skip_unstructured: bool = True
+
+def is_monitor_running() -> bool:
+    """Indica se o monitor do Telegram está ativo (processo supervisionado ou inline)"""
+    if monitor_supervisor:
+        return monitor_supervisor.is_running()
+    return telegram_monitor is not None
+
 # Endpoints da API
 
 @app.get("/")
@@ -78,8 +195,18 @@ async def health_check():
         "services": {
             "ai_analyzer": "online",
             "database": "online",
-            "telegram_monitor": "online" if telegram_monitor else "offline"
-        }
+            "telegram_monitor": "online" if is_monitor_running() else "offline"
+        },
+        "expiry_scheduler": expiry_scheduler.get_stats(),
+        "analysis": {
+            **ai_analyzer.analysis_stats,
+            "local_classifier": ai_analyzer.local_classifier.metadata if ai_analyzer.local_classifier else None
+        },
+        "response_cache": response_cache.get_stats(),
+        "snapshot": snapshots.get_stats() if snapshots else None,
+        "search": search_index.get_stats() if search_index else None,
+        "rescoring": rescorer.get_stats() if rescorer else None,
+        "market_reference": market_reference.get_stats() if market_reference else None
     }
 
 @app.post("/auth/login")
@@ -99,19 +226,94 @@ async def mock_login(credentials: dict):
         }
     }
 
-@app.get("/opportunities", response_model=List[OpportunityResponse])
+@app.get("/opportunities", response_model=List[OpportunityCard])
 async def get_opportunities(
+    request: Request,
     limit: int = 50,
     program: Optional[str] = None,
-    min_confidence: float = 0.7
+    min_confidence: float = 0.7,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_quantity: Optional[int] = None,
+    max_quantity: Optional[int] = None
+):
+    """Recupera oportunidades identificadas pela IA (campos do cartão; detalhes em /opportunities/{id})"""
+    async def load():
+        return await db_manager.get_opportunities(
+            limit, program, min_confidence, compact=True,
+            min_price=min_price, max_price=max_price,
+            min_quantity=min_quantity, max_quantity=max_quantity
+        )
+    
+    try:
+        return await response_cache.respond(request, ['opportunities'], load)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/offers")
+async def get_offers(
+    request: Request,
+    program: Optional[str] = None,
+    side: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_quantity: Optional[int] = None,
+    max_quantity: Optional[int] = None,
+    limit: int = 50
+):
+    """Ofertas normalizadas das mensagens por faixa de preço por mil e quantidade"""
+    async def load():
+        return await db_manager.get_offers(
+            program, side, min_price, max_price, min_quantity, max_quantity, limit
+        )
+    
+    try:
+        return await response_cache.respond(request, ['telegram_messages'], load)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/search")
+async def search(
+    request: Request,
+    q: str = '',
+    program: Optional[str] = None,
+    side: Optional[str] = None,
+    channel: Optional[str] = None,
+    kind: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    page: int = 1,
+    page_size: int = 20
 ):
-    """Recupera oportunidades identificadas pela IA"""
+    """Busca textual em mensagens e oportunidades com filtros e contagens por faceta"""
+    if not search_index:
+        raise HTTPException(status_code=404, detail="Busca desativada")
+    if not search_index.ready:
+        raise HTTPException(status_code=503, detail="Índice de busca em construção")
+    
+    async def load():
+        result = search_index.search(
+            q,
+            {'program': program, 'side': side, 'channel': channel, 'kind': kind},
+            date_from, date_to, max(page, 1), page_size
+        )
+        result['results'] = await search_index.fetch(result.pop('keys'))
+        return result
+    
     try:
-        opportunities = await db_manager.get_opportunities(limit, program, min_confidence)
-        return opportunities
+        return await response_cache.respond(request, ['telegram_messages', 'opportunities'], load)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/opportunities/{opportunity_id}", response_model=OpportunityResponse)
+async def get_opportunity(opportunity_id: str):
+    """Recupera oportunidade completa (análise, raciocínio e texto original)"""
+    opportunity = await db_manager.get_opportunity(opportunity_id)
+    if not opportunity:
+        raise HTTPException(status_code=404, detail="Oportunidade não encontrada")
+    
+    return Response(content=serialize(opportunity), media_type="application/json")
+
 @app.post("/analyze")
 async def analyze_text(request: AIAnalysisRequest):
     """Analisa texto com IA"""
@@ -126,29 +328,59 @@ async def analyze_text(request: AIAnalysisRequest):
         }
         
         analysis = await ai_analyzer.analyze_opportunity(message_data)
+        if message_data.get('verdict_source') == 'budget':
+            raise HTTPException(status_code=429, detail="Orçamento da LLM esgotado; tente novamente em instantes")
         return analysis
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analyze/batch")
+async def analyze_batch_texts(request: AIBatchAnalysisRequest):
+    """Analisa vários textos, retornando cada resultado em NDJSON assim que pronto"""
+    if len(request.texts) > ANALYZE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo de {ANALYZE_BATCH_MAX_ITEMS} textos por lote"
+        )
+    
+    async def stream():
+        async for item in analyze_batch(
+            ai_analyzer,
+            request.texts,
+            request.context,
+            request.skip_unstructured
+        ):
+            yield serialize(item) + b"\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @app.get("/market-data/{program}")
-async def get_market_data(program: str, days: int = 30):
+async def get_market_data(request: Request, program: str, days: int = 30):
     """Recupera dados de mercado históricos"""
-    try:
+    async def load():
         data = await db_manager.get_market_data(program, days)
         return {
             "program": program,
             "days": days,
             "data": data
         }
+    
+    try:
+        return await response_cache.respond(request, ['market_data'], load)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/statistics")
-async def get_statistics():
+async def get_statistics(request: Request):
     """Recupera estatísticas do sistema"""
     try:
-        stats = await db_manager.get_statistics()
-        return stats
+        return await response_cache.respond(
+            request,
+            ['opportunities', 'telegram_messages', 'ai_analyses'],
+            db_manager.get_statistics
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -191,11 +423,45 @@ async def get_ai_recommendations(user_id: str):
         if not profile:
             raise HTTPException(status_code=404, detail="Perfil não encontrado")
         
-        recommendations = await ai_analyzer.get_ai_recommendations(profile)
+        recommendations = await recommendation_cache.get_or_compute(
+            user_id,
+            profile,
+            ai_analyzer.market_version,
+            ai_analyzer.get_ai_recommendations
+        )
         return recommendations
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/alerts")
+async def create_price_alert(request: PriceAlertRequest):
+    """Cria regra de alerta de preço"""
+    try:
+        alert_id = await alert_index.add_alert(request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not alert_id:
+        raise HTTPException(status_code=500, detail="Erro ao salvar alerta")
+    
+    if monitor_supervisor:
+        monitor_supervisor.send('reload_alerts')
+    return {"message": "Alerta criado com sucesso", "id": alert_id}
+
+@app.get("/alerts/{user_id}")
+async def get_price_alerts(user_id: str):
+    """Lista regras de alerta de preço do usuário"""
+    return {"alerts": alert_index.get_user_alerts(user_id)}
+
+@app.delete("/alerts/{alert_id}")
+async def delete_price_alert(alert_id: str):
+    """Remove regra de alerta de preço"""
+    if await alert_index.remove_alert(alert_id):
+        if monitor_supervisor:
+            monitor_supervisor.send('reload_alerts')
+        return {"message": "Alerta removido com sucesso"}
+    raise HTTPException(status_code=404, detail="Alerta não encontrado")
+
 @app.post("/market-trends")
 async def analyze_market_trends(background_tasks: BackgroundTasks):
     """Analisa tendências do mercado"""
@@ -230,11 +496,17 @@ async def start_telegram_monitor(background_tasks: BackgroundTasks):
     """Inicia monitoramento do Telegram"""
     global telegram_monitor
     
+    if monitor_supervisor:
+        if monitor_supervisor.is_running():
+            return {"message": "Monitor já está rodando"}
+        monitor_supervisor.start()
+        return {"message": "Monitor iniciado com sucesso", "pid": monitor_supervisor.status()['pid']}
+    
     if telegram_monitor:
         return {"message": "Monitor já está rodando"}
     
     try:
-        telegram_monitor = TelegramMonitor()
+        telegram_monitor = TelegramMonitor(db=db_manager, ai_analyzer=ai_analyzer, alert_index=alert_index)
         background_tasks.add_task(telegram_monitor.start)
         return {"message": "Monitor iniciado com sucesso"}
     except Exception as e:
@@ -245,6 +517,12 @@ async def stop_telegram_monitor():
     """Para monitoramento do Telegram"""
     global telegram_monitor
     
+    if monitor_supervisor:
+        if not monitor_supervisor.desired_running:
+            return {"message": "Monitor não estava rodando"}
+        await monitor_supervisor.stop()
+        return {"message": "Monitor parado com sucesso"}
+    
     if telegram_monitor:
         await telegram_monitor.client.disconnect()
         telegram_monitor = None
@@ -252,12 +530,47 @@ async def stop_telegram_monitor():
     else:
         return {"message": "Monitor não estava rodando"}
 
+@app.get("/monitor/status")
+async def get_monitor_status():
+    """Status do monitoramento do Telegram"""
+    if monitor_supervisor:
+        return monitor_supervisor.status()
+    
+    return {
+        'mode': 'inline',
+        'state': 'running' if telegram_monitor else 'stopped'
+    }
+
+@app.get("/llm-budget")
+async def get_llm_budget():
+    """Uso do orçamento da LLM, rendimento por canal e decisões recentes do agendador"""
+    if monitor_supervisor:
+        stats = monitor_supervisor.last_status.get('llm_budget')
+    elif telegram_monitor and telegram_monitor.budget_scheduler:
+        stats = telegram_monitor.budget_scheduler.get_stats()
+    else:
+        stats = None
+    
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Orçamento da LLM indisponível (monitor parado ou orçamento desativado)")
+    return stats
+
 @app.post("/cleanup")
 async def cleanup_old_data(days: int = 90):
-    """Limpa dados antigos"""
+    """Arquiva mensagens/análises antigas em Parquet e limpa dados antigos"""
     try:
-        await db_manager.cleanup_old_data(days)
-        return {"message": f"Dados antigos (>{days} dias) removidos com sucesso"}
+        archive = {'archived': {}, 'failed': {}}
+        if ARCHIVE_ENABLED:
+            archive = await message_archive.archive_old_data(days)
+        
+        # Coleção cujo arquivamento falhou não é limpa: só sai do Mongo o que já está no Parquet
+        await db_manager.cleanup_old_data(days, skip=archive['failed'])
+        return {
+            "message": f"Dados antigos (>{days} dias) removidos com sucesso" if not archive['failed']
+                       else f"Limpeza parcial: arquivamento falhou em {', '.join(archive['failed'])}",
+            "archived": archive['archived'],
+            "archive_failed": archive['failed']
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -267,22 +580,87 @@ async def startup_event():
     """Inicializa serviços na startup"""
     logger.info("Iniciando SS Milhas AI API...")
     
-    # Inicia monitoramento em background
+    # Warm start: restaura o estado em memória do último snapshot válido
+    global snapshot_task
+    if snapshots:
+        snapshots.load()
+        snapshot_task = asyncio.create_task(snapshots.run())
+    
+    await db_manager.ensure_indexes()
+    await alert_index.load()
+    
+    # Índice de busca construído em background (/search responde 503 até ficar pronto)
+    global search_task
+    if search_index:
+        search_task = asyncio.create_task(search_index.build())
+    
+    # Referências de mercado a partir das ofertas recentes (dispara o recalculo das oportunidades)
+    global market_reference_task
+    if market_reference:
+        market_reference_task = asyncio.create_task(market_reference.run())
+    
+    # Expiração periódica de oportunidades
+    global expiry_task
+    expiry_task = asyncio.create_task(expiry_scheduler.run())
+    
+    # Inicia monitoramento em background (modo inline)
     global telegram_monitor
-    try:
-        telegram_monitor = TelegramMonitor()
-        # Não iniciamos automaticamente para evitar problemas de conexão
-        logger.info("Telegram Monitor configurado (não iniciado automaticamente)")
-    except Exception as e:
-        logger.error(f"Erro ao configurar Telegram Monitor: {e}")
+    if monitor_supervisor:
+        logger.info("Telegram Monitor em processo separado (não iniciado automaticamente)")
+    else:
+        try:
+            telegram_monitor = TelegramMonitor(db=db_manager, ai_analyzer=ai_analyzer, alert_index=alert_index)
+            # Não iniciamos automaticamente para evitar problemas de conexão
+            logger.info("Telegram Monitor configurado (não iniciado automaticamente)")
+        except Exception as e:
+            logger.error(f"Erro ao configurar Telegram Monitor: {e}")
+    
+    # Retreino periódico do classificador local
+    global retraining_task
+    if LOCAL_CLASSIFIER_ENABLED:
+        retraining_task = asyncio.create_task(run_retraining_loop(
+            db_manager,
+            ai_analyzer,
+            on_update=lambda: monitor_supervisor and monitor_supervisor.send('reload_classifier')
+        ))
+    
+    # Pré-cálculo de recomendações para usuários ativos
+    global precompute_task
+    if RECOMMENDATION_PRECOMPUTE_ENABLED:
+        precompute_task = asyncio.create_task(
+            recommendation_cache.run_precompute_loop(db_manager, ai_analyzer)
+        )
+        logger.info("Pré-cálculo de recomendações ativado")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Limpa recursos na shutdown"""
     global telegram_monitor
+    if monitor_supervisor:
+        await monitor_supervisor.stop()
+    
     if telegram_monitor:
         await telegram_monitor.client.disconnect()
     
+    if precompute_task:
+        precompute_task.cancel()
+    
+    if expiry_task:
+        expiry_task.cancel()
+    
+    if retraining_task:
+        retraining_task.cancel()
+    
+    if search_task:
+        search_task.cancel()
+    
+    if market_reference_task:
+        market_reference_task.cancel()
+    
+    if snapshots:
+        snapshot_task.cancel()
+        snapshots.save()
+    
     await db_manager.close()
     logger.info("SS Milhas AI API finalizada")
 
@@ -0,0 +1,335 @@
+"""
+Backtest Vetorizado dos Vereditos de Oportunidade contra Preços de Mercado Posteriores
+
+Carrega vereditos (oportunidades + mensagens descartadas) e market_data uma vez
+em arrays NumPy, calcula o resultado realizado de cada veredito com joins
+"as-of" vetorizados e varre as grades de OPPORTUNITY_THRESHOLD e
+MAX_PRICE_DEVIATION em uma passada por desvio.
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+import logging
+
+import numpy as np
+import orjson
+
+from config import (
+    OPPORTUNITY_THRESHOLD,
+    MAX_PRICE_DEVIATION,
+    BACKTEST_HORIZON_HOURS,
+    BACKTEST_THRESHOLD_GRID,
+    BACKTEST_DEVIATION_GRID,
+    BACKTEST_MIN_MARGIN
+)
+from message_parser import canonical_program, offer_from_analysis, parse_price, parse_quantity
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Chave do join: código do programa * escala + segundos (válido até o ano 2286)
+KEY_SCALE = 10 ** 10
+# Cotação mais antiga aceita como referência de um instante
+MAX_QUOTE_AGE = 48 * 3600
+# Lado da oferta observada: quem vende (compramos e revendemos) ou quem compra (vendemos a ele)
+SIDES = {'venda': 1, 'compra': -1}
+
+VERDICT_COLUMNS = ('time', 'program', 'side', 'price', 'quantity', 'confidence', 'is_opportunity')
+MARKET_COLUMNS = ('time', 'program', 'price')
+
+def _verdict_row(time: datetime, offer: Optional[Dict], confidence: float, is_opportunity: bool) -> Optional[tuple]:
+    """Linha numérica de um veredito; None sem programa, lado ou preço"""
+    if not offer or not time:
+        return None
+    program = canonical_program(offer.get('program'))
+    side = SIDES.get(offer.get('side'))
+    price = parse_price(offer.get('price_per_thousand'))
+    if not program or side is None or price is None:
+        return None
+    quantity = parse_quantity(offer.get('quantity'))
+    return (
+        int(time.timestamp()), program, side, float(price),
+        float(quantity) if quantity else np.nan, float(confidence or 0.0), is_opportunity
+    )
+
+def _to_arrays(rows: List[tuple], columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    arrays = {}
+    for name, column in zip(columns, values):
+        if name == 'program':
+            arrays[name] = np.array(column, dtype=object)
+        elif name == 'time':
+            arrays[name] = np.array(column, dtype=np.int64)
+        elif name == 'side':
+            arrays[name] = np.array(column, dtype=np.int8)
+        elif name == 'is_opportunity':
+            arrays[name] = np.array(column, dtype=bool)
+        else:
+            arrays[name] = np.array(column, dtype=np.float64)
+    return arrays
+
+async def load_verdicts(db, archive=None,
+                        start: Optional[datetime] = None,
+                        end: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+    """Vereditos históricos: positivos das oportunidades, negativos das mensagens (Mongo + arquivo)"""
+    start = start or datetime.min
+    end = end or datetime.now()
+    rows = []
+
+    cursor = db.opportunities.find(
+        {'created_at': {'$gte': start, '$lt': end}},
+        {'_id': 0, 'created_at': 1, 'confidence': 1, 'offer': 1, 'analysis': 1}
+    )
+    async for opportunity in cursor:
+        offer = opportunity.get('offer') or offer_from_analysis(opportunity.get('analysis') or {})
+        row = _verdict_row(opportunity['created_at'], offer, opportunity.get('confidence'), True)
+        if row:
+            rows.append(row)
+
+    # Negativos: mensagens com oferta que a IA (ou o filtro local) descartou
+    negative_filter = {
+        'processed_at': {'$gte': start, '$lt': end},
+        'offer.price_per_thousand': {'$ne': None},
+        'status': {'$in': ['analyzed', 'processed']},
+        'opportunity.is_opportunity': {'$ne': True}
+    }
+    cursor = db.telegram_messages.find(negative_filter, {'_id': 0, 'processed_at': 1, 'offer': 1})
+    async for message in cursor:
+        row = _verdict_row(message['processed_at'], message.get('offer'), 0.0, False)
+        if row:
+            rows.append(row)
+
+    if archive is not None:
+        table = await asyncio.to_thread(archive.scan, 'telegram_messages', start, end, ['processed_at', 'extra'])
+        for processed_at, extra in zip(table.column('processed_at').to_pylist(), table.column('extra').to_pylist()):
+            if not extra:
+                continue
+            fields = orjson.loads(extra)
+            opportunity = fields.get('opportunity') or {}
+            if fields.get('status') in ('analyzed', 'processed') and not opportunity.get('is_opportunity'):
+                row = _verdict_row(processed_at, fields.get('offer'), 0.0, False)
+                if row:
+                    rows.append(row)
+
+    logger.info(f"Vereditos carregados: {len(rows)}")
+    return _to_arrays(rows, VERDICT_COLUMNS)
+
+async def load_market(db, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+    """Série de preços médios por programa"""
+    query = {'avg_price': {'$ne': None}}
+    if start or end:
+        query['date'] = {'$gte': start or datetime.min, '$lt': end or datetime.now()}
+
+    rows = []
+    cursor = db.market_data.find(query, {'_id': 0, 'program': 1, 'date': 1, 'avg_price': 1})
+    async for point in cursor:
+        program = canonical_program(point.get('program'))
+        if program and point.get('date'):
+            rows.append((int(point['date'].timestamp()), program, float(point['avg_price'])))
+
+    logger.info(f"Cotações carregadas: {len(rows)}")
+    return _to_arrays(rows, MARKET_COLUMNS)
+
+def save_dataset(path: str, verdicts: Dict[str, np.ndarray], market: Dict[str, np.ndarray]):
+    """Salva os arrays para novas rodadas de ajuste sem consultar o Mongo"""
+    arrays = {f"verdicts_{name}": values for name, values in verdicts.items()}
+    arrays.update({f"market_{name}": values for name, values in market.items()})
+    # Programas como texto fixo (npz sem pickle)
+    for key in ('verdicts_program', 'market_program'):
+        arrays[key] = arrays[key].astype(str)
+    np.savez_compressed(path, **arrays)
+
+def load_dataset(path: str):
+    with np.load(path) as data:
+        verdicts = {name: data[f"verdicts_{name}"] for name in VERDICT_COLUMNS}
+        market = {name: data[f"market_{name}"] for name in MARKET_COLUMNS}
+    return verdicts, market
+
+class MarketSeries:
+    """Cotações ordenadas por (programa, tempo) para joins as-of vetorizados"""
+
+    def __init__(self, market: Dict[str, np.ndarray], programs: np.ndarray):
+        codes = np.searchsorted(programs, market['program'].astype(str))
+        keys = codes.astype(np.int64) * KEY_SCALE + market['time']
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.codes = codes[order]
+        self.times = market['time'][order]
+        self.prices = market['price'][order]
+
+    def asof(self, codes: np.ndarray, times: np.ndarray, max_age: int = MAX_QUOTE_AGE):
+        """Última cotação de cada programa até cada instante: (preços, instantes); NaN/-1 sem cotação"""
+        if not len(self.keys):
+            return np.full(len(codes), np.nan), np.full(len(codes), -1, dtype=np.int64)
+
+        index = np.searchsorted(self.keys, codes.astype(np.int64) * KEY_SCALE + times, side='right') - 1
+        clipped = np.clip(index, 0, None)
+        found = (index >= 0) & (self.codes[clipped] == codes) & (times - self.times[clipped] <= max_age)
+        return (
+            np.where(found, self.prices[clipped], np.nan),
+            np.where(found, self.times[clipped], -1)
+        )
+
+def realized_outcomes(verdicts: Dict[str, np.ndarray], series: MarketSeries,
+                      codes: np.ndarray, horizon_hours: float) -> Dict[str, np.ndarray]:
+    """Preço de referência na decisão, preço após o horizonte e lucro realizado por veredito"""
+    times = verdicts['time']
+
+    reference, _ = series.asof(codes, times)
+    future, future_times = series.asof(codes, times + int(horizon_hours * 3600))
+    # Sem cotação nova depois da decisão não há resultado realizado
+    future = np.where(future_times > times, future, np.nan)
+
+    price = verdicts['price']
+    deviation = (price - reference) / reference
+    profit_per_thousand = verdicts['side'] * (future - price)
+    quantity = np.nan_to_num(verdicts['quantity'], nan=1000.0)
+
+    return {
+        'reference': reference,
+        'future': future,
+        'deviation': deviation,
+        'profit_per_thousand': profit_per_thousand,
+        'profit': profit_per_thousand * quantity / 1000,
+        'valid': ~np.isnan(reference) & ~np.isnan(future)
+    }
+
+def sweep(verdicts: Dict[str, np.ndarray], outcomes: Dict[str, np.ndarray],
+          thresholds: Sequence[float], deviations: Sequence[float],
+          min_margin: float = BACKTEST_MIN_MARGIN) -> List[Dict]:
+    """Precisão, recall e lucro de cada (threshold, desvio máximo)"""
+    valid = outcomes['valid']
+    confidence = verdicts['confidence'][valid]
+    is_opportunity = verdicts['is_opportunity'][valid]
+    deviation = np.abs(outcomes['deviation'][valid])
+    profit = outcomes['profit'][valid]
+    good = outcomes['profit_per_thousand'][valid] > min_margin
+    total_good = int(good.sum())
+
+    # Ordena por confiança decrescente: "confiança >= t" vira um prefixo
+    order = np.argsort(-confidence, kind='stable')
+    sorted_confidence = -confidence[order]
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    prefix = np.searchsorted(sorted_confidence, -thresholds, side='right')
+
+    rows = []
+    for max_deviation in deviations:
+        accepted = (is_opportunity & (deviation <= max_deviation))[order]
+        cumulative_accepted = np.concatenate([[0], np.cumsum(accepted)])
+        cumulative_hits = np.concatenate([[0], np.cumsum(accepted & good[order])])
+        cumulative_profit = np.concatenate([[0.0], np.cumsum(np.where(accepted, profit[order], 0.0))])
+
+        for threshold, n in zip(thresholds, prefix):
+            count = int(cumulative_accepted[n])
+            hits = int(cumulative_hits[n])
+            total_profit = float(cumulative_profit[n])
+            rows.append({
+                'threshold': float(threshold),
+                'max_deviation': float(max_deviation),
+                'accepted': count,
+                'true_positives': hits,
+                'precision': round(hits / count, 4) if count else None,
+                'recall': round(hits / total_good, 4) if total_good else None,
+                'profit': round(total_profit, 2),
+                'profit_per_trade': round(total_profit / count, 2) if count else None
+            })
+
+    return rows
+
+def backtest(verdicts: Dict[str, np.ndarray],
+             market: Dict[str, np.ndarray],
+             horizons: Sequence[float] = BACKTEST_HORIZON_HOURS,
+             thresholds: Sequence[float] = BACKTEST_THRESHOLD_GRID,
+             deviations: Sequence[float] = BACKTEST_DEVIATION_GRID,
+             min_margin: float = BACKTEST_MIN_MARGIN) -> Dict:
+    """Relatório por horizonte: grade completa, melhor configuração e configuração atual"""
+    # A configuração em produção sempre entra na grade
+    thresholds = sorted(set(thresholds) | {OPPORTUNITY_THRESHOLD})
+    deviations = sorted(set(deviations) | {MAX_PRICE_DEVIATION})
+
+    verdict_programs = verdicts['program'].astype(str)
+    programs = np.unique(np.concatenate([verdict_programs, market['program'].astype(str)]))
+    series = MarketSeries(market, programs)
+    codes = np.searchsorted(programs, verdict_programs)
+
+    report = {'verdicts': int(len(verdicts['time'])), 'market_points': int(len(market['time'])), 'horizons': {}}
+    for hours in horizons:
+        outcomes = realized_outcomes(verdicts, series, codes, hours)
+        rows = sweep(verdicts, outcomes, thresholds, deviations, min_margin)
+        ranked = [row for row in rows if row['accepted']]
+
+        report['horizons'][str(hours)] = {
+            'realized': int(outcomes['valid'].sum()),
+            'good': int((outcomes['valid'] & (outcomes['profit_per_thousand'] > min_margin)).sum()),
+            'current': next(
+                row for row in rows
+                if row['threshold'] == OPPORTUNITY_THRESHOLD and row['max_deviation'] == MAX_PRICE_DEVIATION
+            ),
+            'best_profit': max(ranked, key=lambda row: row['profit'], default=None),
+            'best_precision': max(ranked, key=lambda row: (row['precision'], row['accepted']), default=None),
+            'grid': rows
+        }
+
+    return report
+
+def print_report(report: Dict, top: int = 10):
+    print(f"Vereditos: {report['verdicts']}  Cotações: {report['market_points']}")
+    for hours, result in report['horizons'].items():
+        print(f"\nHorizonte {hours}h: {result['realized']} resultados realizados, {result['good']} lucrativos")
+        header = f"{'threshold':>10}{'desvio':>8}{'aceitos':>9}{'acertos':>9}{'precisão':>10}{'recall':>8}{'lucro':>12}"
+        print(header)
+        print('-' * len(header))
+        current = result['current']
+        ranked = sorted(result['grid'], key=lambda row: -row['profit'])[:top]
+        for row in ranked + ([current] if current not in ranked else []):
+            marker = ' <- atual' if row is current else ''
+            print(f"{row['threshold']:>10}{row['max_deviation']:>8}{row['accepted']:>9}{row['true_positives']:>9}"
+                  f"{str(row['precision']):>10}{str(row['recall']):>8}{row['profit']:>12}{marker}")
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description="Backtest dos vereditos de oportunidade")
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--horizons', type=float, nargs='*', default=BACKTEST_HORIZON_HOURS)
+    parser.add_argument('--min-margin', type=float, default=BACKTEST_MIN_MARGIN)
+    parser.add_argument('--dataset', default=None, help="arquivo .npz com os arrays (reutilizado entre rodadas)")
+    parser.add_argument('--refresh', action='store_true', help="recarrega do Mongo mesmo com --dataset existente")
+    parser.add_argument('--report', default=None, help="arquivo JSON com o relatório completo")
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    async def fetch():
+        from database import DatabaseManager
+        from message_archive import MessageArchive
+
+        db = DatabaseManager()
+        start = datetime.now() - timedelta(days=args.days)
+        try:
+            verdicts = await load_verdicts(db, MessageArchive(db), start)
+            market = await load_market(db, start)
+        finally:
+            await db.close()
+        return verdicts, market
+
+    if args.dataset and os.path.exists(args.dataset) and not args.refresh:
+        verdicts, market = load_dataset(args.dataset)
+    else:
+        verdicts, market = asyncio.run(fetch())
+        if args.dataset:
+            save_dataset(args.dataset, verdicts, market)
+
+    started = time.perf_counter()
+    report = backtest(verdicts, market, args.horizons, min_margin=args.min_margin)
+    report['seconds'] = round(time.perf_counter() - started, 3)
+
+    print_report(report, args.top)
+    print(f"\nBacktest em {report['seconds']}s")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
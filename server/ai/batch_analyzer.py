@@ -0,0 +1,71 @@
+"""
+Análise em Lote de Mensagens com Concorrência Limitada
+"""
+
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+import logging
+
+from message_parser import extract_raw_data, normalize_offer
+from config import ANALYZE_BATCH_CONCURRENCY
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def analyze_batch(analyzer,
+                        texts: List[str],
+                        context: Optional[Dict] = None,
+                        skip_unstructured: bool = True,
+                        concurrency: int = ANALYZE_BATCH_CONCURRENCY) -> AsyncIterator[Dict]:
+    """Analisa vários textos e produz cada veredito assim que fica pronto"""
+    semaphore = asyncio.Semaphore(concurrency)
+    context = context or {}
+
+    # Textos idênticos são analisados uma única vez
+    indexes_by_text: Dict[str, List[int]] = {}
+    for index, text in enumerate(texts):
+        indexes_by_text.setdefault(text.strip(), []).append(index)
+
+    async def analyze_one(text: str) -> Dict:
+        raw_data = extract_raw_data(text)
+        if skip_unstructured and not raw_data:
+            return {'status': 'skipped', 'result': None}
+
+        message_data = {
+            'text': text,
+            'channel': context.get('channel', 'manual_analysis'),
+            'author': context.get('author', 'user'),
+            'date': datetime.now().isoformat(),
+            'raw_data': raw_data,
+            'offer': normalize_offer(raw_data)
+        }
+
+        async with semaphore:
+            try:
+                analysis = await analyzer.analyze_opportunity(message_data, raise_errors=True)
+            except Exception as e:
+                return {'status': 'error', 'result': None, 'error': str(e)}
+
+        if message_data.get('verdict_source') == 'budget':
+            return {'status': 'budget_skipped', 'result': None}
+
+        return {
+            'status': 'opportunity' if analysis else 'no_opportunity',
+            'result': analysis
+        }
+
+    async def run(text: str):
+        return text, await analyze_one(text)
+
+    tasks = [asyncio.create_task(run(text)) for text in indexes_by_text]
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            text, verdict = await next_done
+            for index in indexes_by_text[text]:
+                yield {'index': index, **verdict}
+    finally:
+        # Cliente desconectado: cancela o que ainda não terminou
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,161 @@
+"""
+Resolução Concorrente de Canais do Telegram com Cache Persistente de Entidades
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Iterable, Optional, Set
+import logging
+
+import orjson
+from telethon import utils
+from telethon.errors import (
+    ChannelInvalidError,
+    ChannelPrivateError,
+    FloodWaitError,
+    UsernameInvalidError,
+    UsernameNotOccupiedError
+)
+from telethon.tl.types import Channel, InputPeerChannel
+
+from config import (
+    TELEGRAM_ENTITY_CACHE_PATH,
+    TELEGRAM_RESOLVE_CONCURRENCY,
+    TELEGRAM_RESOLVE_RETRIES,
+    TELEGRAM_RESOLVE_MAX_FLOOD_WAIT
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Erros que não se resolvem tentando de novo
+PERMANENT_ERRORS = (ValueError, UsernameInvalidError, UsernameNotOccupiedError, ChannelPrivateError, ChannelInvalidError)
+
+class EntityCache:
+    """Canal -> id e access_hash em disco (estáveis para a mesma conta)"""
+
+    def __init__(self, path: str = TELEGRAM_ENTITY_CACHE_PATH):
+        self.path = path
+        self._entries: Dict[str, Dict] = {}
+
+    def load(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, 'rb') as f:
+                self._entries = orjson.loads(f.read())
+        except Exception as e:
+            logger.error(f"Cache de entidades ignorado: {e}")
+            self._entries = {}
+        return len(self._entries)
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + '.tmp', 'wb') as f:
+                f.write(orjson.dumps(self._entries))
+            os.replace(self.path + '.tmp', self.path)
+        except Exception as e:
+            logger.error(f"Erro ao gravar cache de entidades: {e}")
+
+    def get(self, channel: str) -> Optional[InputPeerChannel]:
+        entry = self._entries.get(channel)
+        return InputPeerChannel(entry['id'], entry['access_hash']) if entry else None
+
+    def set(self, channel: str, entity: Channel):
+        self._entries[channel] = {'id': entity.id, 'access_hash': entity.access_hash}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class ChannelResolver:
+    def __init__(self, client, cache: Optional[EntityCache] = None,
+                 concurrency: int = TELEGRAM_RESOLVE_CONCURRENCY):
+        self.client = client
+        self.cache = cache or EntityCache()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # FLOOD_WAIT vale para a conta inteira: pausa todas as chamadas
+        self._paused_until = 0.0
+
+        self.cache_hits = 0
+        self.network_calls = 0
+        self.flood_waits = 0
+        # Canal -> último erro; só os transitórios voltam a ser tentados
+        self.failed: Dict[str, str] = {}
+        self.retryable: Set[str] = set()
+
+    async def _wait_for_flood(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _fetch(self, channel: str) -> Optional[InputPeerChannel]:
+        """get_entity com limite de concorrência, respeitando FLOOD_WAIT"""
+        for attempt in range(TELEGRAM_RESOLVE_RETRIES):
+            entity = None
+            async with self._semaphore:
+                await self._wait_for_flood()
+                try:
+                    self.network_calls += 1
+                    entity = await self.client.get_entity(channel)
+                except FloodWaitError as e:
+                    self.flood_waits += 1
+                    self.failed[channel] = f"FLOOD_WAIT de {e.seconds}s"
+                    if e.seconds > TELEGRAM_RESOLVE_MAX_FLOOD_WAIT:
+                        break
+                    logger.warning(f"FLOOD_WAIT de {e.seconds}s ao resolver {channel}")
+                    self._paused_until = max(self._paused_until, time.monotonic() + e.seconds)
+                except PERMANENT_ERRORS as e:
+                    self.failed[channel] = str(e)
+                    self.retryable.discard(channel)
+                    return None
+                except Exception as e:
+                    self.failed[channel] = str(e)
+                    logger.warning(f"Erro ao resolver {channel} (tentativa {attempt + 1}): {e}")
+
+            if entity is None:
+                # Backoff fora do semáforo: não ocupa a vaga de outros canais
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            if not isinstance(entity, Channel):
+                self.failed[channel] = f"entidade não é canal/supergrupo: {type(entity).__name__}"
+                self.retryable.discard(channel)
+                return None
+
+            self.cache.set(channel, entity)
+            self.failed.pop(channel, None)
+            self.retryable.discard(channel)
+            return utils.get_input_peer(entity)
+
+        self.retryable.add(channel)
+        return None
+
+    async def resolve(self, channel: str) -> Optional[InputPeerChannel]:
+        cached = self.cache.get(channel)
+        if cached:
+            self.cache_hits += 1
+            return cached
+        return await self._fetch(channel)
+
+    async def resolve_all(self, channels: Iterable[str]) -> Dict[str, InputPeerChannel]:
+        """Resolve todos os canais em paralelo; os que falharem ficam em self.failed"""
+        channels = list(channels)
+        resolved = await asyncio.gather(*(self.resolve(channel) for channel in channels))
+        self.cache.save()
+        return {channel: peer for channel, peer in zip(channels, resolved) if peer is not None}
+
+    def get_stats(self) -> Dict:
+        return {
+            'cached_entities': len(self.cache),
+            'cache_hits': self.cache_hits,
+            'network_calls': self.network_calls,
+            'flood_waits': self.flood_waits,
+            'failed': dict(self.failed),
+            'retrying': sorted(self.retryable)
+        }
+
+def peer_chat_id(peer: InputPeerChannel) -> int:
+    """Id marcado (-100...) usado por event.chat_id"""
+    return utils.get_peer_id(peer)
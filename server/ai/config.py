@@ -10,6 +10,7 @@ load_dotenv()
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 OPENAI_MODEL = 'gpt-4-turbo-preview'
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # opcional: proxy ou servidor compatível (ex.: testes de carga)
 
 # Telegram Configuration
 TELEGRAM_API_ID = int(os.getenv('TELEGRAM_API_ID', 0))
@@ -33,10 +34,121 @@ TELEGRAM_CHANNELS = [
     'LATAM_PASS_NEGOCIOS'
 ]
 
+# Channel Resolution Settings
+TELEGRAM_ENTITY_CACHE_PATH = os.getenv(
+    'TELEGRAM_ENTITY_CACHE_PATH', os.path.join(os.path.dirname(__file__), 'cache', 'telegram_entities.json')
+)
+TELEGRAM_RESOLVE_CONCURRENCY = 4  # chamadas get_entity simultâneas
+TELEGRAM_RESOLVE_RETRIES = 3
+TELEGRAM_RESOLVE_MAX_FLOOD_WAIT = 300  # segundos; esperas maiores adiam o canal para nova tentativa
+TELEGRAM_RESOLVE_RETRY_INTERVAL = 600  # segundos entre novas tentativas de canais não resolvidos
+
+# Monitor Runtime Settings
+# 'process': monitor em processo separado supervisionado; 'inline': no event loop da API
+MONITOR_MODE = os.getenv('MONITOR_MODE', 'process')
+MONITOR_HEARTBEAT_INTERVAL = 5  # segundos
+MONITOR_RESTART_BACKOFF_MAX = 60  # segundos
+MONITOR_STOP_TIMEOUT = 10  # segundos
+
 # AI Analysis Settings
 ANALYSIS_INTERVAL = 30  # segundos
 OPPORTUNITY_THRESHOLD = 0.8  # threshold de confiança para oportunidades
 MAX_PRICE_DEVIATION = 0.15  # 15% de desvio máximo de preço
+MARKET_MOVE_THRESHOLD = 0.05  # variação de preço de referência considerada significativa
+
+# Market Reference Settings (preço de referência derivado das ofertas recentes dos canais)
+MARKET_REFERENCE_ENABLED = os.getenv('MARKET_REFERENCE_ENABLED', 'true').lower() == 'true'
+MARKET_REFERENCE_INTERVAL = 15 * 60  # segundos entre recálculos
+MARKET_REFERENCE_WINDOW_HOURS = 24
+MARKET_REFERENCE_MIN_SAMPLES = 20  # ofertas mínimas para substituir a referência de um programa
+
+# Re-scoring Settings (oportunidades ativas recalculadas quando a referência de mercado muda)
+RESCORE_ENABLED = os.getenv('RESCORE_ENABLED', 'true').lower() == 'true'
+RESCORE_CONFIDENCE_WEIGHT = 1.0  # confiança por unidade de vantagem de preço (desvio relativo)
+RESCORE_MAX_ADJUSTMENT = 0.3  # ajuste máximo sobre a confiança original da análise
+RESCORE_BATCH_SIZE = 1000
+
+# Recommendation Cache Settings
+RECOMMENDATION_CACHE_TTL = 6 * 3600  # segundos
+RECOMMENDATION_CACHE_MAX_ENTRIES = 5000
+RECOMMENDATION_PRECOMPUTE_ENABLED = os.getenv('RECOMMENDATION_PRECOMPUTE_ENABLED', 'false').lower() == 'true'
+RECOMMENDATION_PRECOMPUTE_INTERVAL = 15 * 60  # segundos
+RECOMMENDATION_ACTIVE_WINDOW = 24 * 3600  # usuários com pedidos nas últimas 24h
+
+# Local Classifier Settings (filtro local antes da OpenAI)
+LOCAL_CLASSIFIER_ENABLED = os.getenv('LOCAL_CLASSIFIER_ENABLED', 'true').lower() == 'true'
+LOCAL_CLASSIFIER_PATH = os.getenv('LOCAL_CLASSIFIER_PATH', os.path.join(os.path.dirname(__file__), 'models', 'local_classifier.npz'))
+LOCAL_CLASSIFIER_FEATURES = 2 ** 18  # dimensões do hashing de n-gramas
+LOCAL_CLASSIFIER_MIN_CONFIDENCE = 0.95  # confiança mínima para descartar sem chamar a OpenAI
+LOCAL_CLASSIFIER_MIN_AGREEMENT = 0.98  # concordância mínima com a LLM para ativar um modelo novo
+LOCAL_CLASSIFIER_MIN_SAMPLES = 500
+LOCAL_CLASSIFIER_RETRAIN_INTERVAL = 24 * 3600  # segundos
+LOCAL_CLASSIFIER_BATCH_SIZE = 64  # exemplos por mini-lote do SGD
+
+# LLM Budget Settings (orçamento global por minuto, priorizado pelo rendimento do canal)
+LLM_BUDGET_ENABLED = os.getenv('LLM_BUDGET_ENABLED', 'true').lower() == 'true'
+LLM_BUDGET_TOKENS_PER_MINUTE = int(os.getenv('LLM_BUDGET_TOKENS_PER_MINUTE', 60000))  # 0 = sem limite
+LLM_BUDGET_COST_PER_MINUTE = float(os.getenv('LLM_BUDGET_COST_PER_MINUTE', 1.0))  # USD; 0 = sem limite
+LLM_COST_PER_1K_PROMPT_TOKENS = 0.01  # USD
+LLM_COST_PER_1K_COMPLETION_TOKENS = 0.03  # USD
+LLM_BUDGET_ESTIMATED_TOKENS = 1500  # estimativa inicial por chamada (ajustada pelo uso real)
+LLM_BUDGET_LOW_YIELD_SHARE = 0.5  # fração do orçamento acessível ao canal de menor rendimento
+LLM_BUDGET_MAX_DEFER = 20  # segundos que uma mensagem pode esperar por orçamento
+LLM_BUDGET_SAMPLE_RATE = 0.1  # amostra de mensagens acima do teto (mantém o rendimento estimado)
+LLM_YIELD_WINDOW_DAYS = 30
+LLM_YIELD_PRIOR_MESSAGES = 20  # peso da taxa global em canais com pouco histórico
+LLM_YIELD_REFRESH_INTERVAL = 600  # segundos
+
+# Backtest Settings (vereditos históricos x preços de mercado posteriores)
+BACKTEST_HORIZON_HOURS = [6, 24, 72]
+BACKTEST_THRESHOLD_GRID = [round(0.5 + 0.05 * i, 2) for i in range(10)]  # OPPORTUNITY_THRESHOLD
+BACKTEST_DEVIATION_GRID = [round(0.05 * i, 2) for i in range(1, 11)]  # MAX_PRICE_DEVIATION
+BACKTEST_MIN_MARGIN = 0.0  # lucro mínimo por mil milhas para contar como acerto
+
+# Search Settings (índice invertido em memória sobre mensagens e oportunidades)
+SEARCH_ENABLED = os.getenv('SEARCH_ENABLED', 'true').lower() == 'true'
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_FACET_LIMIT = 20  # valores por faceta
+SEARCH_BUILD_BATCH_SIZE = 5000
+
+# Batch Analysis Settings
+ANALYZE_BATCH_MAX_ITEMS = 1000
+ANALYZE_BATCH_CONCURRENCY = 16  # chamadas simultâneas à OpenAI por lote
+
+# Ingestion Dedup Settings
+DEDUP_BLOOM_CAPACITY = 2_000_000  # mensagens
+DEDUP_BLOOM_ERROR_RATE = 0.001
+DEDUP_WINDOW_DAYS = 30  # mensagens carregadas no filtro na inicialização
+
+# Response Cache Settings
+RESPONSE_CACHE_TTL = 60  # segundos; limite para escritas feitas por outros processos
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+
+# Opportunity Expiry Settings (segundos)
+OPPORTUNITY_DEFAULT_TTL = 6 * 3600
+# Chaves: 'programa:tipo', 'programa' ou 'tipo' (nesta ordem de prioridade)
+OPPORTUNITY_TTL = {
+    'venda': 4 * 3600,
+    'compra': 6 * 3600,
+    'livelo': 12 * 3600,
+    'iberia': 12 * 3600,
+    'avios': 12 * 3600
+}
+OPPORTUNITY_EXPIRY_INTERVAL = 60  # intervalo entre verificações de expiração
+OPPORTUNITY_EXPIRY_BATCH_SIZE = 500
+OPPORTUNITY_EXPIRY_SWEEP_EVERY = 10  # verificações entre varreduras completas no banco
+
+# Archive Settings (Parquet)
+ARCHIVE_ENABLED = os.getenv('ARCHIVE_ENABLED', 'true').lower() == 'true'
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(os.path.dirname(__file__), 'archive'))
+ARCHIVE_CHUNK_SIZE = 5000  # documentos por arquivo/lote de exclusão
+ARCHIVE_COMPRESSION = 'zstd'
+
+# Warm-start Snapshot Settings (estado em memória salvo para reinícios rápidos)
+SNAPSHOT_ENABLED = os.getenv('SNAPSHOT_ENABLED', 'true').lower() == 'true'
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(os.path.dirname(__file__), 'snapshots'))
+SNAPSHOT_INTERVAL = 300  # segundos entre gravações
+SNAPSHOT_MAX_AGE = 6 * 3600  # snapshots mais antigos são descartados
 
 # Notification Settings
 ENABLE_NOTIFICATIONS = True
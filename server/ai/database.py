@@ -4,21 +4,78 @@ Gerenciador de Banco de Dados para Sistema de IA
 
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional
+from bson.codec_options import CodecOptions, TypeCodec, TypeRegistry
+from bson.decimal128 import Decimal128
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import ASCENDING, DESCENDING
 import json
 import logging
 
 from config import MONGODB_URI
+from expiry_scheduler import compute_expires_at
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Campos exibidos nos cartões da listagem de oportunidades; o restante
+# (texto original, raciocínio da IA) fica no endpoint de detalhe
+OPPORTUNITY_CARD_PROJECTION = {
+    '_id': 0,
+    'id': 1,
+    'timestamp': 1,
+    'confidence': 1,
+    'summary': 1,
+    'recommendation': 1,
+    'risk_level': 1,
+    'source.channel': 1,
+    'source.message_id': 1,
+    'source.author': 1,
+    'analysis.program': 1,
+    'analysis.opportunity_type': 1,
+    'analysis.quantity': 1,
+    'analysis.price_per_mile': 1,
+    'analysis.price_per_thousand': 1,
+    'analysis.total_price': 1,
+    'analysis.cpf_count': 1,
+    'analysis.market_comparison': 1,
+    'offer': 1
+}
+
+class DecimalCodec(TypeCodec):
+    """Grava Decimal como Decimal128 (preços exatos e comparáveis em consultas de faixa)"""
+    python_type = Decimal
+    bson_type = Decimal128
+
+    def transform_python(self, value):
+        return Decimal128(value)
+
+    def transform_bson(self, value):
+        return value.to_decimal()
+
+CODEC_OPTIONS = CodecOptions(type_registry=TypeRegistry([DecimalCodec()]))
+
+def _plain(value):
+    """Decimal -> float, recursivo (bancos sem o codec Decimal128)"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
 class DatabaseManager:
     def __init__(self):
         self.client = AsyncIOMotorClient(MONGODB_URI)
-        self.db = self.client['ss-milhas-ai']
+        try:
+            self.db = self.client.get_database('ss-milhas-ai', codec_options=CODEC_OPTIONS)
+            self.decimal128 = True
+        except NotImplementedError:
+            # Cliente sem type_registry (mongomock): preços convertidos para float na escrita
+            self.db = self.client.get_database('ss-milhas-ai')
+            self.decimal128 = False
         
         # Collections
         self.opportunities = self.db['opportunities']
@@ -26,16 +83,102 @@ class DatabaseManager:
         self.user_profiles = self.db['user_profiles']
         self.telegram_messages = self.db['telegram_messages']
         self.ai_analyses = self.db['ai_analyses']
+        self.price_alerts = self.db['price_alerts']
         
+        # Callbacks notificados após escritas (coleção, documento)
+        self._write_listeners: List[Callable[[str, Dict], None]] = []
+        
+    async def ensure_indexes(self):
+        """Cria índices usados pelas consultas frequentes"""
+        indexes = [
+            (self.opportunities, [('status', ASCENDING), ('expires_at', ASCENDING)], {}),
+            (self.opportunities, [('status', ASCENDING), ('created_at', DESCENDING)], {}),
+            (self.opportunities, [
+                ('status', ASCENDING), ('analysis.program', ASCENDING), ('created_at', DESCENDING)
+            ], {}),
+            # Chave natural da oportunidade (derivada de canal + message_id)
+            (self.opportunities, [('id', ASCENDING)], {'unique': True}),
+            # Chave natural da mensagem: canal + id da mensagem no Telegram
+            (self.telegram_messages, [('channel', ASCENDING), ('message_id', ASCENDING)], {
+                'unique': True,
+                'partialFilterExpression': {'message_id': {'$exists': True}}
+            }),
+            (self.telegram_messages, [('status', ASCENDING)], {}),
+            # Campos numéricos da oferta normalizada (consultas de faixa)
+            (self.telegram_messages, [('offer.program', ASCENDING), ('offer.price_per_thousand', ASCENDING)], {}),
+            (self.telegram_messages, [('offer.program', ASCENDING), ('offer.quantity', ASCENDING)], {}),
+            (self.opportunities, [
+                ('status', ASCENDING), ('offer.program', ASCENDING), ('offer.price_per_thousand', ASCENDING)
+            ], {}),
+            (self.opportunities, [('status', ASCENDING), ('offer.quantity', ASCENDING)], {}),
+            (self.price_alerts, [('user_id', ASCENDING)], {})
+        ]
+        
+        # Um índice por vez: falha em um (ex.: duplicatas antigas) não impede os demais
+        for collection, keys, options in indexes:
+            try:
+                await collection.create_index(keys, **options)
+            except Exception as e:
+                logger.error(f"Erro ao criar índice {keys} em {collection.name}: {e}")
+    
+    def add_write_listener(self, listener: Callable[[str, Dict], None]):
+        """Registra callback chamado após escritas no banco"""
+        self._write_listeners.append(listener)
+    
+    def notify_write(self, collection: str, document: Dict):
+        """Notifica listeners sobre uma escrita"""
+        for listener in self._write_listeners:
+            try:
+                listener(collection, document)
+            except Exception as e:
+                logger.error(f"Erro em listener de escrita: {e}")
+        
+    def _encode(self, document: Dict) -> Dict:
+        """Converte Decimal em float no próprio documento quando o codec Decimal128 não está ativo"""
+        if not self.decimal128:
+            for key, value in document.items():
+                document[key] = _plain(value)
+        return document
+    
+    def _range(self, minimum=None, maximum=None) -> Optional[Dict]:
+        """Filtro de faixa numérica; None se sem limites"""
+        number = (lambda value: Decimal(str(value))) if self.decimal128 else float
+        bounds = {}
+        if minimum is not None:
+            bounds['$gte'] = number(minimum)
+        if maximum is not None:
+            bounds['$lte'] = number(maximum)
+        return bounds or None
+    
     async def save_opportunity(self, opportunity_data: Dict) -> str:
-        """Salva oportunidade identificada pela IA"""
+        """Salva oportunidade identificada pela IA (idempotente pelo campo 'id')"""
         try:
             opportunity_data['created_at'] = datetime.now()
             opportunity_data['status'] = 'active'
+            opportunity_data['expires_at'] = compute_expires_at(opportunity_data)
+            self._encode(opportunity_data)
             
-            result = await self.opportunities.insert_one(opportunity_data)
-            logger.info(f"Oportunidade salva: {result.inserted_id}")
-            return str(result.inserted_id)
+            if not opportunity_data.get('id'):
+                result = await self.opportunities.insert_one(opportunity_data)
+                logger.info(f"Oportunidade salva: {result.inserted_id}")
+                self.notify_write('opportunities', opportunity_data)
+                return str(result.inserted_id)
+            
+            result = await self.opportunities.update_one(
+                {'id': opportunity_data['id']},
+                {'$setOnInsert': opportunity_data},
+                upsert=True
+            )
+            
+            if result.upserted_id is None:
+                # Reentrega da mesma mensagem: mantém o documento existente
+                existing = await self.opportunities.find_one({'id': opportunity_data['id']}, {'_id': 1})
+                return str(existing['_id']) if existing else None
+            
+            opportunity_data['_id'] = result.upserted_id
+            logger.info(f"Oportunidade salva: {result.upserted_id}")
+            self.notify_write('opportunities', opportunity_data)
+            return str(result.upserted_id)
             
         except Exception as e:
             logger.error(f"Erro ao salvar oportunidade: {e}")
@@ -44,7 +187,12 @@ class DatabaseManager:
     async def get_opportunities(self, 
                               limit: int = 50, 
                               program: Optional[str] = None,
-                              min_confidence: float = 0.7) -> List[Dict]:
+                              min_confidence: float = 0.7,
+                              compact: bool = False,
+                              min_price: Optional[float] = None,
+                              max_price: Optional[float] = None,
+                              min_quantity: Optional[int] = None,
+                              max_quantity: Optional[int] = None) -> List[Dict]:
         """Recupera oportunidades do banco"""
         try:
             query = {
@@ -55,12 +203,21 @@ class DatabaseManager:
             if program:
                 query['analysis.program'] = program.lower()
             
-            cursor = self.opportunities.find(query).sort('created_at', DESCENDING).limit(limit)
+            price_range = self._range(min_price, max_price)
+            if price_range:
+                query['offer.price_per_thousand'] = price_range
+            quantity_range = self._range(min_quantity, max_quantity)
+            if quantity_range:
+                query['offer.quantity'] = quantity_range
+            
+            projection = OPPORTUNITY_CARD_PROJECTION if compact else None
+            cursor = self.opportunities.find(query, projection).sort('created_at', DESCENDING).limit(limit)
             opportunities = await cursor.to_list(length=limit)
             
-            # Converte ObjectId para string
-            for opp in opportunities:
-                opp['_id'] = str(opp['_id'])
+            # Converte ObjectId para string (a projeção compacta já exclui _id)
+            if not compact:
+                for opp in opportunities:
+                    opp['_id'] = str(opp['_id'])
                 
             return opportunities
             
@@ -68,6 +225,23 @@ class DatabaseManager:
             logger.error(f"Erro ao recuperar oportunidades: {e}")
             return []
     
+    async def get_opportunity(self, opportunity_id: str) -> Optional[Dict]:
+        """Recupera oportunidade completa pelo id (ou ObjectId)"""
+        try:
+            from bson import ObjectId
+            query = {'id': opportunity_id}
+            if ObjectId.is_valid(opportunity_id):
+                query = {'$or': [query, {'_id': ObjectId(opportunity_id)}]}
+            
+            opportunity = await self.opportunities.find_one(query)
+            if opportunity:
+                opportunity['_id'] = str(opportunity['_id'])
+            return opportunity
+            
+        except Exception as e:
+            logger.error(f"Erro ao recuperar oportunidade: {e}")
+            return None
+    
     async def update_opportunity_status(self, opportunity_id: str, status: str) -> bool:
         """Atualiza status de uma oportunidade"""
         try:
@@ -76,23 +250,145 @@ class DatabaseManager:
                 {'_id': ObjectId(opportunity_id)},
                 {'$set': {'status': status, 'updated_at': datetime.now()}}
             )
+            if result.modified_count:
+                self.notify_write('opportunities', {'status': status, 'ids': [opportunity_id]})
             return result.modified_count > 0
             
         except Exception as e:
             logger.error(f"Erro ao atualizar status: {e}")
             return False
     
+    async def expire_opportunities(self, opportunity_ids: List[str]) -> int:
+        """Marca um lote de oportunidades ativas como expiradas"""
+        try:
+            from bson import ObjectId
+            if not opportunity_ids:
+                return 0
+            
+            result = await self.opportunities.update_many(
+                {
+                    '_id': {'$in': [ObjectId(oid) for oid in opportunity_ids]},
+                    'status': 'active'
+                },
+                {'$set': {'status': 'expired', 'updated_at': datetime.now()}}
+            )
+            
+            if result.modified_count:
+                self.notify_write('opportunities', {'status': 'expired', 'ids': opportunity_ids})
+            return result.modified_count
+            
+        except Exception as e:
+            logger.error(f"Erro ao expirar oportunidades: {e}")
+            return 0
+    
     async def save_telegram_message(self, message_data: Dict) -> str:
-        """Salva mensagem do Telegram para análise histórica"""
+        """Salva mensagem do Telegram (idempotente por canal + message_id)"""
         try:
             message_data['processed_at'] = datetime.now()
-            result = await self.telegram_messages.insert_one(message_data)
-            return str(result.inserted_id)
+            message_data.setdefault('status', 'pending')
+            self._encode(message_data)
+            
+            if message_data.get('message_id') is None:
+                result = await self.telegram_messages.insert_one(message_data)
+                self.notify_write('telegram_messages', message_data)
+                return str(result.inserted_id)
+            
+            key = {'channel': message_data['channel'], 'message_id': message_data['message_id']}
+            result = await self.telegram_messages.update_one(
+                key,
+                {'$setOnInsert': message_data},
+                upsert=True
+            )
+            
+            if result.upserted_id is None:
+                existing = await self.telegram_messages.find_one(key, {'_id': 1})
+                return str(existing['_id']) if existing else None
+            
+            self.notify_write('telegram_messages', message_data)
+            return str(result.upserted_id)
             
         except Exception as e:
             logger.error(f"Erro ao salvar mensagem: {e}")
             return None
     
+    async def get_offers(self,
+                         program: Optional[str] = None,
+                         side: Optional[str] = None,
+                         min_price: Optional[float] = None,
+                         max_price: Optional[float] = None,
+                         min_quantity: Optional[int] = None,
+                         max_quantity: Optional[int] = None,
+                         limit: int = 50) -> List[Dict]:
+        """Ofertas normalizadas das mensagens, por faixa de preço e quantidade"""
+        try:
+            query = {'offer': {'$ne': None}}
+            if program:
+                query['offer.program'] = program.lower()
+            if side:
+                query['offer.side'] = side
+            
+            price_range = self._range(min_price, max_price)
+            if price_range:
+                query['offer.price_per_thousand'] = price_range
+            quantity_range = self._range(min_quantity, max_quantity)
+            if quantity_range:
+                query['offer.quantity'] = quantity_range
+            
+            # Índice (programa, preço) atende filtro e ordenação
+            sort_field = 'offer.price_per_thousand' if program else 'processed_at'
+            cursor = self.telegram_messages.find(
+                query,
+                {'_id': 0, 'channel': 1, 'message_id': 1, 'author': 1, 'timestamp': 1, 'offer': 1}
+            ).sort(sort_field, ASCENDING if program else DESCENDING).limit(limit)
+            return await cursor.to_list(length=limit)
+            
+        except Exception as e:
+            logger.error(f"Erro ao recuperar ofertas: {e}")
+            return []
+    
+    async def get_telegram_message(self, channel: str, message_id: int) -> Optional[Dict]:
+        """Recupera mensagem pela chave natural (canal + message_id)"""
+        try:
+            return await self.telegram_messages.find_one({'channel': channel, 'message_id': message_id})
+            
+        except Exception as e:
+            logger.error(f"Erro ao recuperar mensagem: {e}")
+            return None
+    
+    async def update_telegram_message(self, channel: str, message_id: int, fields: Dict) -> bool:
+        """Atualiza estado de processamento de uma mensagem"""
+        try:
+            result = await self.telegram_messages.update_one(
+                {'channel': channel, 'message_id': message_id},
+                {'$set': self._encode(fields)}
+            )
+            return result.matched_count > 0
+            
+        except Exception as e:
+            logger.error(f"Erro ao atualizar mensagem: {e}")
+            return False
+    
+    async def get_unfinished_messages(self, limit: int = 1000) -> List[Dict]:
+        """Mensagens com processamento interrompido (pendentes, com falha da LLM ou analisadas sem conclusão)"""
+        try:
+            cursor = self.telegram_messages.find(
+                {'status': {'$in': ['pending', 'error', 'analyzed']}}
+            ).sort('processed_at', ASCENDING).limit(limit)
+            return await cursor.to_list(length=limit)
+            
+        except Exception as e:
+            logger.error(f"Erro ao recuperar mensagens pendentes: {e}")
+            return []
+    
+    async def iter_message_keys(self, since: datetime):
+        """Itera chaves (canal, message_id) de mensagens recentes"""
+        cursor = self.telegram_messages.find(
+            {'processed_at': {'$gte': since}, 'message_id': {'$exists': True}},
+            {'_id': 0, 'channel': 1, 'message_id': 1}
+        )
+        async for message in cursor:
+            yield message['channel'], message['message_id']
+    
     async def get_market_data(self, program: str, days: int = 30) -> List[Dict]:
         """Recupera dados de mercado históricos"""
         try:
@@ -109,11 +405,31 @@ class DatabaseManager:
             logger.error(f"Erro ao recuperar dados de mercado: {e}")
             return []
     
+    async def get_offer_prices(self, since: datetime) -> Dict[str, List[float]]:
+        """Preços por mil das ofertas recentes, agrupados por programa"""
+        try:
+            cursor = self.telegram_messages.find(
+                {'processed_at': {'$gte': since}, 'offer.price_per_thousand': {'$ne': None}},
+                {'_id': 0, 'offer.program': 1, 'offer.price_per_thousand': 1}
+            )
+            prices: Dict[str, List[float]] = {}
+            async for message in cursor:
+                offer = message['offer']
+                if offer.get('program'):
+                    prices.setdefault(offer['program'], []).append(float(offer['price_per_thousand']))
+            return prices
+            
+        except Exception as e:
+            logger.error(f"Erro ao recuperar preços das ofertas: {e}")
+            return {}
+    
     async def save_market_data(self, market_data: Dict) -> str:
         """Salva dados de mercado"""
         try:
             market_data['date'] = datetime.now()
+            self._encode(market_data)
             result = await self.market_data.insert_one(market_data)
+            self.notify_write('market_data', market_data)
             return str(result.inserted_id)
             
         except Exception as e:
@@ -124,7 +440,9 @@ class DatabaseManager:
         """Salva análise da IA"""
         try:
             analysis_data['created_at'] = datetime.now()
+            self._encode(analysis_data)
             result = await self.ai_analyses.insert_one(analysis_data)
+            self.notify_write('ai_analyses', analysis_data)
             return str(result.inserted_id)
             
         except Exception as e:
@@ -147,17 +465,52 @@ class DatabaseManager:
         """Atualiza perfil do usuário"""
         try:
             profile_data['updated_at'] = datetime.now()
+            self._encode(profile_data)
             result = await self.user_profiles.update_one(
                 {'user_id': user_id},
                 {'$set': profile_data},
                 upsert=True
             )
+            self.notify_write('user_profiles', {'user_id': user_id, **profile_data})
             return True
             
         except Exception as e:
             logger.error(f"Erro ao atualizar perfil: {e}")
             return False
     
+    async def save_price_alert(self, alert_data: Dict) -> str:
+        """Salva regra de alerta de preço"""
+        try:
+            alert_data['created_at'] = datetime.now()
+            self._encode(alert_data)
+            result = await self.price_alerts.insert_one(alert_data)
+            return str(result.inserted_id)
+            
+        except Exception as e:
+            logger.error(f"Erro ao salvar alerta: {e}")
+            return None
+    
+    async def get_price_alerts(self, user_id: Optional[str] = None) -> List[Dict]:
+        """Recupera regras de alerta de preço"""
+        try:
+            query = {'user_id': user_id} if user_id else {}
+            return await self.price_alerts.find(query).to_list(length=None)
+            
+        except Exception as e:
+            logger.error(f"Erro ao recuperar alertas: {e}")
+            return []
+    
+    async def delete_price_alert(self, alert_id: str) -> bool:
+        """Remove regra de alerta de preço"""
+        try:
+            from bson import ObjectId
+            result = await self.price_alerts.delete_one({'_id': ObjectId(alert_id)})
+            return result.deleted_count > 0
+            
+        except Exception as e:
+            logger.error(f"Erro ao remover alerta: {e}")
+            return False
+    
     async def get_statistics(self) -> Dict:
         """Recupera estatísticas do sistema"""
         try:
@@ -184,8 +537,37 @@ class DatabaseManager:
             logger.error(f"Erro ao recuperar estatísticas: {e}")
             return {}
     
-    async def cleanup_old_data(self, days: int = 90):
-        """Limpa dados antigos"""
+    async def get_channel_yield_counts(self, since: datetime) -> Dict[str, Dict]:
+        """Mensagens analisadas pela LLM e oportunidades encontradas, por canal"""
+        try:
+            counts: Dict[str, Dict] = {}
+            
+            cursor = self.telegram_messages.aggregate([
+                {'$match': {
+                    'processed_at': {'$gte': since},
+                    'status': {'$in': ['analyzed', 'processed']},
+                    'verdict_source': {'$nin': ['local', 'budget']}
+                }},
+                {'$group': {'_id': '$channel', 'count': {'$sum': 1}}}
+            ])
+            async for row in cursor:
+                counts.setdefault(row['_id'], {'messages': 0, 'opportunities': 0})['messages'] = row['count']
+            
+            cursor = self.opportunities.aggregate([
+                {'$match': {'created_at': {'$gte': since}}},
+                {'$group': {'_id': '$source.channel', 'count': {'$sum': 1}}}
+            ])
+            async for row in cursor:
+                counts.setdefault(row['_id'], {'messages': 0, 'opportunities': 0})['opportunities'] = row['count']
+            
+            return counts
+            
+        except Exception as e:
+            logger.error(f"Erro ao calcular rendimento dos canais: {e}")
+            return {}
+    
+    async def cleanup_old_data(self, days: int = 90, skip: Iterable[str] = ()):
+        """Limpa dados antigos (exceto coleções em 'skip', cujo arquivamento não concluiu)"""
         try:
             cutoff_date = datetime.now() - timedelta(days=days)
             
@@ -195,12 +577,20 @@ class DatabaseManager:
                 'status': {'$in': ['expired', 'completed']}
             })
             
-            # Remove mensagens antigas
-            result2 = await self.telegram_messages.delete_many({
-                'processed_at': {'$lt': cutoff_date}
-            })
+            # Remove mensagens antigas (só se o arquivamento delas não falhou)
+            deleted_messages = 0
+            if 'telegram_messages' not in skip:
+                result2 = await self.telegram_messages.delete_many({
+                    'processed_at': {'$lt': cutoff_date}
+                })
+                deleted_messages = result2.deleted_count
+            
+            if result1.deleted_count:
+                self.notify_write('opportunities', {'status': 'deleted'})
+            if deleted_messages:
+                self.notify_write('telegram_messages', {'status': 'deleted'})
             
-            logger.info(f"Limpeza concluída: {result1.deleted_count} oportunidades, {result2.deleted_count} mensagens")
+            logger.info(f"Limpeza concluída: {result1.deleted_count} oportunidades, {deleted_messages} mensagens")
             
         except Exception as e:
             logger.error(f"Erro na limpeza: {e}")
@@ -0,0 +1,111 @@
+"""
+Deduplicação de Mensagens do Telegram (Bloom filter + MongoDB como autoridade)
+"""
+
+import hashlib
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+import logging
+
+from config import DEDUP_BLOOM_CAPACITY, DEDUP_BLOOM_ERROR_RATE, DEDUP_WINDOW_DAYS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """Conjunto probabilístico: sem falsos negativos, falsos positivos limitados"""
+
+    def __init__(self, capacity: int = DEDUP_BLOOM_CAPACITY, error_rate: float = DEDUP_BLOOM_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # Hash duplo (Kirsch-Mitzenmacher) a partir de um único digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class MessageDeduplicator:
+    def __init__(self, db, bloom: Optional[BloomFilter] = None):
+        self.db = db
+        self.bloom = bloom or BloomFilter()
+        self.skipped_lookups = 0
+        self.duplicates = 0
+        # Instante do snapshot restaurado: load() só completa a partir dele
+        self.restored_at: Optional[datetime] = None
+
+    @staticmethod
+    def make_key(channel: str, message_id: int) -> str:
+        return f"{channel}:{message_id}"
+
+    async def load(self, days: int = DEDUP_WINDOW_DAYS) -> int:
+        """Preenche o filtro com as mensagens recentes do banco"""
+        loaded = 0
+        since = datetime.now() - timedelta(days=days)
+        if self.restored_at:
+            # Margem para escritas concorrentes à gravação do snapshot
+            since = max(since, self.restored_at - timedelta(minutes=1))
+        try:
+            async for channel, message_id in self.db.iter_message_keys(since):
+                self.bloom.add(self.make_key(channel, message_id))
+                loaded += 1
+        except Exception as e:
+            logger.error(f"Erro ao carregar filtro de deduplicação: {e}")
+
+        logger.info(f"Filtro de deduplicação carregado: {loaded} mensagens")
+        return loaded
+
+    def add(self, channel: str, message_id: int):
+        self.bloom.add(self.make_key(channel, message_id))
+
+    async def lookup(self, channel: str, message_id: int) -> Optional[Dict]:
+        """Retorna a mensagem já registrada ou None; evita ida ao Mongo para mensagens novas"""
+        if self.make_key(channel, message_id) not in self.bloom:
+            self.skipped_lookups += 1
+            return None
+
+        # Possível duplicata: o Mongo decide (falsos positivos do filtro)
+        existing = await self.db.get_telegram_message(channel, message_id)
+        if existing:
+            self.duplicates += 1
+        return existing
+
+    def snapshot_section(self) -> Tuple[Dict, bytes]:
+        """Bits do filtro para o snapshot de warm start"""
+        meta = {'size': self.bloom.size, 'hash_count': self.bloom.hash_count, 'count': self.bloom.count}
+        return meta, bytes(self.bloom.bits)
+
+    def restore_section(self, meta: Dict, payload, created_at: float) -> bool:
+        """Usa os bits do snapshot se os parâmetros do filtro não mudaram e há folga de capacidade"""
+        if (meta.get('size') != self.bloom.size or meta.get('hash_count') != self.bloom.hash_count
+                or len(payload) != len(self.bloom.bits)):
+            return False
+        # Filtro cheio: reconstrói só com a janela recente (taxa de falsos positivos controlada)
+        if meta.get('count', 0) >= DEDUP_BLOOM_CAPACITY:
+            return False
+
+        self.bloom.bits = payload
+        self.bloom.count = meta['count']
+        self.restored_at = datetime.fromtimestamp(created_at)
+        return True
+
+    def get_stats(self) -> Dict:
+        return {
+            'keys': self.bloom.count,
+            'bloom_bytes': len(self.bloom.bits),
+            'skipped_lookups': self.skipped_lookups,
+            'duplicates': self.duplicates
+        }
@@ -0,0 +1,131 @@
+"""
+Agendador de Expiração de Oportunidades
+"""
+
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import logging
+
+from config import (
+    OPPORTUNITY_DEFAULT_TTL,
+    OPPORTUNITY_TTL,
+    OPPORTUNITY_EXPIRY_INTERVAL,
+    OPPORTUNITY_EXPIRY_BATCH_SIZE,
+    OPPORTUNITY_EXPIRY_SWEEP_EVERY
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def opportunity_ttl(program: Optional[str], opportunity_type: Optional[str]) -> int:
+    """Tempo de vida (segundos) de uma oportunidade conforme programa e tipo"""
+    program = (program or '').lower()
+    opportunity_type = (opportunity_type or '').lower()
+
+    for key in (f"{program}:{opportunity_type}", program, opportunity_type):
+        if key in OPPORTUNITY_TTL:
+            return OPPORTUNITY_TTL[key]
+
+    return OPPORTUNITY_DEFAULT_TTL
+
+def compute_expires_at(opportunity: Dict, created_at: Optional[datetime] = None) -> datetime:
+    """Calcula data de expiração de uma oportunidade"""
+    analysis = opportunity.get('analysis') or {}
+    ttl = opportunity_ttl(analysis.get('program'), analysis.get('opportunity_type'))
+    return (created_at or opportunity.get('created_at') or datetime.now()) + timedelta(seconds=ttl)
+
+class OpportunityExpiryScheduler:
+    def __init__(self, db):
+        self.db = db
+        # Min-heap de (timestamp de expiração, id da oportunidade)
+        self._heap: List[tuple] = []
+        self._ticks = 0
+        self.expired_total = 0
+
+    def schedule(self, opportunity_id: str, expires_at: datetime):
+        """Agenda expiração de uma oportunidade"""
+        heapq.heappush(self._heap, (expires_at.timestamp(), str(opportunity_id)))
+
+    def on_database_write(self, collection: str, document: Dict):
+        """Listener de escrita: agenda oportunidades recém-salvas"""
+        if collection == 'opportunities' and document.get('_id') and document.get('expires_at'):
+            self.schedule(document['_id'], document['expires_at'])
+
+    async def load_active(self) -> int:
+        """Carrega oportunidades ativas do banco para o heap"""
+        self._heap = []
+        cursor = self.db.opportunities.find(
+            {'status': 'active'},
+            {'_id': 1, 'expires_at': 1, 'created_at': 1,
+             'analysis.program': 1, 'analysis.opportunity_type': 1}
+        )
+
+        async for opportunity in cursor:
+            expires_at = opportunity.get('expires_at') or compute_expires_at(opportunity)
+            self._heap.append((expires_at.timestamp(), str(opportunity['_id'])))
+
+        heapq.heapify(self._heap)
+        logger.info(f"Expiração agendada para {len(self._heap)} oportunidades ativas")
+        return len(self._heap)
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[str]:
+        """Remove do heap as oportunidades vencidas"""
+        now_ts = (now or datetime.now()).timestamp()
+        due = []
+        while self._heap and self._heap[0][0] <= now_ts:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    async def _sweep_ids(self, now: datetime) -> List[str]:
+        """Varredura no banco por vencidas salvas por outros processos"""
+        cursor = self.db.opportunities.find(
+            {'status': 'active', 'expires_at': {'$lte': now}},
+            {'_id': 1}
+        )
+        return [str(opportunity['_id']) async for opportunity in cursor]
+
+    async def tick(self) -> int:
+        """Expira em lote as oportunidades vencidas"""
+        now = datetime.now()
+        due = self.pop_due(now)
+
+        self._ticks += 1
+        if self._ticks % OPPORTUNITY_EXPIRY_SWEEP_EVERY == 0:
+            due = list(dict.fromkeys(due + await self._sweep_ids(now)))
+
+        expired = 0
+        for start in range(0, len(due), OPPORTUNITY_EXPIRY_BATCH_SIZE):
+            batch = due[start:start + OPPORTUNITY_EXPIRY_BATCH_SIZE]
+            # Caches são invalidados pelo notify_write do próprio expire_opportunities
+            expired += await self.db.expire_opportunities(batch)
+
+        if expired:
+            self.expired_total += expired
+            logger.info(f"Oportunidades expiradas: {expired}")
+
+        return expired
+
+    async def run(self, interval: int = OPPORTUNITY_EXPIRY_INTERVAL):
+        """Loop de expiração em background"""
+        try:
+            await self.load_active()
+        except Exception as e:
+            # Sem o heap, as varreduras periódicas no banco ainda expiram as oportunidades
+            logger.error(f"Erro ao carregar oportunidades ativas: {e}")
+
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Erro no agendador de expiração: {e}")
+            await asyncio.sleep(interval)
+
+    def get_stats(self) -> Dict:
+        """Estatísticas do agendador"""
+        return {
+            'scheduled': len(self._heap),
+            'next_expiry': datetime.fromtimestamp(self._heap[0][0]).isoformat() if self._heap else None,
+            'expired_total': self.expired_total
+        }
@@ -0,0 +1,273 @@
+"""
+Orçamento de Chamadas à LLM Priorizado pelo Rendimento de Cada Canal
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from config import (
+    TELEGRAM_CHANNELS,
+    LLM_BUDGET_TOKENS_PER_MINUTE,
+    LLM_BUDGET_COST_PER_MINUTE,
+    LLM_COST_PER_1K_PROMPT_TOKENS,
+    LLM_COST_PER_1K_COMPLETION_TOKENS,
+    LLM_BUDGET_ESTIMATED_TOKENS,
+    LLM_BUDGET_LOW_YIELD_SHARE,
+    LLM_BUDGET_MAX_DEFER,
+    LLM_BUDGET_SAMPLE_RATE,
+    LLM_YIELD_WINDOW_DAYS,
+    LLM_YIELD_PRIOR_MESSAGES,
+    LLM_YIELD_REFRESH_INTERVAL
+)
+from snapshot import json_section, read_json
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60
+# Decisões: admitida de imediato, admitida após espera, admitida por amostragem, descartada
+DECISIONS = ('admitted', 'deferred', 'sampled', 'skipped')
+
+def usage_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """Custo em USD de uma chamada"""
+    return (prompt_tokens * LLM_COST_PER_1K_PROMPT_TOKENS
+            + completion_tokens * LLM_COST_PER_1K_COMPLETION_TOKENS) / 1000
+
+class LLMBudgetScheduler:
+    def __init__(self, db,
+                 tokens_per_minute: int = LLM_BUDGET_TOKENS_PER_MINUTE,
+                 cost_per_minute: float = LLM_BUDGET_COST_PER_MINUTE):
+        self.db = db
+        self.tokens_per_minute = tokens_per_minute
+        self.cost_per_minute = cost_per_minute
+
+        # Reservas da janela deslizante: [instante, tokens, custo]
+        self._window: deque = deque()
+        self._window_tokens = 0
+        self._window_cost = 0.0
+        self._rng = random.Random()
+
+        # Histórico (Mongo) + contagens desde o último carregamento
+        self._history: Dict[str, Dict] = {}
+        self._live: Dict[str, Dict] = {}
+        self.channel_stats: Dict[str, Dict] = {}
+        self.recent_decisions: deque = deque(maxlen=100)
+
+        self.estimated_tokens = LLM_BUDGET_ESTIMATED_TOKENS
+        self.estimated_cost = usage_cost(LLM_BUDGET_ESTIMATED_TOKENS, 0)
+        self.total_tokens = 0
+        self.total_cost = 0.0
+        self.total_llm_seconds = 0.0
+        self.total_opportunities = 0
+        self.loaded_at = None
+
+    async def load_yields(self, days: int = LLM_YIELD_WINDOW_DAYS):
+        """Carrega o rendimento histórico (oportunidades por mensagem analisada) de cada canal"""
+        counts = await self.db.get_channel_yield_counts(datetime.now() - timedelta(days=days))
+        self._history = counts
+        self._live = {}
+        self.loaded_at = datetime.now()
+        logger.info(f"Rendimento por canal carregado: {len(counts)} canais")
+
+    async def run_refresh_loop(self, interval: int = LLM_YIELD_REFRESH_INTERVAL):
+        """Recarrega o rendimento periodicamente"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.load_yields()
+            except Exception as e:
+                logger.error(f"Erro ao recarregar rendimento dos canais: {e}")
+
+    def snapshot_section(self) -> Tuple[Dict, bytes]:
+        """Rendimento por canal (histórico + contagens recentes) para o snapshot"""
+        counts = {channel: self._counts(channel) for channel in set(self._history) | set(self._live)}
+        return json_section({'counts': counts, 'loaded_at': self.loaded_at})
+
+    def restore_section(self, meta: Dict, payload, created_at: float) -> bool:
+        """Evita a agregação no Mongo na inicialização; o loop de atualização ressincroniza"""
+        state = read_json(payload)
+        self._history = state['counts']
+        self._live = {}
+        self.loaded_at = datetime.fromisoformat(state['loaded_at']) if state.get('loaded_at') else None
+        return True
+
+    def _counts(self, channel: str) -> Dict:
+        history = self._history.get(channel, {})
+        live = self._live.get(channel, {})
+        return {
+            'messages': history.get('messages', 0) + live.get('messages', 0),
+            'opportunities': history.get('opportunities', 0) + live.get('opportunities', 0)
+        }
+
+    def _global_rate(self) -> float:
+        channels = set(self._history) | set(self._live)
+        messages = opportunities = 0
+        for channel in channels:
+            counts = self._counts(channel)
+            messages += counts['messages']
+            opportunities += counts['opportunities']
+        return opportunities / messages if messages else 0.0
+
+    def channel_yield(self, channel: str, prior: Optional[float] = None) -> float:
+        """Oportunidades por mensagem, suavizado pela taxa global em canais com pouco histórico"""
+        counts = self._counts(channel)
+        prior = self._global_rate() if prior is None else prior
+        return ((counts['opportunities'] + prior * LLM_YIELD_PRIOR_MESSAGES)
+                / (counts['messages'] + LLM_YIELD_PRIOR_MESSAGES))
+
+    def priority(self, channel: str) -> float:
+        """Rendimento relativo ao melhor canal (0 a 1)"""
+        channels = set(TELEGRAM_CHANNELS) | set(self._history) | set(self._live) | {channel}
+        prior = self._global_rate()
+        best = max(self.channel_yield(name, prior) for name in channels)
+        if best <= 0:
+            return 1.0
+        return min(1.0, self.channel_yield(channel, prior) / best)
+
+    def _ceiling(self, channel: str) -> float:
+        """Fração do orçamento que o canal pode ocupar: canais de alto rendimento chegam a 100%"""
+        return LLM_BUDGET_LOW_YIELD_SHARE + (1 - LLM_BUDGET_LOW_YIELD_SHARE) * self.priority(channel)
+
+    def _prune(self, now: float):
+        while self._window and self._window[0][0] <= now - WINDOW_SECONDS:
+            _, tokens, cost = self._window.popleft()
+            self._window_tokens -= tokens
+            self._window_cost -= cost
+
+    def _fits(self, fraction: float) -> bool:
+        if self.tokens_per_minute and self._window_tokens + self.estimated_tokens > self.tokens_per_minute * fraction:
+            return False
+        if self.cost_per_minute and self._window_cost + self.estimated_cost > self.cost_per_minute * fraction:
+            return False
+        return True
+
+    def _reserve(self, now: float) -> List:
+        entry = [now, self.estimated_tokens, self.estimated_cost]
+        self._window.append(entry)
+        self._window_tokens += entry[1]
+        self._window_cost += entry[2]
+        return entry
+
+    def _decide(self, channel: str, decision: str):
+        stats = self.channel_stats.setdefault(channel, {
+            **{name: 0 for name in DECISIONS},
+            'tokens': 0, 'cost': 0.0, 'opportunities': 0
+        })
+        stats[decision] += 1
+        self.recent_decisions.append({
+            'channel': channel,
+            'decision': decision,
+            'priority': round(self.priority(channel), 3),
+            'timestamp': datetime.now().isoformat()
+        })
+
+    async def acquire(self, channel: str, max_wait: float = LLM_BUDGET_MAX_DEFER,
+                      ceiling: Optional[float] = None) -> Optional[List]:
+        """Reserva orçamento para uma chamada; None se a mensagem deve ser descartada"""
+        ceiling = self._ceiling(channel) if ceiling is None else ceiling
+        deadline = time.monotonic() + max_wait
+        waited = False
+
+        while True:
+            now = time.monotonic()
+            self._prune(now)
+            if self._fits(ceiling):
+                self._decide(channel, 'deferred' if waited else 'admitted')
+                return self._reserve(now)
+
+            remaining = deadline - now
+            if remaining <= 0:
+                break
+            # Espera a reserva mais antiga sair da janela
+            oldest = self._window[0][0] if self._window else now
+            await asyncio.sleep(max(0.05, min(remaining, oldest + WINDOW_SECONDS - now)))
+            waited = True
+
+        # Acima do teto do canal: uma amostra ainda é analisada (sem passar do orçamento total)
+        if self._fits(1.0) and self._rng.random() < LLM_BUDGET_SAMPLE_RATE:
+            self._decide(channel, 'sampled')
+            return self._reserve(time.monotonic())
+
+        self._decide(channel, 'skipped')
+        return None
+
+    def record(self, channel: str, reservation: List, usage: Optional[Dict],
+               is_opportunity: Optional[bool], elapsed: float):
+        """Troca a estimativa da reserva pelo uso real e atualiza o rendimento do canal (None: chamada falhou)"""
+        tokens = cost = 0
+        if usage:
+            tokens = usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0)
+            cost = usage_cost(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+            # Média móvel do consumo por chamada
+            self.estimated_tokens = int(0.9 * self.estimated_tokens + 0.1 * tokens)
+            self.estimated_cost = 0.9 * self.estimated_cost + 0.1 * cost
+
+        # Reserva ainda na janela (as mais antigas já foram descontadas)
+        if reservation[0] > time.monotonic() - WINDOW_SECONDS:
+            self._window_tokens += tokens - reservation[1]
+            self._window_cost += cost - reservation[2]
+            reservation[1], reservation[2] = tokens, cost
+
+        stats = self.channel_stats.get(channel)
+        if stats is not None:
+            stats['tokens'] += tokens
+            stats['cost'] += cost
+        self.total_tokens += tokens
+        self.total_cost += cost
+        self.total_llm_seconds += elapsed
+
+        # Chamada sem veredito gasta orçamento mas não entra no rendimento do canal
+        if is_opportunity is None:
+            return
+
+        live = self._live.setdefault(channel, {'messages': 0, 'opportunities': 0})
+        live['messages'] += 1
+        live['opportunities'] += int(is_opportunity)
+        if stats is not None:
+            stats['opportunities'] += int(is_opportunity)
+        self.total_opportunities += int(is_opportunity)
+
+    def record_external(self, channel: str, usage: Dict, elapsed: float):
+        """Chamada feita por outro processo (API no modo processo): ocupa a janela com o uso real"""
+        self._prune(time.monotonic())
+        self._decide(channel, 'admitted')
+        self.record(channel, self._reserve(time.monotonic()), usage, None, elapsed)
+
+    def get_stats(self) -> Dict:
+        self._prune(time.monotonic())
+        channels = set(TELEGRAM_CHANNELS) | set(self._history) | set(self._live) | set(self.channel_stats)
+        return {
+            'budget': {
+                'tokens_per_minute': self.tokens_per_minute,
+                'cost_per_minute': self.cost_per_minute,
+                'window_tokens': self._window_tokens,
+                'window_cost': round(self._window_cost, 4),
+                'estimated_tokens_per_call': self.estimated_tokens
+            },
+            'totals': {
+                'tokens': self.total_tokens,
+                'cost': round(self.total_cost, 4),
+                'llm_seconds': round(self.total_llm_seconds, 2),
+                'opportunities': self.total_opportunities,
+                'opportunities_per_dollar': round(self.total_opportunities / self.total_cost, 2) if self.total_cost else None,
+                'opportunities_per_llm_second': (
+                    round(self.total_opportunities / self.total_llm_seconds, 4) if self.total_llm_seconds else None
+                )
+            },
+            'channels': {
+                channel: {
+                    'yield': round(self.channel_yield(channel), 4),
+                    'priority': round(self.priority(channel), 3),
+                    **self._counts(channel),
+                    **self.channel_stats.get(channel, {})
+                }
+                for channel in sorted(channels, key=lambda name: -self.channel_yield(name))
+            },
+            'recent_decisions': list(self.recent_decisions)[-20:],
+            'yields_loaded_at': self.loaded_at.isoformat() if self.loaded_at else None
+        }
@@ -0,0 +1,115 @@
+"""
+Servidor Falso Compatível com a API da OpenAI para Testes de Carga
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi import FastAPI, Request
+import uvicorn
+
+PROGRAMS = ['smiles', 'latam', 'tudoazul', 'livelo', 'iberia', 'avios']
+
+def _analysis_content() -> dict:
+    program = random.choice(PROGRAMS)
+    price = round(random.uniform(14.0, 26.0), 2)
+    return {
+        "is_opportunity": random.random() < 0.3,
+        "confidence": round(random.uniform(0.5, 0.99), 2),
+        "opportunity_type": random.choice(["compra", "venda"]),
+        "program": program,
+        "quantity": random.choice([20000, 50000, 83000, 100000]),
+        "price_per_thousand": price,
+        "total_price": price * 50,
+        "cpf_count": random.randint(1, 3),
+        "market_comparison": {
+            "avg_market_price": 16.5,
+            "price_difference": round(random.uniform(-0.2, 0.2), 3),
+            "is_below_market": random.random() < 0.5
+        },
+        "risk_assessment": random.choice(["baixo", "médio", "alto"]),
+        "recommendation": random.choice(["comprar", "vender", "aguardar"]),
+        "summary": f"Oferta de {program} a R$ {price}",
+        "reasoning": "Resposta sintética do servidor de teste de carga"
+    }
+
+def _recommendations_content() -> dict:
+    return {
+        "personalized_recommendations": [
+            {
+                "action": random.choice(["comprar", "vender", "aguardar"]),
+                "program": random.choice(PROGRAMS),
+                "quantity": "50000",
+                "reason": "Resposta sintética",
+                "confidence": 0.8
+            }
+        ],
+        "risk_profile": "moderado",
+        "investment_strategy": "Resposta sintética",
+        "alert_settings": {
+            "price_alerts": True,
+            "opportunity_alerts": True,
+            "market_change_alerts": False
+        }
+    }
+
+def _trends_content() -> dict:
+    return {
+        "market_trend": "estável",
+        "recommended_actions": ["aguardar"],
+        "price_predictions": {},
+        "market_insights": [],
+        "risk_factors": [],
+        "opportunity_windows": []
+    }
+
+def create_app(latency_ms: float, jitter_ms: float) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = body['messages'][-1]['content']
+
+        delay = max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        if 'RECOMENDAÇÕES PERSONALIZADAS' in prompt:
+            content = _recommendations_content()
+        elif 'TENDÊNCIAS' in prompt:
+            content = _trends_content()
+        else:
+            content = _analysis_content()
+
+        completion_tokens = body.get('max_tokens', 1000) // 2
+        prompt_tokens = len(prompt) // 4
+        return {
+            "id": f"chatcmpl-loadtest-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get('model'),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor falso da OpenAI")
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=800)
+    parser.add_argument('--jitter-ms', type=float, default=200)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.latency_ms, args.jitter_ms), host="127.0.0.1", port=args.port, log_level="warning")
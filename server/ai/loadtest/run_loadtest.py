@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Testes de Carga dos Endpoints da API com Comparação contra Baseline
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+
+sys.path.append(str(Path(__file__).parent))
+from seed import PROGRAMS, offer_text
+
+LOADTEST_DIR = Path(__file__).parent
+DEFAULT_BASELINE = LOADTEST_DIR / 'baseline.json'
+
+# Nome -> (método, gerador de (caminho, corpo JSON))
+Scenario = Tuple[str, Callable[[random.Random, int], Tuple[str, Dict]]]
+
+def build_scenarios(users: int) -> Dict[str, Scenario]:
+    return {
+        'opportunities': ('GET', lambda rng, i: (
+            f"/opportunities?limit=50{'&program=' + rng.choice(PROGRAMS) if i % 2 else ''}", None
+        )),
+        'statistics': ('GET', lambda rng, i: ("/statistics", None)),
+        'market_data': ('GET', lambda rng, i: (f"/market-data/{rng.choice(PROGRAMS)}?days=30", None)),
+        'analyze': ('POST', lambda rng, i: ("/analyze", {'text': offer_text(rng)})),
+        'recommendations': ('POST', lambda rng, i: (
+            f"/recommendations/loadtest-user-{rng.randrange(users)}", None
+        ))
+    }
+
+def valid_payload(response: httpx.Response) -> bool:
+    """Endpoints que engolem erros respondem 200 com {} ou {'error': ...} (null e [] são válidos)"""
+    try:
+        payload = response.json()
+    except ValueError:
+        return False
+    return not (isinstance(payload, dict) and (not payload or 'error' in payload))
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+async def run_scenario(client: httpx.AsyncClient,
+                       scenario: Scenario,
+                       requests: int,
+                       concurrency: int,
+                       seed_value: int) -> Dict:
+    """Dispara 'requests' chamadas com 'concurrency' trabalhadores simultâneos"""
+    method, make_request = scenario
+    rng = random.Random(seed_value)
+    planned = [make_request(rng, i) for i in range(requests)]
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < len(planned):
+            path, body = planned[next_index]
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                if response.status_code >= 400 or not valid_payload(response):
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'throughput_rps': round(requests / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p90_ms': round(percentile(latencies, 0.90), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(latencies[-1], 2) if latencies else 0.0
+    }
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressões: p99 acima ou vazão abaixo do baseline além da tolerância, ou erros"""
+    failures = []
+    for name, result in results.items():
+        if result['errors'] > result['requests'] * 0.01:
+            failures.append(f"{name}: {result['errors']} erros em {result['requests']} requisições")
+
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            failures.append(f"{name}: p99 {result['p99_ms']}ms > baseline {base['p99_ms']}ms (+{tolerance:.0%})")
+        if result['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            failures.append(
+                f"{name}: vazão {result['throughput_rps']} req/s < baseline {base['throughput_rps']} req/s (-{tolerance:.0%})"
+            )
+    return failures
+
+def print_table(results: Dict):
+    header = f"{'endpoint':<16}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'erros':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        print(f"{name:<16}{r['throughput_rps']:>10}{r['p50_ms']:>10}{r['p90_ms']:>10}"
+              f"{r['p99_ms']:>10}{r['max_ms']:>10}{r['errors']:>8}")
+
+async def wait_until_ready(url: str, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"Serviço não respondeu: {url}")
+
+def start_services(args) -> List[subprocess.Popen]:
+    openai_port, app_port = args.port + 1, args.port
+    fake_openai = subprocess.Popen([
+        sys.executable, str(LOADTEST_DIR / 'fake_openai.py'),
+        '--port', str(openai_port),
+        '--latency-ms', str(args.openai_latency_ms),
+        '--jitter-ms', str(args.openai_jitter_ms)
+    ])
+    command = [
+        sys.executable, str(LOADTEST_DIR / 'serve_app.py'),
+        '--port', str(app_port),
+        '--openai-url', f"http://127.0.0.1:{openai_port}/v1",
+        '--opportunities', str(args.opportunities),
+        '--users', str(args.users),
+        '--market-days', str(args.market_days)
+    ]
+    if args.mongo_uri:
+        command += ['--mongo-uri', args.mongo_uri]
+    return [fake_openai, subprocess.Popen(command)]
+
+async def main(args) -> int:
+    processes = start_services(args)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        await wait_until_ready(f"http://127.0.0.1:{args.port + 1}/docs")
+        await wait_until_ready(f"{base_url}/health")
+
+        scenarios = build_scenarios(args.users)
+        selected = args.endpoints or list(scenarios)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        results = {}
+
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            for name in selected:
+                # Aquecimento fora da medição
+                await run_scenario(client, scenarios[name], min(args.concurrency, args.requests), args.concurrency, 0)
+                results[name] = await run_scenario(
+                    client, scenarios[name], args.requests, args.concurrency, args.seed
+                )
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    print_table(results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        Path(args.baseline).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nBaseline salvo em {args.baseline}")
+        return 0
+
+    baseline_path = Path(args.baseline)
+    if not baseline_path.exists():
+        print(f"\n❌ Sem baseline em {baseline_path}; rode com --save-baseline para criar")
+        return 1
+
+    failures = compare(results, json.loads(baseline_path.read_text()), args.tolerance)
+    if failures:
+        print("\n❌ REGRESSÃO DE PERFORMANCE:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+
+    print("\n✅ Dentro do baseline")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Testes de carga da API de IA")
+    parser.add_argument('--port', type=int, default=8901, help="porta da API (OpenAI falsa usa porta + 1)")
+    parser.add_argument('--endpoints', nargs='*', choices=list(build_scenarios(1)))
+    parser.add_argument('--requests', type=int, default=2000, help="requisições por endpoint")
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--opportunities', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--market-days', type=int, default=30)
+    parser.add_argument('--mongo-uri', default=None, help="MongoDB local (padrão: mongomock em memória)")
+    parser.add_argument('--openai-latency-ms', type=float, default=800)
+    parser.add_argument('--openai-jitter-ms', type=float, default=200)
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--output', default=None, help="arquivo JSON com os resultados")
+    sys.exit(asyncio.run(main(parser.parse_args())))
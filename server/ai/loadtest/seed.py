@@ -0,0 +1,109 @@
+"""
+Dados Sintéticos para Testes de Carga
+"""
+
+import random
+from datetime import datetime, timedelta
+
+PROGRAMS = ['smiles', 'latam', 'tudoazul', 'livelo', 'iberia', 'avios']
+CHANNELS = ['BANCO_DE_MILHAS_ON_FIRE', 'BALCAO_DE_MILHAS_COMPRAS', 'MILHAS_TRADING_BR', 'SMILES_OPORTUNIDADES']
+AVG_PRICES = {'smiles': 16.5, 'latam': 24.0, 'tudoazul': 22.0, 'livelo': 0.8, 'iberia': 52.0, 'avios': 52.0}
+
+def offer_text(rng: random.Random) -> str:
+    """Mensagem de oferta no formato dos canais"""
+    side = rng.choice(['vendo', 'compro'])
+    program = rng.choice(PROGRAMS)
+    quantity = rng.choice(['20k', '50k', '83k', '100k', '150k'])
+    price = round(AVG_PRICES[program] * rng.uniform(0.8, 1.2), 2)
+    return f"{side} {program} {quantity} {rng.randint(1, 3)} cpf ${price}"
+
+def make_opportunity(rng: random.Random, index: int, now: datetime) -> dict:
+    program = rng.choice(PROGRAMS)
+    channel = rng.choice(CHANNELS)
+    price = round(AVG_PRICES[program] * rng.uniform(0.8, 1.1), 2)
+    created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 7))
+    analysis = {
+        'is_opportunity': True,
+        'confidence': round(rng.uniform(0.6, 0.99), 2),
+        'opportunity_type': rng.choice(['compra', 'venda']),
+        'program': program,
+        'quantity': rng.choice([20000, 50000, 83000, 100000]),
+        'price_per_thousand': price,
+        'total_price': price * 50,
+        'cpf_count': rng.randint(1, 3),
+        'market_comparison': {
+            'avg_market_price': AVG_PRICES[program],
+            'price_difference': round((price - AVG_PRICES[program]) / AVG_PRICES[program], 3),
+            'is_below_market': price < AVG_PRICES[program]
+        },
+        'risk_assessment': rng.choice(['baixo', 'médio', 'alto']),
+        'recommendation': rng.choice(['comprar', 'vender', 'aguardar']),
+        'summary': f"Oferta de {program} a R$ {price}",
+        # Raciocínio do LLM: campo pesado que a listagem não deve trafegar
+        'reasoning': ' '.join(['Análise detalhada do contexto de mercado.'] * 20)
+    }
+    return {
+        'id': f"opp_{channel}_{index}",
+        'timestamp': created_at.isoformat(),
+        'source': {
+            'channel': channel,
+            'message_id': index,
+            'author': f"user{rng.randint(1, 500)}",
+            'original_text': offer_text(rng) + ' ' + 'detalhes ' * 30
+        },
+        'analysis': analysis,
+        'confidence': analysis['confidence'],
+        'is_opportunity': True,
+        'summary': analysis['summary'],
+        'recommendation': analysis['recommendation'],
+        'risk_level': analysis['risk_assessment'],
+        'created_at': created_at,
+        'status': 'active' if rng.random() < 0.7 else 'expired',
+        'expires_at': created_at + timedelta(hours=6)
+    }
+
+def make_market_data(rng: random.Random, program: str, date: datetime) -> dict:
+    avg = AVG_PRICES[program] * rng.uniform(0.9, 1.1)
+    return {
+        'program': program,
+        'avg_price': round(avg, 2),
+        'price_range': [round(avg * 0.85, 2), round(avg * 1.15, 2)],
+        'volume': rng.randint(10, 500),
+        'date': date
+    }
+
+def make_user_profile(rng: random.Random, index: int) -> dict:
+    return {
+        'user_id': f"loadtest-user-{index}",
+        'preferences': {'programs': rng.sample(PROGRAMS, 2), 'max_price': rng.randint(15, 30)},
+        'risk_tolerance': rng.choice(['baixo', 'médio', 'alto']),
+        'investment_goals': ['revenda'],
+        'updated_at': datetime.now()
+    }
+
+async def seed(db, opportunities: int, users: int, market_days: int, seed_value: int = 42):
+    """Popula as coleções com volumes realistas (inserção direta, sem listeners)"""
+    rng = random.Random(seed_value)
+    now = datetime.now()
+
+    batch = []
+    for index in range(opportunities):
+        batch.append(make_opportunity(rng, index, now))
+        if len(batch) >= 1000:
+            await db.opportunities.insert_many(batch)
+            batch = []
+    if batch:
+        await db.opportunities.insert_many(batch)
+
+    # Um ponto por programa a cada hora
+    market = [
+        make_market_data(rng, program, now - timedelta(hours=hour))
+        for program in PROGRAMS
+        for hour in range(market_days * 24)
+    ]
+    if market:
+        await db.market_data.insert_many(market)
+
+    profiles = [make_user_profile(rng, index) for index in range(users)]
+    if profiles:
+        await db.user_profiles.insert_many(profiles)
@@ -0,0 +1,54 @@
+"""
+Sobe a API com MongoDB em memória (ou local) e dados sintéticos para testes de carga
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Módulos da API ficam no diretório pai
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent))
+
+def main():
+    parser = argparse.ArgumentParser(description="API para testes de carga")
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--openai-url', default='http://127.0.0.1:8900/v1')
+    parser.add_argument('--mongo-uri', default=None, help="MongoDB local; sem isso usa mongomock em memória")
+    parser.add_argument('--opportunities', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--market-days', type=int, default=30)
+    args = parser.parse_args()
+
+    # Configuração precisa estar no ambiente antes de importar a API
+    os.environ['OPENAI_BASE_URL'] = args.openai_url
+    os.environ.setdefault('OPENAI_API_KEY', 'loadtest')
+    os.environ['MONITOR_MODE'] = 'process'
+    os.environ['ARCHIVE_ENABLED'] = 'false'
+    os.environ['SNAPSHOT_ENABLED'] = 'false'
+
+    if args.mongo_uri:
+        os.environ['MONGODB_URI'] = args.mongo_uri
+    else:
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+    import uvicorn
+    import api
+    from seed import seed
+
+    async def seed_database():
+        if args.mongo_uri:
+            # Banco local: recomeça do zero para resultados reprodutíveis
+            await api.db_manager.client.drop_database(api.db_manager.db.name)
+        await seed(api.db_manager, args.opportunities, args.users, args.market_days)
+
+    # Antes dos demais handlers (índices, agendador de expiração, alertas)
+    api.app.router.on_startup.insert(0, seed_database)
+
+    uvicorn.run(api.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Classificador Local de Oportunidades (n-gramas com hashing + regressão logística)
+
+Treinado com os vereditos da OpenAI já salvos no banco; descarta localmente as
+mensagens que com alta confiança não são oportunidades.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from config import (
+    LOCAL_CLASSIFIER_PATH,
+    LOCAL_CLASSIFIER_FEATURES,
+    LOCAL_CLASSIFIER_MIN_CONFIDENCE,
+    LOCAL_CLASSIFIER_MIN_AGREEMENT,
+    LOCAL_CLASSIFIER_MIN_SAMPLES,
+    LOCAL_CLASSIFIER_RETRAIN_INTERVAL,
+    LOCAL_CLASSIFIER_BATCH_SIZE
+)
+from message_parser import fold_accents
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z$]+|\d+(?:[.,]\d+)?k?")
+DIGITS_PATTERN = re.compile(r"\d+")
+
+def extract_features(text: str, n_features: int = LOCAL_CLASSIFIER_FEATURES) -> np.ndarray:
+    """Índices (binários) de unigramas, bigramas e formas numéricas via hashing"""
+    tokens = TOKEN_PATTERN.findall(fold_accents(text))
+    # Números viram "forma" (50k -> 0k) para generalizar entre valores
+    shapes = [DIGITS_PATTERN.sub('0', token) for token in tokens]
+    grams = tokens + shapes + [f"{a} {b}" for a, b in zip(shapes, shapes[1:])]
+    # crc32 é estável entre processos (hash() do Python não é)
+    return np.fromiter(
+        {zlib.crc32(gram.encode('utf-8')) % n_features for gram in grams},
+        dtype=np.int64
+    )
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+class LocalClassifier:
+    def __init__(self, weights: np.ndarray, bias: float,
+                 platt_a: float = 1.0, platt_b: float = 0.0,
+                 metadata: Optional[Dict] = None):
+        self.weights = weights
+        self.bias = bias
+        # Calibração de Platt: p = sigmoid(a * z + b)
+        self.platt_a = platt_a
+        self.platt_b = platt_b
+        self.metadata = metadata or {}
+
+    @property
+    def n_features(self) -> int:
+        return len(self.weights)
+
+    def _logit(self, indices: np.ndarray) -> float:
+        return float(self.weights[indices].sum() + self.bias)
+
+    def predict_proba(self, text: str) -> float:
+        """Probabilidade calibrada de ser oportunidade"""
+        z = self._logit(extract_features(text, self.n_features))
+        return float(_sigmoid(self.platt_a * z + self.platt_b))
+
+    def predict(self, text: str) -> Dict:
+        probability = self.predict_proba(text)
+        return {
+            'is_opportunity': probability >= 0.5,
+            'probability': probability,
+            'confidence': max(probability, 1 - probability)
+        }
+
+    def save(self, path: str = LOCAL_CLASSIFIER_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path,
+            weights=self.weights.astype(np.float32),
+            params=np.array([self.bias, self.platt_a, self.platt_b]),
+            metadata=np.array(json.dumps(self.metadata, default=str))
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = LOCAL_CLASSIFIER_PATH) -> Optional['LocalClassifier']:
+        """Carrega modelo salvo; None se não existir ou estiver corrompido"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                bias, platt_a, platt_b = data['params'].tolist()
+                return cls(
+                    data['weights'].astype(np.float64),
+                    bias, platt_a, platt_b,
+                    json.loads(str(data['metadata']))
+                )
+        except Exception as e:
+            logger.error(f"Erro ao carregar classificador local: {e}")
+            return None
+
+def _to_csr(rows: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Linhas esparsas como (indptr, indices) contíguos"""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in rows], out=indptr[1:])
+    indices = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    return indptr, indices
+
+def _fit_logistic(rows: List[np.ndarray], labels: np.ndarray, n_features: int,
+                  epochs: int, learning_rate: float, l2: float, seed: int,
+                  batch_size: int = LOCAL_CLASSIFIER_BATCH_SIZE) -> Tuple[np.ndarray, float]:
+    """Regressão logística por SGD em mini-lotes vetorizados sobre linhas esparsas binárias"""
+    indptr, indices = _to_csr(rows)
+    weights = np.zeros(n_features)
+    bias = 0.0
+    positives = max(1, int(labels.sum()))
+    # Compensa o desbalanceamento (poucas oportunidades)
+    positive_weight = min(20.0, (len(labels) - positives) / positives) or 1.0
+    sample_weights = np.where(labels == 1, positive_weight, 1.0)
+    rng = np.random.default_rng(seed)
+
+    for epoch in range(epochs):
+        step = learning_rate / (1 + epoch)
+        order = rng.permutation(len(rows))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            # Índices das linhas do lote concatenados; row_of[k] = linha (no lote) do k-ésimo índice
+            lengths = indptr[batch + 1] - indptr[batch]
+            row_of = np.repeat(np.arange(len(batch)), lengths)
+            offsets = np.cumsum(lengths) - lengths
+            positions = np.arange(int(lengths.sum())) - np.repeat(offsets - indptr[batch], lengths)
+            columns = indices[positions]
+
+            logits = np.bincount(row_of, weights=weights[columns], minlength=len(batch)) + bias
+            gradient = (_sigmoid(logits) - labels[batch]) * sample_weights[batch]
+
+            touched, inverse = np.unique(columns, return_inverse=True)
+            update = np.bincount(inverse, weights=gradient[row_of], minlength=len(touched))
+            weights[touched] -= step * (update + l2 * weights[touched])
+            bias -= step * float(gradient.mean())
+
+    return weights, bias
+
+def _fit_platt(logits: np.ndarray, labels: np.ndarray, iterations: int = 200) -> Tuple[float, float]:
+    """Ajusta a e b da calibração de Platt por gradiente"""
+    a, b = 1.0, 0.0
+    for _ in range(iterations):
+        p = _sigmoid(a * logits + b)
+        error = p - labels
+        a -= 0.1 * float(np.mean(error * logits))
+        b -= 0.1 * float(np.mean(error))
+    return a, b
+
+def evaluate(model: LocalClassifier, samples: List[Tuple[str, int]],
+             min_confidence: float = LOCAL_CLASSIFIER_MIN_CONFIDENCE) -> Dict:
+    """Compara o modelo com os vereditos da LLM"""
+    if not samples:
+        return {'samples': 0}
+
+    labels = np.array([label for _, label in samples])
+    probabilities = np.array([model.predict_proba(text) for text, _ in samples])
+    predicted = probabilities >= 0.5
+
+    # O filtro só descarta negativos confiantes; o resto vai para a OpenAI
+    skipped = (1 - probabilities) >= min_confidence
+    true_positive = int(np.sum(predicted & (labels == 1)))
+
+    return {
+        'samples': len(samples),
+        'positives': int(labels.sum()),
+        'agreement': round(float(np.mean(predicted == (labels == 1))), 4),
+        'precision': round(true_positive / max(1, int(predicted.sum())), 4),
+        'recall': round(true_positive / max(1, int(labels.sum())), 4),
+        'min_confidence': min_confidence,
+        'coverage': round(float(np.mean(skipped)), 4),
+        'agreement_on_skipped': round(float(np.mean(labels[skipped] == 0)), 4) if skipped.any() else None,
+        'missed_opportunities': int(np.sum(skipped & (labels == 1)))
+    }
+
+def split_samples(samples: List[Tuple[str, int]]) -> Tuple[List, List, List]:
+    """Treino (70%), calibração (15%) e teste (15%) pelo hash do texto: estável entre execuções"""
+    splits = ([], [], [])
+    for text, label in samples:
+        bucket = zlib.crc32(text.encode('utf-8')) % 100
+        splits[0 if bucket < 70 else 1 if bucket < 85 else 2].append((text, label))
+    return splits
+
+def train(samples: List[Tuple[str, int]],
+          n_features: int = LOCAL_CLASSIFIER_FEATURES,
+          epochs: int = 5,
+          learning_rate: float = 0.1,
+          l2: float = 1e-6,
+          seed: int = 42) -> Tuple[LocalClassifier, Dict]:
+    """Treina com 70% dos dados, calibra com 15% e avalia nos 15% restantes"""
+    train_set, calibration_set, test_set = split_samples(samples)
+
+    rows = [extract_features(text, n_features) for text, _ in train_set]
+    labels = np.array([label for _, label in train_set], dtype=np.float64)
+    weights, bias = _fit_logistic(rows, labels, n_features, epochs, learning_rate, l2, seed)
+
+    model = LocalClassifier(weights, bias)
+    if calibration_set:
+        logits = np.array([model._logit(extract_features(text, n_features)) for text, _ in calibration_set])
+        model.platt_a, model.platt_b = _fit_platt(logits, np.array([label for _, label in calibration_set]))
+
+    report = evaluate(model, test_set)
+    model.metadata = {
+        'trained_at': datetime.now().isoformat(),
+        'train_samples': len(train_set),
+        'evaluation': report
+    }
+    return model, report
+
+async def load_training_data(db, limit: int = 200000) -> List[Tuple[str, int]]:
+    """Textos rotulados pela OpenAI: mensagens analisadas + oportunidades salvas"""
+    labeled: Dict[str, int] = {}
+
+    cursor = db.opportunities.find(
+        {'source.original_text': {'$ne': None}},
+        {'_id': 0, 'source.original_text': 1}
+    ).limit(limit)
+    async for opportunity in cursor:
+        labeled[opportunity['source']['original_text']] = 1
+
+    # Vereditos decididos pelo próprio modelo não voltam para o treino
+    cursor = db.telegram_messages.find(
+        {
+            'status': {'$in': ['analyzed', 'processed']},
+            'opportunity': {'$exists': True},
+            'verdict_source': {'$ne': 'local'}
+        },
+        {'_id': 0, 'text': 1, 'opportunity': 1}
+    ).sort('processed_at', -1).limit(limit)
+    async for message in cursor:
+        if message.get('text'):
+            opportunity = message.get('opportunity')
+            labeled[message['text']] = int(bool(opportunity and opportunity.get('is_opportunity')))
+
+    return list(labeled.items())
+
+async def retrain(db, analyzer=None, path: str = LOCAL_CLASSIFIER_PATH) -> Optional[Dict]:
+    """Treina um novo modelo; só o ativa se concordar o suficiente com a LLM"""
+    samples = await load_training_data(db)
+    if len(samples) < LOCAL_CLASSIFIER_MIN_SAMPLES:
+        logger.info(f"Classificador local: {len(samples)} exemplos, mínimo {LOCAL_CLASSIFIER_MIN_SAMPLES}")
+        return None
+
+    # Treino é CPU e Python puro na extração de features: processo separado (não segura o GIL da API)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        model, report = await asyncio.get_running_loop().run_in_executor(pool, train, samples)
+    logger.info(f"Classificador local treinado: {report}")
+
+    agreement = report.get('agreement_on_skipped')
+    if agreement is None or agreement < LOCAL_CLASSIFIER_MIN_AGREEMENT:
+        logger.warning("Classificador local abaixo da concordância mínima; modelo não ativado")
+        return report
+
+    await asyncio.to_thread(model.save, path)
+    if analyzer is not None:
+        analyzer.local_classifier = model
+    return report
+
+async def run_retraining_loop(db, analyzer, on_update=None,
+                              interval: int = LOCAL_CLASSIFIER_RETRAIN_INTERVAL):
+    """Retreino periódico em background"""
+    while True:
+        try:
+            previous = analyzer.local_classifier
+            await retrain(db, analyzer)
+            if on_update and analyzer.local_classifier is not previous:
+                on_update()
+        except Exception as e:
+            logger.error(f"Erro no retreino do classificador local: {e}")
+        await asyncio.sleep(interval)
+
+if __name__ == "__main__":
+    import argparse
+    from database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Treino e avaliação do classificador local")
+    parser.add_argument('command', choices=['train', 'evaluate'])
+    parser.add_argument('--report', default=None, help="arquivo JSON para o relatório de avaliação")
+    args = parser.parse_args()
+
+    async def main():
+        db = DatabaseManager()
+        if args.command == 'train':
+            report = await retrain(db)
+        else:
+            model = LocalClassifier.load()
+            if model is None:
+                raise SystemExit(f"Modelo não encontrado em {LOCAL_CLASSIFIER_PATH}")
+            # Só a partição de teste: exemplos de treino inflariam a concordância
+            report = evaluate(model, split_samples(await load_training_data(db))[2])
+        await db.close()
+
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+Preços de Referência de Mercado Derivados das Ofertas Recentes dos Canais
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import logging
+
+import numpy as np
+
+from config import (
+    MARKET_REFERENCE_INTERVAL,
+    MARKET_REFERENCE_WINDOW_HOURS,
+    MARKET_REFERENCE_MIN_SAMPLES
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def reference_from_prices(prices: List[float]) -> Dict:
+    """Mediana e faixa p10-p90 (robustas a ofertas com preço digitado errado)"""
+    values = np.asarray(prices, dtype=np.float64)
+    p10, median, p90 = np.percentile(values, [10, 50, 90])
+    return {
+        'avg_price': round(float(median), 2),
+        'price_range': (round(float(p10), 2), round(float(p90), 2)),
+        'samples': len(values)
+    }
+
+class MarketReferenceUpdater:
+    def __init__(self, db, min_samples: int = MARKET_REFERENCE_MIN_SAMPLES):
+        self.db = db
+        self.min_samples = min_samples
+        self.references: Dict[str, Dict] = {}
+        self.last_refresh: Optional[datetime] = None
+
+    async def refresh(self, hours: int = MARKET_REFERENCE_WINDOW_HOURS) -> int:
+        """Recalcula as referências e grava em market_data (os listeners de escrita atualizam o AIAnalyzer)"""
+        prices = await self.db.get_offer_prices(datetime.now() - timedelta(hours=hours))
+        saved = 0
+
+        for program, values in prices.items():
+            if len(values) < self.min_samples:
+                continue
+            reference = reference_from_prices(values)
+            await self.db.save_market_data({'program': program, 'source': 'offers', **reference})
+            self.references[program] = reference
+            saved += 1
+
+        self.last_refresh = datetime.now()
+        logger.info(f"Referências de mercado recalculadas: {saved} programas")
+        return saved
+
+    async def run(self, interval: int = MARKET_REFERENCE_INTERVAL):
+        """Recalcula periodicamente em background"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Erro ao recalcular referências de mercado: {e}")
+            await asyncio.sleep(interval)
+
+    def get_stats(self) -> Dict:
+        return {
+            'references': self.references,
+            'last_refresh': self.last_refresh.isoformat() if self.last_refresh else None
+        }
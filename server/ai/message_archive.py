@@ -0,0 +1,264 @@
+"""
+Arquivo Colunar (Parquet) de Mensagens e Análises Antigas
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import logging
+
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from bson import ObjectId
+from pymongo import ASCENDING
+
+from config import ARCHIVE_DIR, ARCHIVE_CHUNK_SIZE, ARCHIVE_COMPRESSION
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Esquema por coleção: campo de tempo (particionamento) e colunas tipadas.
+# Campos fora do esquema vão serializados em JSON na coluna 'extra'.
+ARCHIVE_SCHEMAS = {
+    'telegram_messages': {
+        'time_field': 'processed_at',
+        'schema': pa.schema([
+            ('_id', pa.string()),
+            ('processed_at', pa.timestamp('ms')),
+            ('channel', pa.string()),
+            ('message_id', pa.int64()),
+            ('author', pa.string()),
+            ('date', pa.string()),
+            ('text', pa.string()),
+            ('raw_data', pa.string()),
+            ('extra', pa.string())
+        ])
+    },
+    'ai_analyses': {
+        'time_field': 'created_at',
+        'schema': pa.schema([
+            ('_id', pa.string()),
+            ('created_at', pa.timestamp('ms')),
+            ('type', pa.string()),
+            ('data', pa.string()),
+            ('extra', pa.string())
+        ])
+    }
+}
+
+# Colunas armazenadas como JSON
+JSON_COLUMNS = ('raw_data', 'data', 'extra')
+
+def _json(value) -> Optional[str]:
+    if value is None:
+        return None
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+def _to_row(document: Dict, schema: pa.Schema) -> Dict:
+    """Converte documento do Mongo em linha do esquema colunar"""
+    row = {}
+    extra = {}
+    names = set(schema.names)
+
+    for key, value in document.items():
+        if key == '_id':
+            row['_id'] = str(value)
+        elif key in names and key != 'extra':
+            row[key] = _json(value) if key in JSON_COLUMNS else value
+        else:
+            extra[key] = value
+
+    row['extra'] = _json(extra) if extra else None
+    return row
+
+class MessageArchive:
+    def __init__(self, db, base_dir: str = ARCHIVE_DIR):
+        self.db = db
+        self.base_dir = base_dir
+
+    def _partition_dir(self, collection: str, day) -> str:
+        return os.path.join(self.base_dir, collection, f"date={day.isoformat()}")
+
+    def _write_partition(self, collection: str, day, rows: List[Dict]):
+        """Grava linhas de um dia em um arquivo Parquet comprimido"""
+        schema = ARCHIVE_SCHEMAS[collection]['schema']
+        directory = self._partition_dir(collection, day)
+        os.makedirs(directory, exist_ok=True)
+
+        # Nome determinístico: reexecutar após falha sobrescreve em vez de duplicar
+        path = os.path.join(directory, f"part-{rows[0]['_id']}.parquet")
+        table = pa.Table.from_pylist(rows, schema=schema)
+        pq.write_table(table, path + '.tmp', compression=ARCHIVE_COMPRESSION)
+        os.replace(path + '.tmp', path)
+
+    def _flush_chunk(self, collection: str, time_field: str, rows: List[Dict]):
+        """Agrupa o lote por dia e grava um arquivo por partição"""
+        by_day: Dict = {}
+        for row in rows:
+            by_day.setdefault(row[time_field].date(), []).append(row)
+
+        for day, day_rows in by_day.items():
+            self._write_partition(collection, day, day_rows)
+
+    async def archive_collection(self,
+                                 collection: str,
+                                 cutoff: datetime,
+                                 chunk_size: int = ARCHIVE_CHUNK_SIZE) -> int:
+        """Move documentos anteriores a cutoff do Mongo para o arquivo Parquet"""
+        spec = ARCHIVE_SCHEMAS[collection]
+        time_field = spec['time_field']
+        mongo_collection = self.db.db[collection]
+        archived = 0
+
+        cursor = mongo_collection.find(
+            {time_field: {'$lt': cutoff}}
+        ).sort(time_field, ASCENDING).batch_size(chunk_size)
+
+        rows: List[Dict] = []
+        async for document in cursor:
+            rows.append(_to_row(document, spec['schema']))
+
+            if len(rows) >= chunk_size:
+                archived += await self._archive_chunk(collection, time_field, rows, mongo_collection)
+                rows = []
+
+        if rows:
+            archived += await self._archive_chunk(collection, time_field, rows, mongo_collection)
+
+        if archived:
+            logger.info(f"Arquivados {archived} documentos de {collection}")
+        return archived
+
+    async def _archive_chunk(self, collection: str, time_field: str,
+                             rows: List[Dict], mongo_collection) -> int:
+        """Grava o lote em disco (fora do event loop) e só então remove do Mongo"""
+        await asyncio.to_thread(self._flush_chunk, collection, time_field, rows)
+        ids = [ObjectId(row['_id']) for row in rows]
+        result = await mongo_collection.delete_many({'_id': {'$in': ids}})
+        return result.deleted_count
+
+    async def archive_old_data(self, days: int = 90) -> Dict:
+        """Arquiva mensagens e análises mais antigas que 'days' dias; erros ficam em 'failed' por coleção"""
+        cutoff = datetime.now() - timedelta(days=days)
+        result = {'archived': {}, 'failed': {}}
+        for collection in ARCHIVE_SCHEMAS:
+            try:
+                result['archived'][collection] = await self.archive_collection(collection, cutoff)
+                if result['archived'][collection]:
+                    # Documentos saíram do Mongo: índices em memória se reconstroem
+                    self.db.notify_write(collection, {'status': 'deleted'})
+            except Exception as e:
+                logger.error(f"Erro ao arquivar {collection}: {e}")
+                result['failed'][collection] = str(e)
+        return result
+
+    def _partition_files(self, collection: str,
+                         start: Optional[datetime], end: Optional[datetime]) -> List[str]:
+        """Lista arquivos das partições dentro do intervalo (poda por data)"""
+        root = os.path.join(self.base_dir, collection)
+        if not os.path.isdir(root):
+            return []
+
+        files = []
+        for partition in sorted(os.listdir(root)):
+            if not partition.startswith('date='):
+                continue
+            day = datetime.strptime(partition[5:], '%Y-%m-%d').date()
+            if (start and day < start.date()) or (end and day > end.date()):
+                continue
+            directory = os.path.join(root, partition)
+            files.extend(
+                os.path.join(directory, name)
+                for name in sorted(os.listdir(directory)) if name.endswith('.parquet')
+            )
+        return files
+
+    def scan(self,
+             collection: str,
+             start: Optional[datetime] = None,
+             end: Optional[datetime] = None,
+             columns: Optional[List[str]] = None,
+             filters: Optional[List] = None) -> pa.Table:
+        """Lê o arquivo com memory-map, apenas as colunas pedidas e partições do intervalo"""
+        spec = ARCHIVE_SCHEMAS[collection]
+        time_field = spec['time_field']
+        files = self._partition_files(collection, start, end)
+
+        if columns and time_field not in columns:
+            columns = list(columns) + [time_field]
+
+        if not files:
+            schema = spec['schema']
+            if columns:
+                schema = pa.schema([schema.field(name) for name in columns])
+            return schema.empty_table()
+
+        row_filters = list(filters or [])
+        if start:
+            row_filters.append((time_field, '>=', start))
+        if end:
+            row_filters.append((time_field, '<', end))
+
+        # Sem partitioning: a pasta 'date=' colidiria com a coluna 'date' das mensagens
+        return pq.read_table(
+            files,
+            columns=columns,
+            filters=row_filters or None,
+            schema=spec['schema'],
+            partitioning=None,
+            memory_map=True
+        )
+
+    async def query(self,
+                    collection: str,
+                    start: datetime,
+                    end: Optional[datetime] = None,
+                    query: Optional[Dict] = None,
+                    columns: Optional[List[str]] = None) -> List[Dict]:
+        """Consulta combinada: dados quentes do Mongo + arquivo frio, ordenados por tempo"""
+        spec = ARCHIVE_SCHEMAS[collection]
+        time_field = spec['time_field']
+        query = query or {}
+
+        time_range = {'$gte': start}
+        if end:
+            time_range['$lt'] = end
+
+        projection = {name: 1 for name in columns} if columns else None
+        cursor = self.db.db[collection].find({**query, time_field: time_range}, projection)
+        hot = await cursor.to_list(length=None)
+        for document in hot:
+            document['_id'] = str(document['_id'])
+
+        # Igualdades simples do filtro Mongo viram filtros de linha no Parquet
+        filters = [(key, '=', value) for key, value in query.items() if not isinstance(value, dict)]
+        table = await asyncio.to_thread(self.scan, collection, start, end, columns, filters)
+        cold = table.to_pylist()
+
+        for row in cold:
+            for column in JSON_COLUMNS:
+                if row.get(column):
+                    row[column] = orjson.loads(row[column])
+
+        # Remove duplicatas de arquivamentos interrompidos (mesmo _id nos dois lados)
+        hot_ids = {document['_id'] for document in hot}
+        rows = hot + [row for row in cold if row.get('_id') not in hot_ids]
+        rows.sort(key=lambda row: row.get(time_field) or datetime.min)
+        return rows
+
+if __name__ == "__main__":
+    import argparse
+    from database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Arquiva mensagens e análises antigas em Parquet")
+    parser.add_argument('--days', type=int, default=90)
+    args = parser.parse_args()
+
+    async def main():
+        db = DatabaseManager()
+        print(await MessageArchive(db).archive_old_data(args.days))
+        await db.close()
+
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""
+Extração de Dados Estruturados de Mensagens de Milhas
+"""
+
+import re
+import unicodedata
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Optional
+
+# Preço com moeda opcional: "16", "16.5", "16,50", "$16", "r$16", "r$ 16"
+PRICE = r'(?:r\$\s?|\$\s?)?\d+(?:[.,]\d+)?'
+
+# Padrões para extrair informações
+EXTRACTION_PATTERNS = {
+    'compra': re.compile(rf'(?:compro|buy|compra)\s+(\w+)\s+(\d+(?:\.\d+)?[k]?)\s+(\d+)\s+cpf\s+({PRICE})'),
+    'venda': re.compile(rf'(?:vendo|sell|venda)\s+(\w+)\s+(\d+(?:\.\d+)?[k]?)\s+(\d+)\s+cpf\s+({PRICE})'),
+    'preco_por_mil': re.compile(rf'({PRICE})\s*/\s*(?:mil|k)'),
+    'quantidade': re.compile(r'(\d+(?:\.\d+)?[k]?)\s*(?:milhas|miles)'),
+    'programa': re.compile(r'(smiles|latam|tudoazul|livelo|iberia|avios)'),
+    'cpf': re.compile(r'(\d+)\s+cpf'),
+    'preco_total': re.compile(rf'total[:\s]*({PRICE})')
+}
+
+# Nomes e apelidos -> programa canônico
+PROGRAM_ALIASES = {
+    'smiles': 'smiles',
+    'gol': 'smiles',
+    'latam': 'latam',
+    'latampass': 'latam',
+    'multiplus': 'latam',
+    'tudoazul': 'tudoazul',
+    'azul': 'tudoazul',
+    'livelo': 'livelo',
+    'iberia': 'iberia',
+    'avios': 'avios'
+}
+
+THOUSANDS_SEPARATED = re.compile(r'\d{1,3}(?:\.\d{3})+')
+
+def fold_accents(text: str) -> str:
+    """Minúsculas sem acentos"""
+    normalized = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in normalized if not unicodedata.combining(char))
+
+def extract_raw_data(text: str) -> Dict:
+    """Extrai capturas de regex (programa, quantidade, preço, CPFs) do texto"""
+    text_lower = text.lower()
+    raw_data = {}
+
+    for key, pattern in EXTRACTION_PATTERNS.items():
+        match = pattern.search(text_lower)
+        if match:
+            raw_data[key] = match.groups() if len(match.groups()) > 1 else match.group(1)
+
+    return raw_data
+
+def canonical_program(value) -> Optional[str]:
+    """Programa canônico ('gol' -> 'smiles'); None se desconhecido"""
+    if not value:
+        return None
+    return PROGRAM_ALIASES.get(str(value).strip().lower().replace(' ', ''))
+
+def parse_quantity(value) -> Optional[int]:
+    """Converte quantidade de milhas ('50k', '83000', '1.5k', '1,5k', '100.000') em inteiro"""
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    if THOUSANDS_SEPARATED.fullmatch(text):
+        text = text.replace('.', '')
+    # Vírgula decimal ('1,5k')
+    text = text.replace(',', '.')
+    multiplier = 1000 if text.endswith('k') else 1
+    try:
+        quantity = Decimal(text.rstrip('k'))
+    except InvalidOperation:
+        return None
+    # 'NaN' e 'inf' são Decimals válidos, mas não quantidades
+    return int(quantity * multiplier) if quantity.is_finite() else None
+
+def parse_price(value) -> Optional[Decimal]:
+    """Converte preço ('r$16', '$16.5', '16,50') em Decimal, sem a moeda"""
+    if value is None:
+        return None
+    text = str(value).strip().lower().replace('r$', '').replace('$', '').strip().replace(',', '.')
+    try:
+        price = Decimal(text)
+    except InvalidOperation:
+        return None
+    return price if price.is_finite() else None
+
+def normalize_offer(raw_data: Dict) -> Optional[Dict]:
+    """Oferta tipada (lado, programa, quantidade, preço por mil, CPFs) a partir das capturas"""
+    offer = None
+
+    for side in ('compra', 'venda'):
+        groups = raw_data.get(side)
+        if groups:
+            program, quantity, cpf_count, price = groups
+            offer = {
+                'side': side,
+                'program': canonical_program(program) or canonical_program(raw_data.get('programa')),
+                'quantity': parse_quantity(quantity),
+                'price_per_thousand': parse_price(price),
+                'cpf_count': int(cpf_count)
+            }
+            break
+
+    if offer is None:
+        if not raw_data.get('programa'):
+            return None
+        offer = {
+            'side': None,
+            'program': canonical_program(raw_data['programa']),
+            'quantity': parse_quantity(raw_data.get('quantidade')),
+            'price_per_thousand': parse_price(raw_data.get('preco_por_mil')),
+            'cpf_count': int(raw_data['cpf']) if raw_data.get('cpf') else None
+        }
+
+    offer['total_price'] = parse_price(raw_data.get('preco_total'))
+    if offer['total_price'] is None and offer['quantity'] and offer['price_per_thousand'] is not None:
+        offer['total_price'] = offer['price_per_thousand'] * offer['quantity'] / 1000
+
+    return offer
+
+# Acima disso um "preço por milha" já está por mil (R$ 0,50 por milha = R$ 500 o milheiro, fora de mercado)
+PER_MILE_LIMIT = Decimal('0.5')
+
+def _per_thousand(analysis: Dict) -> Optional[Decimal]:
+    """Preço por mil milhas; 'price_per_mile' (esquema antigo) é normalizado pela magnitude"""
+    price = parse_price(analysis.get('price_per_thousand'))
+    if price is not None:
+        return price
+
+    # O modelo costuma responder por mil mesmo no campo por milha (contexto de mercado é por mil)
+    price = parse_price(analysis.get('price_per_mile'))
+    if price is not None and price < PER_MILE_LIMIT:
+        return price * 1000
+    return price
+
+def offer_from_analysis(analysis: Dict) -> Optional[Dict]:
+    """Oferta tipada a partir dos campos numéricos da análise da IA (sem capturas de regex)"""
+    program = canonical_program(analysis.get('program'))
+    if not program:
+        return None
+
+    side = analysis.get('opportunity_type')
+    return {
+        'side': side if side in ('compra', 'venda') else None,
+        'program': program,
+        'quantity': parse_quantity(analysis.get('quantity')),
+        'price_per_thousand': _per_thousand(analysis),
+        'cpf_count': parse_quantity(analysis.get('cpf_count')),
+        'total_price': parse_price(analysis.get('total_price'))
+    }
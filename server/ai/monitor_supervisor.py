@@ -0,0 +1,224 @@
+"""
+Supervisor do Monitor Telegram em Processo Separado
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+import logging
+
+from config import MONITOR_HEARTBEAT_INTERVAL, MONITOR_RESTART_BACKOFF_MAX, MONITOR_STOP_TIMEOUT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Campos de documentos repassados à API para invalidar caches e agendar expiração
+FORWARDED_FIELDS = (
+    '_id', 'id', 'status', 'ids', 'expires_at', 'user_id', 'program', 'avg_price', 'price_range',
+    # Campos indexados pela busca
+    'channel', 'message_id', 'text', 'offer', 'processed_at', 'summary', 'source', 'analysis', 'created_at'
+)
+
+def run_monitor_process(conn):
+    """Ponto de entrada do processo filho: executa o monitor em seu próprio event loop"""
+    from telegram_monitor import TelegramMonitor
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        monitor = TelegramMonitor()
+        started_at = time.time()
+        send_lock = threading.Lock()
+
+        def send(message):
+            with send_lock:
+                conn.send(message)
+
+        def on_write(collection: str, document: Dict):
+            send(('write', collection, {k: document[k] for k in FORWARDED_FIELDS if k in document}))
+
+        monitor.db.add_write_listener(on_write)
+
+        async def handle_command(command: str):
+            if command == 'stop':
+                await monitor.client.disconnect()
+            elif command == 'reload_alerts' and monitor.alert_index:
+                await monitor.alert_index.load()
+            elif command == 'reload_classifier':
+                monitor.ai_analyzer.reload_local_classifier()
+            elif isinstance(command, tuple) and command[0] == 'market_reference':
+                _, program, avg_price, price_range = command
+                monitor.ai_analyzer.update_market_reference(program, avg_price, price_range)
+            elif isinstance(command, tuple) and command[0] == 'llm_usage' and monitor.budget_scheduler:
+                _, channel, usage, elapsed = command
+                monitor.budget_scheduler.record_external(channel, usage, elapsed)
+
+        def read_commands():
+            # Thread bloqueante: funciona também no Windows (sem add_reader)
+            while True:
+                try:
+                    command = conn.recv()
+                except (EOFError, OSError):
+                    command = 'stop'
+                asyncio.run_coroutine_threadsafe(handle_command(command), loop)
+                if command == 'stop':
+                    return
+
+        async def heartbeat():
+            while True:
+                send(('status', {
+                    'pid': os.getpid(),
+                    'uptime': time.time() - started_at,
+                    'connected': monitor.client.is_connected(),
+                    'dedup': monitor.deduplicator.get_stats(),
+                    'alerts': len(monitor.alert_index) if monitor.alert_index else 0,
+                    'channels': monitor.resolver.get_stats(),
+                    'llm_budget': monitor.budget_scheduler.get_stats() if monitor.budget_scheduler else None,
+                    'snapshot': monitor.snapshots.get_stats() if monitor.snapshots else None
+                }))
+                await asyncio.sleep(MONITOR_HEARTBEAT_INTERVAL)
+
+        threading.Thread(target=read_commands, daemon=True).start()
+        heartbeat_task = asyncio.create_task(heartbeat())
+        try:
+            await monitor.start()
+        finally:
+            heartbeat_task.cancel()
+
+    asyncio.run(main())
+
+class MonitorSupervisor:
+    def __init__(self, on_write: Optional[Callable[[str, Dict], None]] = None):
+        self.on_write = on_write
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._conn = None
+        self._reader = None
+        self._watch_task = None
+        self._loop = None
+
+        self.desired_running = False
+        self.restarts = 0
+        self.started_at = None
+        self.last_status: Dict = {}
+        self.last_heartbeat = None
+        self.last_exit_code = None
+
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def _spawn(self):
+        # Reinício após queda: libera o pipe e o processo anteriores (evita vazar descritores)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._process is not None and not self._process.is_alive():
+            self._process.close()
+            self._process = None
+
+        parent_conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=run_monitor_process,
+            args=(child_conn,),
+            name='telegram-monitor',
+            daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+
+        self._conn = parent_conn
+        self.started_at = time.time()
+        self._reader = threading.Thread(target=self._read_events, args=(parent_conn,), daemon=True)
+        self._reader.start()
+        logger.info(f"Monitor iniciado no processo {self._process.pid}")
+
+    def _read_events(self, conn):
+        """Thread que recebe eventos do processo filho e os repassa ao event loop da API"""
+        while True:
+            try:
+                event = conn.recv()
+            except (EOFError, OSError):
+                return
+            self._loop.call_soon_threadsafe(self._handle_event, event)
+
+    def _handle_event(self, event):
+        kind = event[0]
+        if kind == 'status':
+            self.last_status = event[1]
+            self.last_heartbeat = time.time()
+        elif kind == 'write' and self.on_write:
+            self.on_write(event[1], event[2])
+
+    async def _watch(self):
+        """Reinicia o monitor com backoff exponencial se o processo cair"""
+        backoff = 1
+        while self.desired_running:
+            await asyncio.sleep(1)
+            if not self.desired_running or self.is_running():
+                # Execução estável reinicia o backoff
+                if self.started_at and time.time() - self.started_at > MONITOR_RESTART_BACKOFF_MAX:
+                    backoff = 1
+                continue
+
+            self.last_exit_code = self._process.exitcode if self._process else None
+            logger.error(f"Monitor encerrado (código {self.last_exit_code}); reiniciando em {backoff}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MONITOR_RESTART_BACKOFF_MAX)
+
+            if self.desired_running:
+                self.restarts += 1
+                self._spawn()
+
+    def start(self):
+        """Inicia o monitor em processo separado, supervisionado"""
+        if self.is_running():
+            return
+        self._loop = asyncio.get_running_loop()
+        self.desired_running = True
+        self._spawn()
+        self._watch_task = asyncio.create_task(self._watch())
+
+    def send(self, command):
+        """Envia comando ao processo do monitor (nome ou tupla com argumentos)"""
+        if self.is_running():
+            try:
+                self._conn.send(command)
+            except (BrokenPipeError, OSError) as e:
+                logger.error(f"Erro ao enviar comando ao monitor: {e}")
+
+    async def stop(self):
+        """Para o monitor: desconexão graciosa, depois terminate se necessário"""
+        self.desired_running = False
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+
+        if not self._process:
+            return
+
+        self.send('stop')
+        await asyncio.to_thread(self._process.join, MONITOR_STOP_TIMEOUT)
+        if self._process.is_alive():
+            logger.warning("Monitor não encerrou a tempo; finalizando processo")
+            self._process.terminate()
+            await asyncio.to_thread(self._process.join, MONITOR_STOP_TIMEOUT)
+
+        self.last_exit_code = self._process.exitcode
+        self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def status(self) -> Dict:
+        """Estado do monitor para a API"""
+        return {
+            'mode': 'process',
+            'state': 'running' if self.is_running() else ('restarting' if self.desired_running else 'stopped'),
+            'pid': self._process.pid if self._process else None,
+            'restarts': self.restarts,
+            'uptime': time.time() - self.started_at if self.is_running() and self.started_at else None,
+            'last_heartbeat': self.last_heartbeat,
+            'last_exit_code': self.last_exit_code,
+            'monitor': self.last_status
+        }
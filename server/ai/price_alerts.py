@@ -0,0 +1,178 @@
+"""
+Alertas de Preço: Assinaturas Indexadas por Intervalo de Preço
+"""
+
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from message_parser import canonical_program
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ALERT_SIDES = ('compra', 'venda')
+
+class _IntervalNode:
+    """Nó de árvore de intervalos centrada"""
+
+    __slots__ = ('center', 'by_start', 'starts', 'by_end', 'ends', 'left', 'right')
+
+    def __init__(self, intervals: List[Tuple[float, float, Dict]]):
+        points = sorted(point for start, end, _ in intervals for point in (start, end))
+        self.center = points[len(points) // 2]
+
+        here, left, right = [], [], []
+        for interval in intervals:
+            if interval[1] < self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                here.append(interval)
+
+        # Intervalos que contêm o centro, ordenados pelas duas pontas
+        self.by_start = sorted(here, key=lambda interval: interval[0])
+        self.starts = [interval[0] for interval in self.by_start]
+        self.by_end = sorted(here, key=lambda interval: -interval[1])
+        self.ends = [-interval[1] for interval in self.by_end]
+
+        self.left = _IntervalNode(left) if left else None
+        self.right = _IntervalNode(right) if right else None
+
+    def stab(self, point: float, result: List[Dict]):
+        """Coleta os intervalos que contêm o ponto: O(log n + k)"""
+        node = self
+        while node:
+            if point < node.center:
+                count = bisect_right(node.starts, point)
+                result.extend(interval[2] for interval in node.by_start[:count])
+                node = node.left
+            elif point > node.center:
+                count = bisect_right(node.ends, -point)
+                result.extend(interval[2] for interval in node.by_end[:count])
+                node = node.right
+            else:
+                result.extend(interval[2] for interval in node.by_start)
+                return
+
+class IntervalIndex:
+    """Conjunto de intervalos com consulta por ponto; reconstruído sob demanda após mudanças"""
+
+    def __init__(self):
+        self._intervals: Dict[str, Tuple[float, float, Dict]] = {}
+        self._root: Optional[_IntervalNode] = None
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def add(self, key: str, start: float, end: float, value: Dict):
+        self._intervals[key] = (start, end, value)
+        self._dirty = True
+
+    def remove(self, key: str) -> bool:
+        if self._intervals.pop(key, None) is None:
+            return False
+        self._dirty = True
+        return True
+
+    def stab(self, point: float) -> List[Dict]:
+        if self._dirty:
+            intervals = list(self._intervals.values())
+            self._root = _IntervalNode(intervals) if intervals else None
+            self._dirty = False
+
+        result: List[Dict] = []
+        if self._root:
+            self._root.stab(point, result)
+        return result
+
+class PriceAlertIndex:
+    """Regras de alerta em memória, uma árvore de intervalos por (programa, lado)"""
+
+    def __init__(self, db):
+        self.db = db
+        self._indexes: Dict[Tuple[str, str], IntervalIndex] = {}
+        self._alerts: Dict[str, Dict] = {}
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def _add(self, alert: Dict):
+        alert_id = str(alert['_id'])
+        # Regras antigas podem ter sido salvas com apelido ('gol'): indexa pelo nome canônico
+        alert = {**alert, '_id': alert_id, 'program': canonical_program(alert['program']) or alert['program'].lower()}
+        key = (alert['program'], alert['side'])
+        self._alerts[alert_id] = alert
+        self._indexes.setdefault(key, IntervalIndex()).add(
+            alert_id, alert['min_price'], alert['max_price'], alert
+        )
+
+    def _remove(self, alert_id: str) -> Optional[Dict]:
+        alert = self._alerts.pop(alert_id, None)
+        if alert:
+            self._indexes[(alert['program'], alert['side'])].remove(alert_id)
+        return alert
+
+    async def load(self) -> int:
+        """Carrega regras salvas no Mongo"""
+        self._indexes = {}
+        self._alerts = {}
+        for alert in await self.db.get_price_alerts():
+            self._add(alert)
+        logger.info(f"Alertas de preço carregados: {len(self._alerts)}")
+        return len(self._alerts)
+
+    async def add_alert(self, alert: Dict) -> Optional[str]:
+        """Persiste e indexa uma nova regra de alerta"""
+        if alert['side'] not in ALERT_SIDES:
+            raise ValueError(f"Lado inválido: {alert['side']}")
+        if alert['min_price'] > alert['max_price']:
+            raise ValueError("Preço mínimo maior que o máximo")
+        # Mesma normalização das ofertas ('gol' -> 'smiles')
+        program = canonical_program(alert['program'])
+        if not program:
+            raise ValueError(f"Programa desconhecido: {alert['program']}")
+
+        alert = {**alert, 'program': program}
+        alert_id = await self.db.save_price_alert(alert)
+        if alert_id:
+            self._add({**alert, '_id': alert_id})
+        return alert_id
+
+    async def remove_alert(self, alert_id: str) -> bool:
+        """Remove regra do índice e do Mongo"""
+        self._remove(alert_id)
+        return await self.db.delete_price_alert(alert_id)
+
+    def get_user_alerts(self, user_id: str) -> List[Dict]:
+        return [alert for alert in self._alerts.values() if alert.get('user_id') == user_id]
+
+    def match(self, offer: Dict) -> List[Dict]:
+        """Regras satisfeitas por uma oferta (programa, lado, preço por mil, quantidade)"""
+        price = offer.get('price_per_thousand')
+        if price is None or not offer.get('program'):
+            return []
+        price = float(price)
+
+        sides = [offer['side']] if offer.get('side') else ALERT_SIDES
+        quantity = offer.get('quantity') or 0
+        matches = []
+
+        for side in sides:
+            index = self._indexes.get((canonical_program(offer['program']) or offer['program'].lower(), side))
+            if not index:
+                continue
+            matches.extend(
+                alert for alert in index.stab(price)
+                if quantity >= alert.get('min_quantity', 0)
+            )
+
+        return matches
+
+    def get_stats(self) -> Dict:
+        return {
+            'alerts': len(self._alerts),
+            'indexes': {f"{program}:{side}": len(index) for (program, side), index in self._indexes.items()}
+        }
@@ -0,0 +1,223 @@
+"""
+Cache de Recomendações Personalizadas da IA
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import logging
+
+from config import (
+    RECOMMENDATION_CACHE_TTL,
+    RECOMMENDATION_CACHE_MAX_ENTRIES,
+    RECOMMENDATION_PRECOMPUTE_INTERVAL,
+    RECOMMENDATION_ACTIVE_WINDOW
+)
+from snapshot import json_section, read_json
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Campos do perfil que não influenciam a recomendação
+IGNORED_PROFILE_FIELDS = ('_id', 'updated_at')
+
+class RecommendationCache:
+    def __init__(self,
+                 ttl: int = RECOMMENDATION_CACHE_TTL,
+                 max_entries: int = RECOMMENDATION_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # user_id -> (chave, expira_em, recomendações)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # chave -> future da chamada em andamento
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # user_id -> último pedido (para pré-cálculo)
+        self._active_users: Dict[str, float] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def relevant_profile(profile: Dict) -> Dict:
+        """Perfil sem campos de controle (também é o que vai para a IA)"""
+        return {k: v for k, v in profile.items() if k not in IGNORED_PROFILE_FIELDS}
+
+    @classmethod
+    def profile_hash(cls, profile: Dict) -> str:
+        """Gera hash estável do perfil do usuário"""
+        payload = json.dumps(cls.relevant_profile(profile), sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def make_key(self, profile: Dict, market_version: int) -> str:
+        """Chave do cache: hash do perfil + versão do mercado"""
+        return f"{self.profile_hash(profile)}:{market_version}"
+
+    def get(self, user_id: str, key: str) -> Optional[Dict]:
+        """Retorna recomendações em cache se ainda válidas"""
+        entry = self._entries.get(user_id)
+        if not entry:
+            return None
+
+        entry_key, expires_at, recommendations = entry
+        if entry_key != key or expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+
+        self._entries.move_to_end(user_id)
+        return recommendations
+
+    def set(self, user_id: str, key: str, recommendations: Dict):
+        """Armazena recomendações no cache"""
+        self._entries[user_id] = (key, time.monotonic() + self.ttl, recommendations)
+        self._entries.move_to_end(user_id)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self,
+                             user_id: str,
+                             profile: Dict,
+                             market_version: int,
+                             compute: Callable[[Dict], Awaitable[Dict]]) -> Dict:
+        """Retorna recomendações do cache ou calcula agrupando pedidos idênticos"""
+        self._active_users[user_id] = time.monotonic()
+        key = self.make_key(profile, market_version)
+
+        cached = self.get(user_id, key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+
+        inflight = self._inflight.get(key)
+        if inflight:
+            try:
+                recommendations = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # Pedido líder cancelado (cliente desconectou): este pedido assume o cálculo
+                return await self.get_or_compute(user_id, profile, market_version, compute)
+        else:
+            recommendations = await self._compute(key, profile, compute)
+
+        # Resposta vazia indica erro na IA; não deve ser cacheada
+        if recommendations:
+            self.set(user_id, key, recommendations)
+
+        return recommendations
+
+    async def _compute(self, key: str, profile: Dict,
+                       compute: Callable[[Dict], Awaitable[Dict]]) -> Dict:
+        """Executa o cálculo compartilhando o resultado com pedidos idênticos"""
+        future = asyncio.get_running_loop().create_future()
+        # Evita aviso de exceção não consumida quando não há outros aguardando
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+
+        try:
+            recommendations = await compute(self.relevant_profile(profile))
+            future.set_result(recommendations)
+            return recommendations
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            # Cancelamento do líder: libera quem aguarda em vez de deixá-los presos
+            if not future.done():
+                future.cancel()
+
+    def invalidate(self, user_id: Optional[str]):
+        """Remove recomendações de um usuário"""
+        if user_id:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Remove todas as recomendações (ex.: movimento relevante de mercado)"""
+        self._entries.clear()
+
+    def active_users(self) -> list:
+        """Usuários com pedidos recentes"""
+        cutoff = time.monotonic() - RECOMMENDATION_ACTIVE_WINDOW
+        for user_id in [u for u, seen in self._active_users.items() if seen < cutoff]:
+            del self._active_users[user_id]
+        return list(self._active_users)
+
+    async def precompute(self, db, analyzer) -> int:
+        """Recalcula recomendações ausentes ou obsoletas dos usuários ativos"""
+        refreshed = 0
+
+        for user_id in self.active_users():
+            try:
+                profile = await db.get_user_profile(user_id)
+                if not profile:
+                    self._active_users.pop(user_id, None)
+                    continue
+
+                key = self.make_key(profile, analyzer.market_version)
+                if self.get(user_id, key) is not None:
+                    continue
+
+                seen = self._active_users[user_id]
+                await self.get_or_compute(user_id, profile, analyzer.market_version,
+                                          analyzer.get_ai_recommendations)
+                # Pré-cálculo não conta como atividade do usuário
+                self._active_users[user_id] = seen
+                refreshed += 1
+
+            except Exception as e:
+                logger.error(f"Erro no pré-cálculo de recomendações para {user_id}: {e}")
+
+        return refreshed
+
+    async def run_precompute_loop(self, db, analyzer,
+                                  interval: int = RECOMMENDATION_PRECOMPUTE_INTERVAL):
+        """Loop de pré-cálculo em background"""
+        while True:
+            refreshed = await self.precompute(db, analyzer)
+            if refreshed:
+                logger.info(f"Recomendações pré-calculadas: {refreshed}")
+            await asyncio.sleep(interval)
+
+    def snapshot_section(self) -> Tuple[Dict, bytes]:
+        """Entradas válidas (com TTL restante) e usuários ativos para o snapshot"""
+        now = time.monotonic()
+        return json_section({
+            'entries': [
+                [user_id, key, expires_at - now, recommendations]
+                for user_id, (key, expires_at, recommendations) in self._entries.items()
+                if expires_at > now
+            ],
+            'active_users': {user_id: now - seen for user_id, seen in self._active_users.items()}
+        })
+
+    def restore_section(self, meta: Dict, payload, created_at: float) -> bool:
+        """Restaura entradas descontando o tempo desde o snapshot"""
+        state = read_json(payload)
+        now = time.monotonic()
+        elapsed = time.time() - created_at
+
+        for user_id, key, remaining, recommendations in state['entries']:
+            if remaining > elapsed:
+                self._entries[user_id] = (key, now + remaining - elapsed, recommendations)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        for user_id, age in state['active_users'].items():
+            self._active_users[user_id] = now - age - elapsed
+        return True
+
+    def get_stats(self) -> Dict:
+        """Estatísticas do cache"""
+        return {
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+            'active_users': len(self._active_users),
+            'hits': self.hits,
+            'misses': self.misses
+        }
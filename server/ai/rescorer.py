@@ -0,0 +1,175 @@
+"""
+Recalculo em Massa das Oportunidades Ativas quando a Referência de Mercado Muda
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+import logging
+
+import numpy as np
+from pymongo import UpdateOne
+
+from config import RESCORE_CONFIDENCE_WEIGHT, RESCORE_MAX_ADJUSTMENT, RESCORE_BATCH_SIZE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Mesmo sinal do backtester: oferta de venda é boa abaixo do mercado, de compra acima
+SIDES = {'venda': 1, 'compra': -1}
+
+RESCORE_PROJECTION = {
+    '_id': 1, 'confidence': 1, 'offer.price_per_thousand': 1, 'offer.side': 1,
+    'analysis.confidence': 1, 'analysis.opportunity_type': 1,
+    'analysis.market_comparison.avg_market_price': 1, 'market_baseline': 1
+}
+
+def _number(value) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return number if number > 0 else np.nan
+
+def rescore(price: np.ndarray, side: np.ndarray, base_confidence: np.ndarray,
+            base_reference: np.ndarray, reference: float) -> Dict[str, np.ndarray]:
+    """Desvio contra a nova referência e confiança ajustada pela variação da vantagem de preço"""
+    deviation = (price - reference) / reference
+    advantage = -side * deviation
+    base_advantage = -side * (price - base_reference) / base_reference
+    adjustment = np.clip(RESCORE_CONFIDENCE_WEIGHT * (advantage - base_advantage),
+                         -RESCORE_MAX_ADJUSTMENT, RESCORE_MAX_ADJUSTMENT)
+    return {
+        'deviation': deviation,
+        'confidence': np.clip(base_confidence + adjustment, 0.0, 1.0)
+    }
+
+class OpportunityRescorer:
+    def __init__(self, db, ai_analyzer):
+        self.db = db
+        self.ai_analyzer = ai_analyzer
+        # Referência usada na última passada (base para análises sem preço de mercado)
+        self._references: Dict[str, float] = {
+            program: reference['avg_price'] for program, reference in ai_analyzer.market_data.items()
+        }
+        self._pending: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs = 0
+        self.rescored_total = 0
+        self.last_run: Optional[Dict] = None
+
+    def on_market_move(self, program: str, version: int):
+        """Listener do AIAnalyzer: agenda o recalculo do programa (movimentos seguidos se acumulam)"""
+        self._pending.add(program)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        while self._pending:
+            program = self._pending.pop()
+            await self.rescore_program(program)
+
+    async def _load(self, program: str):
+        """Campos numéricos das oportunidades ativas do programa, como arrays"""
+        ids: List = []
+        price, side, confidence, base_confidence, base_reference = [], [], [], [], []
+
+        cursor = self.db.opportunities.find(
+            {'status': 'active', 'offer.program': program, 'offer.price_per_thousand': {'$ne': None}},
+            RESCORE_PROJECTION
+        ).batch_size(RESCORE_BATCH_SIZE)
+
+        async for opportunity in cursor:
+            offer = opportunity.get('offer') or {}
+            analysis = opportunity.get('analysis') or {}
+            baseline = opportunity.get('market_baseline') or {}
+            ids.append(opportunity['_id'])
+            price.append(_number(offer.get('price_per_thousand')))
+            side.append(SIDES.get(offer.get('side') or analysis.get('opportunity_type'), 1))
+            confidence.append(float(opportunity.get('confidence') or 0.0))
+            # Base fixa (análise original): recalculos sucessivos não se acumulam
+            base_confidence.append(float(baseline.get('confidence', analysis.get('confidence', confidence[-1])) or 0.0))
+            base_reference.append(_number(
+                baseline.get('avg_price') or (analysis.get('market_comparison') or {}).get('avg_market_price')
+            ))
+
+        return ids, {
+            'price': np.array(price, dtype=np.float64),
+            'side': np.array(side, dtype=np.float64),
+            'confidence': np.array(confidence, dtype=np.float64),
+            'base_confidence': np.array(base_confidence, dtype=np.float64),
+            'base_reference': np.array(base_reference, dtype=np.float64)
+        }
+
+    async def rescore_program(self, program: str) -> int:
+        """Recalcula desvio e confiança das oportunidades ativas do programa e grava com bulk_write"""
+        started = time.monotonic()
+        reference = (self.ai_analyzer.market_data.get(program) or {}).get('avg_price')
+        if not reference:
+            return 0
+
+        try:
+            ids, columns = await self._load(program)
+            valid = ~np.isnan(columns['price'])
+            base_reference = columns['base_reference']
+            base_reference[np.isnan(base_reference)] = self._references.get(program, reference)
+
+            result = rescore(columns['price'], columns['side'], columns['base_confidence'], base_reference, reference)
+            now = datetime.now()
+            version = self.ai_analyzer.market_version
+
+            requests = [
+                UpdateOne({'_id': ids[i]}, {'$set': {
+                    'confidence': round(float(result['confidence'][i]), 4),
+                    'analysis.market_comparison': {
+                        'avg_market_price': reference,
+                        'price_difference': round(float(result['deviation'][i]) * 100, 2),
+                        'is_below_market': bool(result['deviation'][i] < 0)
+                    },
+                    'market_baseline': {
+                        'confidence': float(columns['base_confidence'][i]),
+                        'avg_price': float(base_reference[i])
+                    },
+                    'market_version': version,
+                    'rescored_at': now
+                }})
+                for i in np.flatnonzero(valid)
+            ]
+
+            for start in range(0, len(requests), RESCORE_BATCH_SIZE):
+                await self.db.opportunities.bulk_write(requests[start:start + RESCORE_BATCH_SIZE], ordered=False)
+
+            self._references[program] = reference
+            if requests:
+                # Invalida respostas em cache de /opportunities
+                self.db.notify_write('opportunities', {'status': 'rescored', 'program': program})
+
+            changed = result['confidence'][valid] - columns['confidence'][valid]
+            self.runs += 1
+            self.rescored_total += len(requests)
+            self.last_run = {
+                'program': program,
+                'reference': reference,
+                'market_version': version,
+                'rescored': len(requests),
+                'raised': int((changed > 1e-4).sum()),
+                'lowered': int((changed < -1e-4).sum()),
+                'seconds': round(time.monotonic() - started, 3),
+                'timestamp': now.isoformat()
+            }
+            logger.info(f"Oportunidades recalculadas: {program} ({len(requests)} em {self.last_run['seconds']}s)")
+            return len(requests)
+
+        except Exception as e:
+            logger.error(f"Erro ao recalcular oportunidades de {program}: {e}")
+            return 0
+
+    def get_stats(self) -> Dict:
+        return {
+            'runs': self.runs,
+            'rescored_total': self.rescored_total,
+            'pending': sorted(self._pending),
+            'last_run': self.last_run
+        }
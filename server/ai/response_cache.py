@@ -0,0 +1,191 @@
+"""
+Cache de Respostas HTTP com ETag para Endpoints de Leitura
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, Iterable, Set, Tuple
+import logging
+
+import orjson
+from bson import ObjectId, Decimal128
+from fastapi import Request, Response
+
+from config import RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CachedResponse:
+    """Corpo serializado e ETag de uma resposta"""
+
+    __slots__ = ('body', 'etag', 'tags', 'expires_at')
+
+    def __init__(self, body: bytes, tags: Set[str], ttl: int):
+        self.body = body
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self.tags = tags
+        self.expires_at = time.monotonic() + ttl
+
+def _json_default(value):
+    """Converte tipos do MongoDB não suportados nativamente pelo orjson"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+def serialize(data) -> bytes:
+    """Serializa documentos (ObjectId, datetime, tuplas) direto para JSON, sem validação Pydantic"""
+    return orjson.dumps(data, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+class ResponseCache:
+    def __init__(self,
+                 ttl: int = RESPONSE_CACHE_TTL,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        # tag (coleção) -> chaves dependentes
+        self._tag_index: Dict[str, Set[str]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Geração por tag, incrementada a cada invalidação: evita guardar leituras concorrentes
+        # a uma escrita nas coleções de que dependem (escritas em outras coleções não afetam)
+        self._generations: Dict[str, int] = {}
+        self._clears = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def make_key(request: Request) -> str:
+        """Chave: caminho do endpoint + parâmetros de consulta ordenados"""
+        params = sorted(request.query_params.multi_items())
+        return f"{request.url.path}?{'&'.join(f'{k}={v}' for k, v in params)}"
+
+    def _get(self, key: str):
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        if entry.expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, entry: CachedResponse):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        for tag in entry.tags:
+            self._tag_index.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+
+    def _generation(self, tags: Set[str]) -> Tuple:
+        return (self._clears, *(self._generations.get(tag, 0) for tag in sorted(tags)))
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            for tag in entry.tags:
+                keys = self._tag_index.get(tag)
+                if keys:
+                    keys.discard(key)
+
+    async def get_or_load(self,
+                          key: str,
+                          tags: Iterable[str],
+                          loader: Callable[[], Awaitable]) -> CachedResponse:
+        """Retorna resposta em cache ou executa uma única consulta por chave"""
+        entry = self._get(key)
+        if entry:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+
+        inflight = self._inflight.get(key)
+        if inflight:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # Requisição líder cancelada (cliente desconectou): esta assume a consulta
+                return await self.get_or_load(key, tags, loader)
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        tags = set(tags)
+        generation = self._generation(tags)
+
+        try:
+            entry = CachedResponse(serialize(await loader()), tags, self.ttl)
+            future.set_result(entry)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            # Cancelamento do líder: libera quem aguarda em vez de deixá-los presos
+            if not future.done():
+                future.cancel()
+
+        if generation == self._generation(tags):
+            self._store(key, entry)
+
+        return entry
+
+    async def respond(self,
+                      request: Request,
+                      tags: Iterable[str],
+                      loader: Callable[[], Awaitable]) -> Response:
+        """Responde com cache, ETag e 304 quando o cliente já tem a versão atual"""
+        entry = await self.get_or_load(self.make_key(request), tags, loader)
+        headers = {'ETag': entry.etag, 'Cache-Control': 'no-cache'}
+
+        if_none_match = request.headers.get('if-none-match', '')
+        if entry.etag in [tag.strip() for tag in if_none_match.split(',')]:
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        return Response(content=entry.body, media_type='application/json', headers=headers)
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        """Remove respostas que dependem das tags informadas"""
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in list(self._tag_index.pop(tag, ())):
+                self._remove(key)
+
+    def on_database_write(self, collection: str, document: Dict):
+        """Listener de escrita do DatabaseManager"""
+        self.invalidate_tags([collection])
+
+    def clear(self):
+        """Remove todas as respostas em cache"""
+        self._clears += 1
+        self._entries.clear()
+        self._tag_index.clear()
+
+    def get_stats(self) -> Dict:
+        """Estatísticas do cache"""
+        return {
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified
+        }
@@ -0,0 +1,354 @@
+"""
+Busca Textual e por Facetas em Mensagens e Oportunidades (índice invertido em memória)
+"""
+
+import asyncio
+import re
+import time
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+import logging
+
+import numpy as np
+from pymongo import ASCENDING
+
+from config import SEARCH_MAX_PAGE_SIZE, SEARCH_FACET_LIMIT, SEARCH_BUILD_BATCH_SIZE
+from message_parser import canonical_program, fold_accents, parse_quantity
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)*k?|[a-z]+")
+QUANTITY_PATTERN = re.compile(r"\d{1,3}(?:\.\d{3})+|\d+(?:[.,]\d+)?k")
+
+STOPWORDS = frozenset("""
+a ao aos as com da das de do dos e em na nas no nos o os ou para pela pelo por que se um uma
+""".split())
+
+FACETS = ('program', 'side', 'channel', 'kind')
+KINDS = ('message', 'opportunity')
+EPOCH = date(1970, 1, 1)
+
+def _stem(token: str) -> str:
+    """Plural simples do português (milhas -> milha, passagens -> passagem, valores -> valor)"""
+    if len(token) > 4 and token.endswith('ns'):
+        return token[:-2] + 'm'
+    if len(token) > 4 and token.endswith('es') and token[-3] in 'rsz':
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """Tokens sem acentos e sem stopwords; quantidades na forma canônica (100k = 100.000 = 100000)"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(fold_accents(text or '')):
+        if token[0].isdigit():
+            quantity = parse_quantity(token) if QUANTITY_PATTERN.fullmatch(token) else None
+            tokens.append(str(quantity) if quantity else token)
+        elif len(token) > 1 and token not in STOPWORDS:
+            tokens.append(_stem(token))
+    return tokens
+
+class _Codes:
+    """Valores de faceta <-> códigos inteiros (0 = ausente)"""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        if not value:
+            return 0
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str) -> int:
+        return self._codes.get(value, -1)
+
+class _IndexState:
+    """Estruturas do índice: postings por token e colunas de facetas por documento"""
+
+    def __init__(self):
+        self.postings: Dict[str, array] = {}
+        self.keys: List[str] = []
+        self.doc_ids: Dict[str, int] = {}
+        self.timestamps = array('q')
+        self.days = array('i')
+        self.columns = {facet: array('h') for facet in FACETS}
+        self.codes = {facet: _Codes() for facet in FACETS}
+        for kind in KINDS:
+            self.codes['kind'].code(kind)
+
+    def add(self, key: str, text: str, facets: Dict[str, Optional[str]], timestamp: Optional[datetime]) -> bool:
+        if key in self.doc_ids:
+            return False
+
+        doc_id = len(self.keys)
+        self.keys.append(key)
+        self.doc_ids[key] = doc_id
+
+        timestamp = timestamp or datetime.now()
+        self.timestamps.append(int(timestamp.timestamp()))
+        self.days.append((timestamp.date() - EPOCH).days)
+        for facet in FACETS:
+            self.columns[facet].append(self.codes[facet].code(facets.get(facet)))
+
+        # Postings crescentes: ids são atribuídos em ordem
+        for token in set(tokenize(text)):
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = array('i')
+            postings.append(doc_id)
+        return True
+
+def _message_document(message: Dict):
+    offer = message.get('offer') or {}
+    return (
+        f"m:{message['channel']}:{message['message_id']}",
+        message.get('text') or '',
+        {
+            'program': canonical_program(offer.get('program')),
+            'side': offer.get('side'),
+            'channel': message.get('channel'),
+            'kind': 'message'
+        },
+        message.get('processed_at')
+    )
+
+def _opportunity_document(opportunity: Dict):
+    offer = opportunity.get('offer') or {}
+    analysis = opportunity.get('analysis') or {}
+    source = opportunity.get('source') or {}
+    return (
+        f"o:{opportunity['id']}",
+        ' '.join(filter(None, [opportunity.get('summary'), analysis.get('program'), offer.get('program')])),
+        {
+            'program': canonical_program(offer.get('program') or analysis.get('program')),
+            'side': offer.get('side') or analysis.get('opportunity_type'),
+            'channel': source.get('channel'),
+            'kind': 'opportunity'
+        },
+        opportunity.get('created_at')
+    )
+
+MESSAGE_PROJECTION = {'_id': 0, 'channel': 1, 'message_id': 1, 'text': 1, 'offer': 1, 'processed_at': 1}
+OPPORTUNITY_PROJECTION = {
+    '_id': 0, 'id': 1, 'summary': 1, 'offer': 1, 'analysis.program': 1,
+    'analysis.opportunity_type': 1, 'source.channel': 1, 'created_at': 1
+}
+
+class SearchIndex:
+    def __init__(self, db):
+        self.db = db
+        self.state = _IndexState()
+        self.ready = False
+        self._building = False
+        # Remoção durante uma reconstrução: o estado novo pode conter documentos já apagados
+        self._rebuild_requested = False
+        # Escritas recebidas durante uma reconstrução (aplicadas ao novo estado)
+        self._pending: List[tuple] = []
+        self.built_at: Optional[datetime] = None
+        self.build_seconds: Optional[float] = None
+        self.queries = 0
+
+    async def build(self):
+        """Constrói um índice novo a partir do Mongo e o troca pelo atual"""
+        if self._building:
+            self._rebuild_requested = True
+            return
+        self._building = True
+        try:
+            # Repete enquanto chegarem remoções durante a construção
+            while True:
+                self._rebuild_requested = False
+                await self._build_once()
+                if not self._rebuild_requested:
+                    break
+        finally:
+            self._building = False
+
+    async def _build_once(self):
+        started = time.monotonic()
+        state = _IndexState()
+
+        try:
+            sources = [
+                (self.db.telegram_messages, {'message_id': {'$exists': True}, 'text': {'$nin': [None, '']}},
+                 MESSAGE_PROJECTION, 'processed_at', _message_document),
+                (self.db.opportunities, {'id': {'$exists': True}},
+                 OPPORTUNITY_PROJECTION, 'created_at', _opportunity_document)
+            ]
+            for collection, query, projection, time_field, to_document in sources:
+                cursor = collection.find(query, projection).sort(time_field, ASCENDING).batch_size(SEARCH_BUILD_BATCH_SIZE)
+                count = 0
+                async for document in cursor:
+                    state.add(*to_document(document))
+                    count += 1
+                    # Cede o event loop durante a carga
+                    if count % SEARCH_BUILD_BATCH_SIZE == 0:
+                        await asyncio.sleep(0)
+
+            for document in self._pending:
+                state.add(*document)
+
+            self.state = state
+            self.ready = True
+            self.built_at = datetime.now()
+            self.build_seconds = round(time.monotonic() - started, 2)
+            logger.info(f"Índice de busca construído: {len(state.keys)} documentos, "
+                        f"{len(state.postings)} termos em {self.build_seconds}s")
+
+        except Exception as e:
+            logger.error(f"Erro ao construir índice de busca: {e}")
+        finally:
+            self._pending = []
+
+    def on_database_write(self, collection: str, document: Dict):
+        """Listener de escrita: indexa mensagens e oportunidades novas"""
+        if document.get('status') == 'deleted':
+            # Limpeza em massa: reconstrói para remover documentos apagados
+            asyncio.get_running_loop().create_task(self.build())
+            return
+
+        if collection == 'telegram_messages' and document.get('message_id') is not None and document.get('text'):
+            entry = _message_document(document)
+        elif collection == 'opportunities' and document.get('id') and 'summary' in document:
+            entry = _opportunity_document(document)
+        else:
+            return
+
+        self.state.add(*entry)
+        if self._building:
+            self._pending.append(entry)
+
+    def _match(self, tokens: List[str]) -> np.ndarray:
+        """Documentos com todos os termos: interseção a partir da menor lista de postings"""
+        state = self.state
+        total = len(state.keys)
+        if not tokens:
+            return np.arange(total, dtype=np.int32)
+
+        lists = []
+        for token in set(tokens):
+            postings = state.postings.get(token)
+            if not postings:
+                return np.empty(0, dtype=np.int32)
+            lists.append(postings)
+        lists.sort(key=len)
+
+        candidates = np.array(lists[0], dtype=np.int32)
+        for postings in lists[1:]:
+            other = np.frombuffer(postings, dtype=np.int32)
+            positions = np.searchsorted(other, candidates)
+            positions[positions == len(other)] = 0
+            candidates = candidates[other[positions] == candidates]
+            if not len(candidates):
+                break
+        return candidates
+
+    def search(self,
+               query: str = '',
+               filters: Optional[Dict[str, str]] = None,
+               date_from: Optional[date] = None,
+               date_to: Optional[date] = None,
+               page: int = 1,
+               page_size: int = 20) -> Dict:
+        """Chaves da página, total e contagens por faceta (síncrono: o índice não muda no meio)"""
+        started = time.perf_counter()
+        self.queries += 1
+        state = self.state
+        page_size = max(1, min(page_size, SEARCH_MAX_PAGE_SIZE))
+
+        candidates = self._match(tokenize(query))
+
+        # Filtros por faceta e data sobre as colunas
+        for facet, value in (filters or {}).items():
+            if value and len(candidates):
+                code = state.codes[facet].lookup(canonical_program(value) or value if facet == 'program' else value)
+                column = np.array(state.columns[facet], dtype=np.int16)
+                candidates = candidates[column[candidates] == code]
+
+        days = np.array(state.days, dtype=np.int32)
+        if date_from and len(candidates):
+            candidates = candidates[days[candidates] >= (date_from - EPOCH).days]
+        if date_to and len(candidates):
+            candidates = candidates[days[candidates] <= (date_to - EPOCH).days]
+
+        facets = {}
+        for facet in FACETS:
+            column = np.array(state.columns[facet], dtype=np.int16)
+            counts = np.bincount(column[candidates], minlength=len(state.codes[facet].values))
+            order = np.argsort(-counts[1:], kind='stable')[:SEARCH_FACET_LIMIT] + 1
+            facets[facet] = {state.codes[facet].values[code]: int(counts[code]) for code in order if counts[code]}
+
+        day_values, day_counts = np.unique(days[candidates], return_counts=True)
+        facets['date'] = {
+            (EPOCH + timedelta(days=int(day))).isoformat(): int(count)
+            for day, count in list(zip(day_values, day_counts))[::-1][:SEARCH_FACET_LIMIT]
+        }
+
+        # Mais recentes primeiro
+        timestamps = np.array(state.timestamps, dtype=np.int64)[candidates]
+        start = (page - 1) * page_size
+        if len(candidates) > start + page_size:
+            top = np.argpartition(-timestamps, start + page_size - 1)[:start + page_size]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-timestamps[top], kind='stable')][start:start + page_size]
+
+        return {
+            'total': int(len(candidates)),
+            'page': page,
+            'page_size': page_size,
+            'keys': [state.keys[int(doc_id)] for doc_id in candidates[top]],
+            'facets': facets,
+            'took_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+
+    async def fetch(self, keys: List[str]) -> List[Dict]:
+        """Documentos da página no Mongo, na ordem das chaves"""
+        messages = []
+        opportunities = []
+        for key in keys:
+            kind, _, rest = key.partition(':')
+            if kind == 'm':
+                channel, _, message_id = rest.rpartition(':')
+                messages.append({'channel': channel, 'message_id': int(message_id)})
+            else:
+                opportunities.append(rest)
+
+        found = {}
+        if messages:
+            cursor = self.db.telegram_messages.find(
+                {'$or': messages},
+                {'_id': 0, 'channel': 1, 'message_id': 1, 'author': 1, 'text': 1, 'offer': 1, 'processed_at': 1}
+            )
+            async for message in cursor:
+                found[f"m:{message['channel']}:{message['message_id']}"] = {'kind': 'message', **message}
+        if opportunities:
+            from database import OPPORTUNITY_CARD_PROJECTION
+            cursor = self.db.opportunities.find(
+                {'id': {'$in': opportunities}},
+                {**OPPORTUNITY_CARD_PROJECTION, 'status': 1, 'created_at': 1}
+            )
+            async for opportunity in cursor:
+                found[f"o:{opportunity['id']}"] = {'kind': 'opportunity', **opportunity}
+
+        # Documentos apagados desde a indexação ficam de fora
+        return [found[key] for key in keys if key in found]
+
+    def get_stats(self) -> Dict:
+        return {
+            'ready': self.ready,
+            'building': self._building,
+            'documents': len(self.state.keys),
+            'terms': len(self.state.postings),
+            'built_at': self.built_at.isoformat() if self.built_at else None,
+            'build_seconds': self.build_seconds,
+            'queries': self.queries
+        }
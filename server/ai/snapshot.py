@@ -0,0 +1,196 @@
+"""
+Snapshots do Estado em Memória para Reinícios Rápidos (warm start)
+
+Formato binário: cabeçalho fixo + JSON com os metadados das seções + payloads
+alinhados à granularidade do mmap, mapeados sem cópia quando possível.
+"""
+
+import asyncio
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+import logging
+
+import orjson
+
+from config import SNAPSHOT_DIR, SNAPSHOT_INTERVAL, SNAPSHOT_MAX_AGE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SSMSNAP\x00'
+SNAPSHOT_FORMAT_VERSION = 1
+# magic, versão do formato, tamanho do cabeçalho JSON, crc32 do cabeçalho
+PREFIX = struct.Struct('<8sIII')
+ALIGNMENT = mmap.ALLOCATIONGRANULARITY
+
+# dump() -> (metadados, payload); restore(metadados, payload, criado_em) -> restaurou?
+Dump = Callable[[], Tuple[Dict, bytes]]
+Restore = Callable[[Dict, object, float], bool]
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def json_section(state) -> Tuple[Dict, bytes]:
+    """Seção simples: estado serializado em JSON"""
+    return {}, orjson.dumps(state, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+def read_json(payload):
+    return orjson.loads(bytes(payload))
+
+def write_snapshot(path: str, sections: Dict[str, Tuple[Dict, bytes]]):
+    """Grava o snapshot de forma atômica (arquivo temporário + rename)"""
+    offset = 0
+    index = {}
+    for name, (meta, payload) in sections.items():
+        index[name] = {
+            'meta': meta,
+            'length': len(payload),
+            'crc32': zlib.crc32(payload),
+            # Deslocamento relativo ao início da área de dados
+            'offset': offset
+        }
+        offset = _aligned(offset + len(payload))
+
+    header = orjson.dumps({'created_at': time.time(), 'sections': index})
+    data_start = _aligned(PREFIX.size + len(header))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(PREFIX.pack(MAGIC, SNAPSHOT_FORMAT_VERSION, len(header), zlib.crc32(header)))
+        f.write(header)
+        for name, (_, payload) in sections.items():
+            f.seek(data_start + index[name]['offset'])
+            f.write(payload)
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+class Snapshot:
+    """Snapshot aberto para leitura: payloads mapeados em memória (cópia na escrita)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, header_length, header_crc = PREFIX.unpack(f.read(PREFIX.size))
+            if magic != MAGIC:
+                raise ValueError("arquivo não é um snapshot")
+            if version != SNAPSHOT_FORMAT_VERSION:
+                raise ValueError(f"versão de formato {version} (esperada {SNAPSHOT_FORMAT_VERSION})")
+
+            header = f.read(header_length)
+            if zlib.crc32(header) != header_crc:
+                raise ValueError("cabeçalho corrompido")
+
+        header = orjson.loads(header)
+        self.created_at: float = header['created_at']
+        self.sections: Dict[str, Dict] = header['sections']
+        self._data_start = _aligned(PREFIX.size + header_length)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+    def payload(self, name: str):
+        """Payload da seção (mmap privado no POSIX; bytearray nos demais); None se inválido"""
+        section = self.sections[name]
+        offset = self._data_start + section['offset']
+        length = section['length']
+
+        with open(self.path, 'rb') as f:
+            if length and os.name == 'posix':
+                # Mapeamento privado: alterações não voltam ao arquivo e o rename
+                # do próximo snapshot não afeta as páginas já mapeadas
+                payload = mmap.mmap(f.fileno(), length, offset=offset, access=mmap.ACCESS_COPY)
+            else:
+                f.seek(offset)
+                payload = bytearray(f.read(length))
+
+        if len(payload) != length or zlib.crc32(payload) != section['crc32']:
+            logger.warning(f"Seção '{name}' do snapshot corrompida")
+            return None
+        return payload
+
+class SnapshotManager:
+    def __init__(self, name: str, base_dir: str = SNAPSHOT_DIR, max_age: int = SNAPSHOT_MAX_AGE):
+        self.path = os.path.join(base_dir, f"{name}.snap")
+        self.max_age = max_age
+        self._providers: Dict[str, Tuple[Dump, Restore]] = {}
+
+        self.restored: Dict[str, bool] = {}
+        self.loaded_age: Optional[float] = None
+        self.last_saved_at: Optional[float] = None
+        self.last_save_seconds: Optional[float] = None
+
+    def register(self, name: str, dump: Dump, restore: Restore):
+        """Registra uma estrutura em memória; restauradas na ordem de registro"""
+        self._providers[name] = (dump, restore)
+
+    def load(self) -> Dict[str, bool]:
+        """Restaura as seções do snapshot; seções ausentes ou inválidas ficam para o caminho normal"""
+        self.restored = {name: False for name in self._providers}
+        if not os.path.exists(self.path):
+            return self.restored
+
+        try:
+            snapshot = Snapshot(self.path)
+        except Exception as e:
+            logger.warning(f"Snapshot {self.path} ignorado: {e}")
+            return self.restored
+
+        if snapshot.age > self.max_age:
+            logger.info(f"Snapshot {self.path} ignorado: {snapshot.age:.0f}s (máximo {self.max_age}s)")
+            return self.restored
+
+        self.loaded_age = snapshot.age
+        for name, (_, restore) in self._providers.items():
+            if name not in snapshot.sections:
+                continue
+            try:
+                payload = snapshot.payload(name)
+                if payload is not None:
+                    self.restored[name] = bool(restore(snapshot.sections[name]['meta'], payload, snapshot.created_at))
+            except Exception as e:
+                logger.error(f"Erro ao restaurar seção '{name}' do snapshot: {e}")
+
+        logger.info(f"Snapshot restaurado ({snapshot.age:.0f}s): {self.restored}")
+        return self.restored
+
+    def save(self) -> bool:
+        """Grava todas as seções registradas"""
+        started = time.monotonic()
+        try:
+            sections = {}
+            for name, (dump, _) in self._providers.items():
+                try:
+                    sections[name] = dump()
+                except Exception as e:
+                    logger.error(f"Erro ao serializar seção '{name}' do snapshot: {e}")
+
+            write_snapshot(self.path, sections)
+            self.last_saved_at = time.time()
+            self.last_save_seconds = round(time.monotonic() - started, 3)
+            return True
+
+        except Exception as e:
+            logger.error(f"Erro ao gravar snapshot {self.path}: {e}")
+            return False
+
+    async def run(self, interval: int = SNAPSHOT_INTERVAL):
+        """Gravação periódica em background"""
+        while True:
+            await asyncio.sleep(interval)
+            # Síncrono: nenhuma estrutura muda durante a serialização
+            self.save()
+
+    def get_stats(self) -> Dict:
+        return {
+            'path': self.path,
+            'restored': self.restored,
+            'loaded_age': round(self.loaded_age, 1) if self.loaded_age is not None else None,
+            'last_saved_at': self.last_saved_at,
+            'last_save_seconds': self.last_save_seconds
+        }
@@ -11,84 +11,245 @@ from telethon import TelegramClient, events
 from telethon.tl.types import Message
 import logging
 
-from config import TELEGRAM_API_ID, TELEGRAM_API_HASH, TELEGRAM_PHONE, TELEGRAM_CHANNELS
+from config import (
+    TELEGRAM_API_ID, TELEGRAM_API_HASH, TELEGRAM_PHONE, TELEGRAM_CHANNELS,
+    LLM_BUDGET_ENABLED, SNAPSHOT_ENABLED, TELEGRAM_RESOLVE_RETRY_INTERVAL
+)
 from ai_analyzer import AIAnalyzer
 from database import DatabaseManager
+from message_parser import extract_raw_data, normalize_offer
+from price_alerts import PriceAlertIndex
+from dedup import MessageDeduplicator
+from llm_budget import LLMBudgetScheduler
+from snapshot import SnapshotManager
+from channel_resolver import ChannelResolver, peer_chat_id
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class TelegramMonitor:
-    def __init__(self):
+    def __init__(self,
+                 db: Optional[DatabaseManager] = None,
+                 ai_analyzer: Optional[AIAnalyzer] = None,
+                 alert_index: Optional[PriceAlertIndex] = None):
         self.client = TelegramClient('session_name', TELEGRAM_API_ID, TELEGRAM_API_HASH)
-        self.ai_analyzer = AIAnalyzer()
-        self.db = DatabaseManager()
+        owns_analyzer = ai_analyzer is None
+        self.ai_analyzer = ai_analyzer or AIAnalyzer()
+        self.db = db or DatabaseManager()
+        self.alert_index = alert_index
+        self.deduplicator = MessageDeduplicator(self.db)
+        # Orçamento global da LLM, priorizando canais que rendem mais oportunidades
+        self.budget_scheduler = LLMBudgetScheduler(self.db) if LLM_BUDGET_ENABLED else None
+        self.ai_analyzer.budget_scheduler = self.budget_scheduler
+        self._budget_task = None
+        # Resolução de canais com cache em disco; despacho por chat_id em um único handler
+        self.resolver = ChannelResolver(self.client)
+        self._channels_by_chat_id: Dict[int, str] = {}
+        self._resolve_task = None
+        
+        # Estado em memória salvo para reinícios rápidos
+        self.snapshots = SnapshotManager('monitor') if SNAPSHOT_ENABLED else None
+        self._snapshot_task = None
+        if self.snapshots:
+            if owns_analyzer:
+                self.snapshots.register('market', self.ai_analyzer.snapshot_section, self.ai_analyzer.restore_section)
+            self.snapshots.register('dedup', self.deduplicator.snapshot_section, self.deduplicator.restore_section)
+            if self.budget_scheduler:
+                self.snapshots.register(
+                    'llm_budget', self.budget_scheduler.snapshot_section, self.budget_scheduler.restore_section
+                )
+        # Chaves (canal, message_id) em processamento neste processo
+        self._inflight = set()
         self.channels_data = {}
         
     async def start(self):
         """Inicia o monitoramento dos canais"""
+        # Warm start antes de conectar; o que não for restaurado segue o caminho normal
+        restored = self.snapshots.load() if self.snapshots else {}
+        self.resolver.cache.load()
+        
         await self.client.start(phone=TELEGRAM_PHONE)
         logger.info("Cliente Telegram conectado!")
         
-        # Configura handlers para cada canal
-        for channel in TELEGRAM_CHANNELS:
-            await self.setup_channel_monitor(channel)
-            
+        if self.alert_index is None:
+            self.alert_index = PriceAlertIndex(self.db)
+            await self.alert_index.load()
+        
+        # Estado de deduplicação e retomada do trabalho interrompido
+        await self.deduplicator.load()
+        if self.budget_scheduler:
+            if not restored.get('llm_budget'):
+                await self.budget_scheduler.load_yields()
+            self._budget_task = asyncio.create_task(self.budget_scheduler.run_refresh_loop())
+        await self.resume_unfinished()
+        
+        # Configura o handler único e resolve os canais em paralelo
+        self.client.add_event_handler(self.dispatch_message, events.NewMessage())
+        await self.setup_channels(TELEGRAM_CHANNELS)
+        if self.resolver.retryable:
+            self._resolve_task = asyncio.create_task(self.retry_failed_channels())
+        
+        if self.snapshots:
+            self.snapshots.save()
+            self._snapshot_task = asyncio.create_task(self.snapshots.run())
+        
         # Inicia o loop de monitoramento
-        await self.client.run_until_disconnected()
-    
-    async def setup_channel_monitor(self, channel_name: str):
-        """Configura monitoramento para um canal específico"""
         try:
-            entity = await self.client.get_entity(channel_name)
-            
-            @self.client.on(events.NewMessage(chats=entity))
-            async def handler(event):
-                await self.process_message(event.message, channel_name)
-                
-            logger.info(f"Monitor configurado para: {channel_name}")
-            
-        except Exception as e:
-            logger.error(f"Erro ao configurar monitor para {channel_name}: {e}")
+            await self.client.run_until_disconnected()
+        finally:
+            for task in (self._snapshot_task, self._budget_task, self._resolve_task):
+                if task:
+                    task.cancel()
+            if self.snapshots:
+                self.snapshots.save()
+    
+    async def setup_channels(self, channels: List[str]):
+        """Resolve canais (cache em disco + get_entity concorrente) e os registra no despacho"""
+        peers = await self.resolver.resolve_all(channels)
+        for channel, peer in peers.items():
+            self._channels_by_chat_id[peer_chat_id(peer)] = channel
+        
+        logger.info(f"Monitor configurado para {len(peers)} canais: {self.resolver.get_stats()}")
+        for channel in channels:
+            if channel in self.resolver.failed:
+                logger.error(f"Erro ao configurar monitor para {channel}: {self.resolver.failed[channel]}")
+    
+    async def retry_failed_channels(self, interval: int = TELEGRAM_RESOLVE_RETRY_INTERVAL):
+        """Tenta novamente os canais não resolvidos (ex.: FLOOD_WAIT longo) até todos entrarem"""
+        while self.resolver.retryable:
+            await asyncio.sleep(interval)
+            await self.setup_channels(list(self.resolver.retryable))
+    
+    async def dispatch_message(self, event):
+        """Handler único: encontra o canal pelo chat_id (custo constante em qualquer número de canais)"""
+        channel = self._channels_by_chat_id.get(event.chat_id)
+        if channel is not None:
+            await self.process_message(event.message, channel)
     
     async def process_message(self, message: Message, channel: str):
         """Processa mensagens recebidas dos canais"""
+        key = (channel, message.id)
+        if key in self._inflight:
+            return
+        
+        self._inflight.add(key)
         try:
+            # Reentregas, reconexões e backfill: não repete análise já feita
+            existing = await self.deduplicator.lookup(channel, message.id)
+            if existing:
+                await self.resume_message(existing)
+                return
+            
             # Extrai dados da mensagem
             message_data = await self.extract_message_data(message, channel)
             
             if message_data:
-                # Analisa com IA
-                analysis = await self.ai_analyzer.analyze_opportunity(message_data)
+                # Registra antes da análise para sobreviver a reinícios
+                await self.db.save_telegram_message(message_data)
+                self.deduplicator.add(channel, message.id)
                 
-                if analysis and analysis.get('is_opportunity', False):
-                    # Salva oportunidade no banco
-                    await self.db.save_opportunity(analysis)
-                    
-                    # Envia notificação
-                    await self.send_notification(analysis)
-                    
-                    logger.info(f"Oportunidade encontrada em {channel}: {analysis['summary']}")
+                await self.analyze_message(message_data)
                     
         except Exception as e:
             logger.error(f"Erro ao processar mensagem: {e}")
+        finally:
+            self._inflight.discard(key)
+    
+    async def analyze_message(self, message_data: Dict):
+        """Alertas de preço + análise de IA de uma mensagem registrada"""
+        # Alertas de preço dos usuários (sem IA); retomadas não notificam de novo
+        if not message_data.get('alerts_sent') and await self.check_price_alerts(message_data):
+            message_data['alerts_sent'] = True
+            await self.db.update_telegram_message(
+                message_data['channel'],
+                message_data['message_id'],
+                {'alerts_sent': True}
+            )
+        
+        # Analisa com IA
+        analysis = await self.ai_analyzer.analyze_opportunity(message_data)
+        
+        if message_data.get('verdict_source') == 'budget':
+            # Descartada pelo orçamento: sem veredito (não entra no treino nem no rendimento)
+            await self.db.update_telegram_message(
+                message_data['channel'],
+                message_data['message_id'],
+                {'status': 'budget_skipped', 'verdict_source': 'budget'}
+            )
+            return
+        
+        if message_data.get('verdict_source') == 'error':
+            # Falha da LLM: fica para nova tentativa (fora do treino, backtest e rendimento)
+            await self.db.update_telegram_message(
+                message_data['channel'],
+                message_data['message_id'],
+                {'status': 'error', 'verdict_source': 'error'}
+            )
+            return
+        
+        # Guarda o veredito: reinício após este ponto não chama a IA de novo
+        await self.db.update_telegram_message(
+            message_data['channel'],
+            message_data['message_id'],
+            {
+                'status': 'analyzed',
+                'opportunity': analysis,
+                'verdict_source': message_data.get('verdict_source')
+            }
+        )
+        
+        await self.finish_message(message_data, analysis)
+    
+    async def finish_message(self, message_data: Dict, analysis: Optional[Dict]):
+        """Salva oportunidade (idempotente), notifica e conclui a mensagem"""
+        if analysis and analysis.get('is_opportunity', False):
+            # Salva oportunidade no banco
+            await self.db.save_opportunity(dict(analysis))
+            
+            # Envia notificação
+            await self.send_notification(analysis)
+            
+            logger.info(f"Oportunidade encontrada em {message_data['channel']}: {analysis['summary']}")
+        
+        await self.db.update_telegram_message(
+            message_data['channel'],
+            message_data['message_id'],
+            {'status': 'processed'}
+        )
+    
+    async def resume_message(self, message_doc: Dict):
+        """Retoma mensagem já registrada conforme seu estado"""
+        status = message_doc.get('status')
+        
+        if status in ('pending', 'error'):
+            await self.analyze_message(message_doc)
+        elif status == 'analyzed':
+            await self.finish_message(message_doc, message_doc.get('opportunity'))
+    
+    async def resume_unfinished(self):
+        """Conclui mensagens interrompidas por reinício"""
+        unfinished = await self.db.get_unfinished_messages()
+        for message_doc in unfinished:
+            key = (message_doc['channel'], message_doc['message_id'])
+            if key in self._inflight:
+                continue
+            
+            self._inflight.add(key)
+            try:
+                await self.resume_message(message_doc)
+            except Exception as e:
+                logger.error(f"Erro ao retomar mensagem {key}: {e}")
+            finally:
+                self._inflight.discard(key)
+        
+        if unfinished:
+            logger.info(f"Mensagens retomadas após reinício: {len(unfinished)}")
     
     async def extract_message_data(self, message: Message, channel: str) -> Optional[Dict]:
         """Extrai dados estruturados da mensagem"""
         text = message.text or ""
         date = message.date
         
-        # Padrões para extrair informações
-        patterns = {
-            'compra': r'(?:compro|buy|compra)\s+(\w+)\s+(\d+(?:\.\d+)?[k]?)\s+(\d+)\s+cpf\s+([r$]?\d+(?:\.\d+)?)',
-            'venda': r'(?:vendo|sell|venda)\s+(\w+)\s+(\d+(?:\.\d+)?[k]?)\s+(\d+)\s+cpf\s+([r$]?\d+(?:\.\d+)?)',
-            'preco_por_mil': r'([r$]?\d+(?:\.\d+)?)\s*/\s*(?:mil|k)',
-            'quantidade': r'(\d+(?:\.\d+)?[k]?)\s*(?:milhas|miles)',
-            'programa': r'(smiles|latam|tudoazul|livelo|iberia|avios)',
-            'cpf': r'(\d+)\s+cpf',
-            'preco_total': r'total[:\s]*([r$]?\d+(?:\.\d+)?)'
-        }
-        
         extracted_data = {
             'channel': channel,
             'message_id': message.id,
@@ -99,10 +260,9 @@ class TelegramMonitor:
         }
         
         # Extrai dados usando regex
-        for key, pattern in patterns.items():
-            match = re.search(pattern, text.lower())
-            if match:
-                extracted_data['raw_data'][key] = match.groups() if len(match.groups()) > 1 else match.group(1)
+        extracted_data['raw_data'] = extract_raw_data(text)
+        # Campos tipados e indexados (preço, quantidade, CPFs, lado, programa)
+        extracted_data['offer'] = normalize_offer(extracted_data['raw_data'])
         
         # Só retorna se tiver dados relevantes
         if extracted_data['raw_data']:
@@ -110,6 +270,39 @@ class TelegramMonitor:
             
         return None
     
+    async def check_price_alerts(self, message_data: Dict) -> int:
+        """Casa a oferta extraída com as regras de alerta de preço; retorna alertas enviados"""
+        if not self.alert_index:
+            return 0
+        
+        offer = message_data.get('offer') or normalize_offer(message_data.get('raw_data') or {})
+        if not offer:
+            return 0
+        
+        sent = 0
+        for alert in self.alert_index.match(offer):
+            await self.send_alert_notification(alert, offer, message_data)
+            sent += 1
+        return sent
+    
+    async def send_alert_notification(self, alert: Dict, offer: Dict, message_data: Dict):
+        """Envia notificação de alerta de preço ao usuário"""
+        notification = {
+            'type': 'price_alert',
+            'user_id': alert.get('user_id'),
+            'alert_id': alert['_id'],
+            'offer': offer,
+            'source': {
+                'channel': message_data.get('channel'),
+                'message_id': message_data.get('message_id'),
+                'text': message_data.get('text')
+            },
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        # Mesmos canais de notificação das oportunidades
+        logger.info(f"Alerta de preço para {notification['user_id']}: {offer['program']} a {offer['price_per_thousand']}")
+    
     async def send_notification(self, analysis: Dict):
         """Envia notificação sobre oportunidade encontrada"""
         notification = {
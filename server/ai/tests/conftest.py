@@ -0,0 +1,13 @@
+"""
+Configuração dos testes do sistema de IA
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Módulos do sistema ficam no diretório pai; configuração antes de importá-los
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+os.environ['SNAPSHOT_ENABLED'] = 'false'
+os.environ['LOCAL_CLASSIFIER_ENABLED'] = 'false'
@@ -0,0 +1,40 @@
+"""
+Testes do gerenciador de banco (preços Decimal sem o codec Decimal128)
+"""
+
+import asyncio
+from decimal import Decimal
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import database
+from message_parser import normalize_offer
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(database, 'AsyncIOMotorClient', AsyncMongoMockClient)
+    return database.DatabaseManager()
+
+def test_client_without_codec_stores_decimal_prices_as_float(db):
+    offer = normalize_offer({'venda': ('smiles', '50k', '2', 'r$16,50')})
+    assert isinstance(offer['price_per_thousand'], Decimal)
+
+    async def main():
+        await db.save_telegram_message({'channel': 'c', 'message_id': 1, 'offer': offer})
+        await db.update_telegram_message('c', 1, {'opportunity': {'offer': offer}})
+        stored = await db.get_telegram_message('c', 1)
+        matched = await db.get_offers(program='smiles', min_price=Decimal('16'), max_price=17)
+        return stored, matched
+
+    stored, matched = asyncio.run(main())
+
+    assert db.decimal128 is False
+    assert stored['offer']['price_per_thousand'] == 16.5
+    assert stored['opportunity']['offer']['total_price'] == 825.0
+    assert [offer['message_id'] for offer in matched] == [1]
+
+def test_real_client_uses_decimal128_codec():
+    manager = database.DatabaseManager()
+    assert manager.decimal128 is True
+    assert manager.db.codec_options.type_registry.codecs
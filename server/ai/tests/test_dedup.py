@@ -0,0 +1,60 @@
+"""
+Testes da deduplicação de mensagens (Bloom filter + Mongo)
+"""
+
+import asyncio
+import time
+
+from dedup import BloomFilter, MessageDeduplicator
+
+class FakeDB:
+    def __init__(self, messages):
+        self.messages = messages
+        self.lookups = 0
+
+    async def iter_message_keys(self, since):
+        for key in self.messages:
+            yield key
+
+    async def get_telegram_message(self, channel, message_id):
+        self.lookups += 1
+        if (channel, message_id) in self.messages:
+            return {'channel': channel, 'message_id': message_id}
+        return None
+
+def test_bloom_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    for i in range(5000):
+        bloom.add(f"c:{i}")
+
+    assert all(f"c:{i}" in bloom for i in range(5000))
+    false_positives = sum(f"outro:{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.03
+
+def test_lookup_skips_mongo_for_new_messages():
+    db = FakeDB([('c', 1), ('c', 2)])
+    dedup = MessageDeduplicator(db, BloomFilter(capacity=1000, error_rate=0.001))
+
+    async def scenario():
+        assert await dedup.load() == 2
+        assert await dedup.lookup('c', 1) == {'channel': 'c', 'message_id': 1}
+        assert await dedup.lookup('c', 99) is None
+
+    asyncio.run(scenario())
+    assert db.lookups == 1
+    assert dedup.duplicates == 1
+    assert dedup.skipped_lookups == 1
+
+def test_snapshot_roundtrip_and_parameter_mismatch():
+    source = MessageDeduplicator(FakeDB([]), BloomFilter(capacity=1000, error_rate=0.01))
+    source.add('c', 7)
+    meta, payload = source.snapshot_section()
+
+    restored = MessageDeduplicator(FakeDB([]), BloomFilter(capacity=1000, error_rate=0.01))
+    assert restored.restore_section(meta, bytearray(payload), time.time())
+    assert restored.make_key('c', 7) in restored.bloom
+    assert restored.restored_at is not None
+
+    # Filtro com outros parâmetros: snapshot descartado
+    other = MessageDeduplicator(FakeDB([]), BloomFilter(capacity=2000, error_rate=0.01))
+    assert not other.restore_section(meta, bytearray(payload), time.time())
@@ -0,0 +1,78 @@
+"""
+Testes do agendador de expiração de oportunidades (min-heap + varredura)
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import database
+import expiry_scheduler
+from expiry_scheduler import OpportunityExpiryScheduler, compute_expires_at, opportunity_ttl
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(database, 'AsyncIOMotorClient', AsyncMongoMockClient)
+    return database.DatabaseManager()
+
+def test_ttl_prefers_program_and_type_keys():
+    assert opportunity_ttl('Livelo', 'venda') == 12 * 3600
+    assert opportunity_ttl('smiles', 'venda') == 4 * 3600
+    assert opportunity_ttl(None, None) == expiry_scheduler.OPPORTUNITY_DEFAULT_TTL
+
+    created_at = datetime(2026, 1, 1)
+    opportunity = {'analysis': {'program': 'smiles', 'opportunity_type': 'compra'}}
+    assert compute_expires_at(opportunity, created_at) == created_at + timedelta(hours=6)
+
+def test_pop_due_returns_expired_in_order_and_keeps_the_rest():
+    scheduler = OpportunityExpiryScheduler(db=None)
+    now = datetime.now()
+    for opportunity_id, minutes in (('c', -1), ('future', 30), ('a', -10), ('b', -5)):
+        scheduler.schedule(opportunity_id, now + timedelta(minutes=minutes))
+
+    assert scheduler.pop_due(now) == ['a', 'b', 'c']
+    assert scheduler.pop_due(now) == []
+    assert scheduler.get_stats()['scheduled'] == 1
+
+def test_tick_expires_heap_entries_and_sweeps_other_writers(db, monkeypatch):
+    monkeypatch.setattr(expiry_scheduler, 'OPPORTUNITY_EXPIRY_SWEEP_EVERY', 2)
+    scheduler = OpportunityExpiryScheduler(db)
+    db.add_write_listener(scheduler.on_database_write)
+    past = datetime.now() - timedelta(minutes=1)
+
+    async def main():
+        # Salva pela API: entra no heap pelo listener de escrita
+        await db.save_opportunity({'id': 'recente', 'analysis': {'program': 'smiles', 'opportunity_type': 'venda'}})
+        # Oportunidades já vencidas: uma conhecida pelo heap, outra gravada por outro processo
+        known = await db.opportunities.insert_one({'id': 'conhecida', 'status': 'active', 'expires_at': past})
+        scheduler.schedule(known.inserted_id, past)
+        await db.opportunities.insert_one({'id': 'externa', 'status': 'active', 'expires_at': past})
+
+        first = await scheduler.tick()
+        second = await scheduler.tick()
+        statuses = {doc['id']: doc['status'] async for doc in db.opportunities.find({}, {'id': 1, 'status': 1})}
+        return first, second, statuses
+
+    first, second, statuses = asyncio.run(main())
+    assert (first, second) == (1, 1)
+    assert statuses == {'recente': 'active', 'conhecida': 'expired', 'externa': 'expired'}
+    assert scheduler.expired_total == 2
+    assert scheduler.get_stats()['scheduled'] == 1
+
+def test_load_active_computes_missing_expiry(db):
+    scheduler = OpportunityExpiryScheduler(db)
+    created_at = datetime.now() - timedelta(hours=5)
+
+    async def main():
+        await db.opportunities.insert_many([
+            {'status': 'active', 'created_at': created_at, 'analysis': {'opportunity_type': 'venda'}},
+            {'status': 'active', 'created_at': created_at, 'analysis': {'program': 'livelo'}},
+            {'status': 'expired', 'created_at': created_at}
+        ])
+        return await scheduler.load_active()
+
+    assert asyncio.run(main()) == 2
+    # Venda (4h) já venceu; livelo (12h) não
+    assert len(scheduler.pop_due()) == 1
@@ -0,0 +1,122 @@
+"""
+Testes do orçamento de chamadas à LLM
+"""
+
+import asyncio
+
+import pytest
+
+import llm_budget
+from ai_analyzer import AIAnalyzer
+from llm_budget import LLMBudgetScheduler
+
+USAGE = {'prompt_tokens': 800, 'completion_tokens': 200}
+
+class FakeDB:
+    def __init__(self, counts):
+        self.counts = counts
+
+    async def get_channel_yield_counts(self, since):
+        return self.counts
+
+@pytest.fixture(autouse=True)
+def no_sampling(monkeypatch):
+    # Sem amostragem acima do teto: decisões determinísticas
+    monkeypatch.setattr(llm_budget, 'LLM_BUDGET_SAMPLE_RATE', 0.0)
+    monkeypatch.setattr(llm_budget, 'TELEGRAM_CHANNELS', [])
+
+def make_scheduler(counts=None, tokens_per_minute=3000):
+    scheduler = LLMBudgetScheduler(FakeDB(counts or {}), tokens_per_minute=tokens_per_minute, cost_per_minute=0)
+    asyncio.run(scheduler.load_yields())
+    return scheduler
+
+def test_window_admits_until_budget_then_skips():
+    scheduler = make_scheduler()
+
+    async def main():
+        return [await scheduler.acquire('c', max_wait=0) for _ in range(3)]
+
+    first, second, third = asyncio.run(main())
+    assert first is not None and second is not None
+    assert third is None
+    assert scheduler.channel_stats['c']['admitted'] == 2
+    assert scheduler.channel_stats['c']['skipped'] == 1
+
+def test_record_replaces_estimate_and_failures_do_not_count_as_verdicts():
+    scheduler = make_scheduler()
+
+    async def main():
+        ok = await scheduler.acquire('c', max_wait=0)
+        scheduler.record('c', ok, USAGE, True, 0.5)
+        failed = await scheduler.acquire('c', max_wait=0)
+        scheduler.record('c', failed, USAGE, None, 0.5)
+
+    asyncio.run(main())
+    # Janela passa a refletir o uso real (1000 tokens por chamada), não a estimativa
+    assert scheduler._window_tokens == 2000
+    assert scheduler.total_tokens == 2000
+    # Só a chamada com veredito entra no rendimento do canal
+    assert scheduler._counts('c') == {'messages': 1, 'opportunities': 1}
+
+def test_low_yield_channel_is_capped_below_full_budget():
+    scheduler = make_scheduler({
+        'bom': {'messages': 100, 'opportunities': 50},
+        'ruim': {'messages': 100, 'opportunities': 0}
+    }, tokens_per_minute=6000)
+
+    async def main():
+        low = [await scheduler.acquire('ruim', max_wait=0) for _ in range(4)]
+        high = [await scheduler.acquire('bom', max_wait=0) for _ in range(4)]
+        return low, high
+
+    low, high = asyncio.run(main())
+    # 'ruim' chega só a LOW_YIELD_SHARE (mais a suavização); 'bom' usa o restante
+    assert sum(r is not None for r in low) == 2
+    assert sum(r is not None for r in high) == 2
+    assert scheduler.priority('bom') == 1.0
+
+def test_external_usage_occupies_the_window():
+    scheduler = make_scheduler()
+    scheduler.record_external('manual_analysis', {'prompt_tokens': 2000, 'completion_tokens': 500}, 1.0)
+
+    assert scheduler._window_tokens == 2500
+    assert scheduler._counts('manual_analysis') == {'messages': 0, 'opportunities': 0}
+    assert asyncio.run(scheduler.acquire('c', max_wait=0)) is None
+
+def test_manual_analysis_goes_through_the_budget(monkeypatch):
+    analyzer = AIAnalyzer()
+    scheduler = analyzer.budget_scheduler = make_scheduler(tokens_per_minute=1500)
+    # Sem espera por orçamento no teste
+    acquire = scheduler.acquire
+    monkeypatch.setattr(scheduler, 'acquire', lambda channel, ceiling=None: acquire(channel, 0, ceiling))
+
+    async def call_openai(context, raise_errors=False, usage=None):
+        usage.update(USAGE)
+        return {'is_opportunity': False}
+
+    monkeypatch.setattr(analyzer, '_call_openai_analysis', call_openai)
+
+    async def main():
+        first, second = {'text': 'a', 'channel': 'manual_analysis'}, {'text': 'b', 'channel': 'manual_analysis'}
+        await analyzer.analyze_opportunity(first)
+        await analyzer.analyze_opportunity(second)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first['verdict_source'] == 'llm'
+    assert second['verdict_source'] == 'budget'
+    assert analyzer.budget_scheduler.total_tokens == 1000
+    assert analyzer.budget_scheduler._counts('manual_analysis')['messages'] == 0
+
+def test_usage_is_forwarded_without_local_scheduler(monkeypatch):
+    analyzer = AIAnalyzer()
+    forwarded = []
+    analyzer.usage_listener = lambda channel, usage, elapsed: forwarded.append((channel, usage))
+
+    async def call_openai(context, raise_errors=False, usage=None):
+        usage.update(USAGE)
+        return None
+
+    monkeypatch.setattr(analyzer, '_call_openai_analysis', call_openai)
+    asyncio.run(analyzer.analyze_opportunity({'text': 'a', 'channel': 'manual_analysis'}))
+    assert forwarded == [('manual_analysis', USAGE)]
@@ -0,0 +1,70 @@
+"""
+Testes do classificador local de oportunidades
+"""
+
+import asyncio
+import random
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import database
+import local_classifier
+from local_classifier import LocalClassifier, split_samples, train
+
+PROGRAMS = {'smiles': 16.5, 'latam': 24.0, 'tudoazul': 22.0}
+
+def make_samples(count: int, seed: int = 1):
+    """Ofertas de venda são oportunidades; conversas e pedidos de compra não"""
+    rng = random.Random(seed)
+    samples = []
+    for i in range(count):
+        if rng.random() < 0.5:
+            program = rng.choice(list(PROGRAMS))
+            side = rng.choice(['vendo', 'compro'])
+            price = round(PROGRAMS[program] * rng.uniform(0.7, 1.2), 2)
+            samples.append((f"{side} {program} {rng.choice([20, 50, 100])}k {rng.randint(1, 3)} cpf r${price} #{i}",
+                            int(side == 'vendo')))
+        else:
+            samples.append((f"{rng.choice(['bom dia', 'alguem sabe', 'obrigado pessoal'])} galera #{i}", 0))
+    return samples
+
+def test_split_is_stable_and_disjoint():
+    samples = make_samples(2000)
+    train_set, calibration_set, test_set = split_samples(samples)
+
+    assert len(train_set) + len(calibration_set) + len(test_set) == len(samples)
+    assert not {text for text, _ in train_set} & {text for text, _ in test_set}
+    # Novos exemplos não mudam a partição dos antigos
+    assert set(split_samples(samples + make_samples(500, seed=2))[2]) >= set(test_set)
+
+def test_train_agrees_with_labels():
+    model, report = train(make_samples(5000))
+
+    assert report['agreement'] > 0.95
+    assert report['missed_opportunities'] == 0
+    assert model.predict('vendo smiles 50k 1 cpf r$14')['is_opportunity']
+    assert not model.predict('bom dia galera')['is_opportunity']
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(database, 'AsyncIOMotorClient', AsyncMongoMockClient)
+    return database.DatabaseManager()
+
+def test_retrain_runs_in_worker_process_and_activates_model(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(local_classifier, 'LOCAL_CLASSIFIER_MIN_SAMPLES', 100)
+    monkeypatch.setattr(local_classifier, 'LOCAL_CLASSIFIER_MIN_AGREEMENT', 0.9)
+    samples = make_samples(3000)
+
+    async def main():
+        await db.telegram_messages.insert_many([
+            {'text': text, 'status': 'processed', 'processed_at': i,
+             'opportunity': {'is_opportunity': bool(label)}}
+            for i, (text, label) in enumerate(samples)
+        ])
+        return await local_classifier.retrain(db, path=str(tmp_path / 'model.npz'))
+
+    report = asyncio.run(main())
+
+    assert report['agreement'] > 0.95
+    assert LocalClassifier.load(str(tmp_path / 'model.npz')) is not None
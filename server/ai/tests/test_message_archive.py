@@ -0,0 +1,59 @@
+"""
+Testes do arquivamento em Parquet e da limpeza de dados antigos
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import database
+from message_archive import MessageArchive
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(database, 'AsyncIOMotorClient', AsyncMongoMockClient)
+    return database.DatabaseManager()
+
+async def seed(db):
+    old = datetime.now() - timedelta(days=120)
+    await db.telegram_messages.insert_many([
+        {'channel': 'c', 'message_id': i, 'text': f'msg {i}', 'processed_at': old} for i in range(3)
+    ])
+    await db.ai_analyses.insert_one({'type': 'opportunity', 'data': {}, 'created_at': old})
+
+def test_archive_then_cleanup_keeps_nothing_unarchived(db, tmp_path):
+    archive = MessageArchive(db, str(tmp_path))
+
+    async def main():
+        await seed(db)
+        result = await archive.archive_old_data(90)
+        await db.cleanup_old_data(90, skip=result['failed'])
+        return result
+
+    result = asyncio.run(main())
+    assert result == {'archived': {'telegram_messages': 3, 'ai_analyses': 1}, 'failed': {}}
+    assert archive.scan('telegram_messages').num_rows == 3
+
+def test_failed_archive_skips_cleanup_of_that_collection(db, tmp_path, monkeypatch):
+    archive = MessageArchive(db, str(tmp_path))
+
+    def broken_flush(collection, time_field, rows):
+        if collection == 'telegram_messages':
+            raise OSError('disco cheio')
+        return MessageArchive._flush_chunk(archive, collection, time_field, rows)
+
+    monkeypatch.setattr(archive, '_flush_chunk', broken_flush)
+
+    async def main():
+        await seed(db)
+        result = await archive.archive_old_data(90)
+        await db.cleanup_old_data(90, skip=result['failed'])
+        return result, await db.telegram_messages.count_documents({})
+
+    result, remaining = asyncio.run(main())
+    assert result['failed'] == {'telegram_messages': 'disco cheio'}
+    assert result['archived'] == {'ai_analyses': 1}
+    # Mensagens não arquivadas continuam no Mongo
+    assert remaining == 3
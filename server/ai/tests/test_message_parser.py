@@ -0,0 +1,64 @@
+"""
+Testes da normalização de ofertas extraídas das mensagens
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from message_parser import normalize_offer, offer_from_analysis, parse_price, parse_quantity
+
+@pytest.mark.parametrize('value, expected', [
+    ('50k', 50000),
+    ('1.5k', 1500),
+    ('1,5k', 1500),
+    ('83000', 83000),
+    ('100.000', 100000),
+    (' 20K ', 20000),
+    (None, None),
+    ('abc', None),
+    ('NaN', None),
+    ('inf', None),
+    ('-Infinity', None),
+])
+def test_parse_quantity(value, expected):
+    assert parse_quantity(value) == expected
+
+@pytest.mark.parametrize('value, expected', [
+    ('r$16', Decimal('16')),
+    ('$16.5', Decimal('16.5')),
+    ('16,50', Decimal('16.50')),
+    ('R$ 0,80', Decimal('0.80')),
+    (None, None),
+    ('grátis', None),
+    ('nan', None),
+    ('inf', None),
+])
+def test_parse_price(value, expected):
+    assert parse_price(value) == expected
+
+def test_normalize_offer_computes_total():
+    offer = normalize_offer({'venda': ('smiles', '50k', '2', 'r$16,50')})
+    assert offer == {
+        'side': 'venda',
+        'program': 'smiles',
+        'quantity': 50000,
+        'price_per_thousand': Decimal('16.50'),
+        'cpf_count': 2,
+        'total_price': Decimal('825.0')
+    }
+
+def test_offer_from_analysis_converts_price_per_mile():
+    offer = offer_from_analysis({'program': 'Gol', 'opportunity_type': 'venda', 'price_per_mile': 0.0165})
+    assert offer['program'] == 'smiles'
+    assert offer['price_per_thousand'] == Decimal('16.5')
+
+def test_offer_from_analysis_prefers_price_per_thousand():
+    offer = offer_from_analysis({'program': 'smiles', 'price_per_thousand': 16.5, 'price_per_mile': 0.0165})
+    assert offer['price_per_thousand'] == Decimal('16.5')
+
+def test_offer_from_analysis_keeps_per_mile_field_already_per_thousand():
+    # Modelo respondeu no campo por milha com o valor do milheiro (unidade do contexto de mercado)
+    assert offer_from_analysis({'program': 'smiles', 'price_per_mile': 16.5})['price_per_thousand'] == Decimal('16.5')
+    assert offer_from_analysis({'program': 'livelo', 'price_per_mile': 0.8})['price_per_thousand'] == Decimal('0.8')
+    assert offer_from_analysis({'program': 'livelo', 'price_per_mile': 0.0008})['price_per_thousand'] == Decimal('0.8')
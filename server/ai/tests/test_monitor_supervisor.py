@@ -0,0 +1,40 @@
+"""
+Testes do supervisor do processo do monitor
+"""
+
+import os
+
+import monitor_supervisor
+from monitor_supervisor import MonitorSupervisor
+
+class DeadProcess:
+    def __init__(self, *args, **kwargs):
+        self.pid = None
+        self.closed = False
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return False
+
+    def close(self):
+        self.closed = True
+
+def test_respawn_closes_previous_pipe(monkeypatch):
+    supervisor = MonitorSupervisor()
+    monkeypatch.setattr(supervisor._context, 'Process', DeadProcess)
+    monkeypatch.setattr(monitor_supervisor.threading, 'Thread', lambda *args, **kwargs: DeadProcess())
+
+    supervisor._spawn()
+    first_conn, first_process = supervisor._conn, supervisor._process
+    # Descritores abertos (só no Linux)
+    count_descriptors = lambda: len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else None
+    descriptors = count_descriptors()
+
+    for _ in range(5):
+        supervisor._spawn()
+
+    assert first_conn.closed
+    assert first_process.closed
+    assert count_descriptors() == descriptors
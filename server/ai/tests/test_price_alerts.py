@@ -0,0 +1,87 @@
+"""
+Testes do índice de alertas de preço (árvore de intervalos)
+"""
+
+import asyncio
+import random
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import database
+from price_alerts import IntervalIndex, PriceAlertIndex
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(database, 'AsyncIOMotorClient', AsyncMongoMockClient)
+    return database.DatabaseManager()
+
+def test_stab_matches_linear_scan():
+    rng = random.Random(7)
+    index = IntervalIndex()
+    intervals = {}
+    for i in range(300):
+        start = rng.uniform(10, 40)
+        intervals[str(i)] = (start, start + rng.uniform(0, 8))
+        index.add(str(i), *intervals[str(i)], {'id': str(i)})
+
+    # Remoção após a árvore já construída força a reconstrução
+    index.stab(20.0)
+    for key in list(intervals)[::3]:
+        assert index.remove(key)
+        del intervals[key]
+    assert not index.remove('inexistente')
+
+    # Pontas incluídas
+    points = [rng.uniform(5, 50) for _ in range(200)] + [bound for pair in intervals.values() for bound in pair]
+    for point in points:
+        expected = {key for key, (start, end) in intervals.items() if start <= point <= end}
+        assert {value['id'] for value in index.stab(point)} == expected
+
+def test_match_filters_program_side_and_quantity(db):
+    alerts = PriceAlertIndex(db)
+
+    async def scenario():
+        cheap = await alerts.add_alert({'user_id': 'u1', 'program': 'Smiles', 'side': 'venda',
+                                        'min_price': 15.0, 'max_price': 18.0, 'min_quantity': 50000})
+        await alerts.add_alert({'user_id': 'u2', 'program': 'latam', 'side': 'venda',
+                                'min_price': 15.0, 'max_price': 18.0})
+
+        offer = {'program': 'SMILES', 'side': 'venda', 'price_per_thousand': 16.5, 'quantity': 100000}
+        assert [alert['_id'] for alert in alerts.match(offer)] == [cheap]
+        assert alerts.match({**offer, 'quantity': 10000}) == []
+        assert alerts.match({**offer, 'side': 'compra'}) == []
+        assert alerts.match({**offer, 'price_per_thousand': 18.5}) == []
+
+        # Regras persistidas voltam ao recarregar
+        reloaded = PriceAlertIndex(db)
+        assert await reloaded.load() == 2
+        assert [alert['_id'] for alert in reloaded.match(offer)] == [cheap]
+
+        assert await alerts.remove_alert(cheap)
+        assert alerts.match(offer) == []
+
+    asyncio.run(scenario())
+
+def test_add_alert_rejects_invalid_range(db):
+    alerts = PriceAlertIndex(db)
+    with pytest.raises(ValueError):
+        asyncio.run(alerts.add_alert({'user_id': 'u1', 'program': 'smiles', 'side': 'venda',
+                                      'min_price': 20.0, 'max_price': 15.0}))
+    assert len(alerts) == 0
+
+def test_alert_for_alias_matches_canonical_offers(db):
+    alerts = PriceAlertIndex(db)
+
+    async def scenario():
+        alert_id = await alerts.add_alert({'user_id': 'u1', 'program': 'Gol', 'side': 'venda',
+                                           'min_price': 15.0, 'max_price': 18.0})
+        offer = {'program': 'smiles', 'side': 'venda', 'price_per_thousand': 16.0, 'quantity': 50000}
+        assert [alert['_id'] for alert in alerts.match(offer)] == [alert_id]
+        assert alerts.get_user_alerts('u1')[0]['program'] == 'smiles'
+
+        with pytest.raises(ValueError):
+            await alerts.add_alert({'user_id': 'u1', 'program': 'desconhecido', 'side': 'venda',
+                                    'min_price': 15.0, 'max_price': 18.0})
+
+    asyncio.run(scenario())
@@ -0,0 +1,110 @@
+"""
+Testes do cache de recomendações personalizadas
+"""
+
+import asyncio
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from ai_analyzer import AIAnalyzer
+from recommendation_cache import RecommendationCache
+
+PROFILE = {
+    '_id': 'abc',
+    'user_id': 'u1',
+    'preferences': {'programs': ['smiles']},
+    'risk_tolerance': 'moderado',
+    'updated_at': datetime(2026, 1, 1)
+}
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        content = json.dumps({'risk_profile': 'moderado', 'personalized_recommendations': []})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def test_second_view_is_cache_hit_for_saved_profile():
+    analyzer = AIAnalyzer()
+    completions = FakeCompletions()
+    analyzer.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    cache = RecommendationCache()
+
+    async def view():
+        return await cache.get_or_compute('u1', PROFILE, analyzer.market_version,
+                                          analyzer.get_ai_recommendations)
+
+    first = asyncio.run(view())
+    second = asyncio.run(view())
+
+    assert first == second == {'risk_profile': 'moderado', 'personalized_recommendations': []}
+    assert completions.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_compute_receives_profile_without_control_fields():
+    received = []
+
+    async def compute(profile):
+        received.append(profile)
+        return {'ok': True}
+
+    asyncio.run(RecommendationCache().get_or_compute('u1', PROFILE, 1, compute))
+    assert 'updated_at' not in received[0] and '_id' not in received[0]
+
+def test_identical_profiles_coalesce_and_each_user_gets_an_entry():
+    cache = RecommendationCache()
+    calls = 0
+
+    async def compute(profile):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {'ok': True}
+
+    async def main():
+        return await asyncio.gather(*(
+            cache.get_or_compute(f'u{i}', {**PROFILE, 'user_id': None}, 1, compute) for i in range(3)
+        ))
+
+    assert asyncio.run(main()) == [{'ok': True}] * 3
+    assert calls == 1
+    assert set(cache._entries) == {'u0', 'u1', 'u2'}
+
+def test_cancelled_leader_does_not_hang_waiters():
+    cache = RecommendationCache()
+    calls = 0
+
+    async def compute(profile):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {'ok': calls}
+
+    async def main():
+        leader = asyncio.create_task(cache.get_or_compute('u1', PROFILE, 1, compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute('u2', PROFILE, 1, compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.wait_for(waiter, timeout=1)
+
+    # O pedido que aguardava assume o cálculo
+    assert asyncio.run(main()) == {'ok': 2}
+    assert cache.get_stats()['inflight'] == 0
+
+def test_market_version_and_invalidation_change_key():
+    cache = RecommendationCache()
+
+    async def compute(profile):
+        return {'ok': True}
+
+    asyncio.run(cache.get_or_compute('u1', PROFILE, 1, compute))
+    assert cache.get('u1', cache.make_key(PROFILE, 1)) is not None
+    assert cache.get('u1', cache.make_key(PROFILE, 2)) is None
+
+    asyncio.run(cache.get_or_compute('u1', PROFILE, 1, compute))
+    cache.invalidate('u1')
+    assert cache.get('u1', cache.make_key(PROFILE, 1)) is None
@@ -0,0 +1,119 @@
+"""
+Testes do recalculo de oportunidades quando a referência de mercado muda
+"""
+
+import asyncio
+from datetime import datetime
+
+import numpy as np
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import database
+from ai_analyzer import AIAnalyzer
+from market_reference import MarketReferenceUpdater
+from rescorer import OpportunityRescorer, rescore
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(database, 'AsyncIOMotorClient', AsyncMongoMockClient)
+    return database.DatabaseManager()
+
+def wire(db):
+    """Mesma ligação da API: escrita em market_data -> AIAnalyzer -> rescorer"""
+    analyzer = AIAnalyzer()
+    rescorer = OpportunityRescorer(db, analyzer)
+    analyzer.add_market_listener(rescorer.on_market_move)
+
+    def on_write(collection, document):
+        if collection == 'market_data':
+            analyzer.update_market_reference(document['program'], document['avg_price'], document.get('price_range'))
+
+    db.add_write_listener(on_write)
+    return analyzer, rescorer
+
+async def seed(db, market_price: float):
+    now = datetime.now()
+    await db.telegram_messages.insert_many([
+        {'channel': 'c', 'message_id': i, 'processed_at': now,
+         'offer': {'program': 'smiles', 'side': 'venda', 'price_per_thousand': market_price}}
+        for i in range(30)
+    ])
+    await db.opportunities.insert_many([
+        {'id': f'o{i}', 'status': 'active', 'confidence': 0.85,
+         'offer': {'program': 'smiles', 'side': 'venda', 'price_per_thousand': 15.0},
+         'analysis': {'confidence': 0.85, 'market_comparison': {'avg_market_price': 16.5}}}
+        for i in range(5)
+    ])
+
+def test_market_move_past_threshold_rescores_with_bulk_write(db):
+    analyzer, rescorer = wire(db)
+    bulk_writes = []
+
+    async def spy(requests, **kwargs):
+        # bulk_write do mongomock não aceita o UpdateOne do pymongo atual: aplica um a um
+        bulk_writes.append(len(requests))
+        for request in requests:
+            await db.opportunities.update_one(request._filter, request._doc)
+
+    db.opportunities.bulk_write = spy
+
+    async def main():
+        # Mercado caiu de 16,5 para 14: a oferta a 15 deixou de estar abaixo do mercado
+        await seed(db, 14.0)
+        await MarketReferenceUpdater(db).refresh()
+        await rescorer._task
+        return await db.opportunities.find_one({'id': 'o0'})
+
+    opportunity = asyncio.run(main())
+
+    assert analyzer.market_data['smiles']['avg_price'] == 14.0
+    assert bulk_writes == [5]
+    assert opportunity['confidence'] < 0.85
+    assert opportunity['analysis']['market_comparison']['is_below_market'] is False
+    assert opportunity['market_baseline'] == {'confidence': 0.85, 'avg_price': 16.5}
+
+def test_small_move_does_not_rescore(db):
+    analyzer, rescorer = wire(db)
+
+    async def main():
+        await seed(db, 16.6)
+        await MarketReferenceUpdater(db).refresh()
+
+    asyncio.run(main())
+    assert rescorer._task is None
+    assert rescorer.runs == 0
+
+def test_rescore_does_not_compound_and_respects_side():
+    price = np.array([15.0, 15.0])
+    side = np.array([1.0, -1.0])
+    base_confidence = np.array([0.8, 0.8])
+    base_reference = np.array([16.5, 16.5])
+
+    unchanged = rescore(price, side, base_confidence, base_reference, 16.5)
+    assert np.allclose(unchanged['confidence'], 0.8)
+
+    moved = rescore(price, side, base_confidence, base_reference, 14.0)
+    # Venda ficou pior (acima do mercado); compra ficou melhor
+    assert moved['confidence'][0] < 0.8 < moved['confidence'][1]
+
+def test_slow_drift_accumulates_against_last_notified_reference():
+    analyzer = AIAnalyzer()
+    moves = []
+    analyzer.add_market_listener(lambda program, version: moves.append((program, version)))
+
+    # Passos de 2% ficam abaixo do limiar um a um, mas somam mais de 5% contra a âncora
+    price = 16.5
+    for _ in range(3):
+        price *= 1.02
+        analyzer.update_market_reference('smiles', price)
+
+    assert moves == [('smiles', 2)]
+    assert analyzer.market_version == 2
+    # Faixa acompanha o preço quando não é informada
+    low, high = analyzer.market_data['smiles']['price_range']
+    assert low > 14.0 and high > 19.0
+
+    # A âncora passou a ser o preço do aviso: um novo passo pequeno não dispara
+    analyzer.update_market_reference('smiles', price * 1.02)
+    assert len(moves) == 1
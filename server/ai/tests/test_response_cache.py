@@ -0,0 +1,76 @@
+"""
+Testes do cache de respostas HTTP
+"""
+
+import asyncio
+
+from response_cache import ResponseCache
+
+def test_concurrent_requests_share_one_load():
+    cache = ResponseCache()
+    loads = 0
+
+    async def loader():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return {'items': [1, 2]}
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load('/x', ['opportunities'], loader) for _ in range(5)))
+
+    entries = asyncio.run(main())
+    assert loads == 1
+    assert len({entry.etag for entry in entries}) == 1
+
+def test_write_invalidates_dependent_entries():
+    cache = ResponseCache()
+
+    async def loader():
+        return {'items': []}
+
+    asyncio.run(cache.get_or_load('/x', ['opportunities'], loader))
+    asyncio.run(cache.get_or_load('/y', ['market_data'], loader))
+    cache.on_database_write('opportunities', {})
+
+    assert '/x' not in cache._entries
+    assert '/y' in cache._entries
+
+def test_cancelled_leader_does_not_hang_waiters():
+    cache = ResponseCache()
+    loads = 0
+
+    async def loader():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.05)
+        return {'load': loads}
+
+    async def main():
+        leader = asyncio.create_task(cache.get_or_load('/x', ['opportunities'], loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_load('/x', ['opportunities'], loader))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.wait_for(waiter, timeout=1)
+
+    # A requisição que aguardava assume a consulta
+    assert asyncio.run(main()).body == b'{"load":2}'
+    assert not cache._inflight
+
+def test_write_to_unrelated_collection_during_load_still_caches():
+    cache = ResponseCache()
+
+    def loader_writing(collection):
+        async def loader():
+            await asyncio.sleep(0)
+            cache.on_database_write(collection, {})
+            return {'items': []}
+        return loader
+
+    asyncio.run(cache.get_or_load('/x', ['opportunities'], loader_writing('telegram_messages')))
+    assert '/x' in cache._entries
+
+    # Escrita na coleção de que a resposta depende: leitura possivelmente antiga não é guardada
+    asyncio.run(cache.get_or_load('/y', ['opportunities'], loader_writing('opportunities')))
+    assert '/y' not in cache._entries
@@ -0,0 +1,63 @@
+"""
+Testes do índice de busca textual e por facetas
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import database
+import search_index
+from search_index import SearchIndex, tokenize
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(database, 'AsyncIOMotorClient', AsyncMongoMockClient)
+    return database.DatabaseManager()
+
+def message(i, text, program='smiles', side='venda', channel='c1'):
+    return {
+        'channel': channel, 'message_id': i, 'text': text,
+        'offer': {'program': program, 'side': side},
+        'processed_at': datetime(2026, 1, 1) + timedelta(hours=i)
+    }
+
+def test_tokenize_folds_accents_and_canonicalizes_quantities():
+    assert tokenize('Vendo 100k milhas, são 100.000 passagens') == ['vendo', '100000', 'milha', 'sao', '100000', 'passagem']
+
+def test_search_filters_facets_and_pages():
+    index = SearchIndex(None)
+    for i in range(10):
+        index.on_database_write('telegram_messages', message(
+            i, f'vendo {50 if i % 2 else 100}k milhas', side='venda' if i < 6 else 'compra'
+        ))
+
+    result = index.search('milhas 100.000', {'side': 'venda'}, page=1, page_size=2)
+
+    assert result['total'] == 3
+    # Mais recentes primeiro
+    assert result['keys'] == ['m:c1:4', 'm:c1:2']
+    assert result['facets']['side'] == {'venda': 3}
+    assert index.search('milhas 100.000', {'side': 'venda'}, page=2, page_size=2)['keys'] == ['m:c1:0']
+
+def test_deletion_during_build_triggers_another_build(db, monkeypatch):
+    # Cede o event loop a cada documento: a limpeza acontece no meio da leitura
+    monkeypatch.setattr(search_index, 'SEARCH_BUILD_BATCH_SIZE', 1)
+    index = SearchIndex(db)
+    db.add_write_listener(index.on_database_write)
+
+    async def main():
+        await db.telegram_messages.insert_many([message(i, 'vendo smiles') for i in range(3)])
+        build = asyncio.create_task(index.build())
+        await asyncio.sleep(0)
+        assert index._building
+        # Limpeza concluída enquanto a primeira construção ainda lê o banco
+        await db.telegram_messages.delete_many({'message_id': {'$lt': 2}})
+        db.notify_write('telegram_messages', {'status': 'deleted'})
+        await build
+
+    asyncio.run(main())
+
+    assert index.search('smiles')['keys'] == ['m:c1:2']
@@ -0,0 +1,118 @@
+"""
+Testes da retomada de mensagens do monitor do Telegram
+"""
+
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import database
+import telegram_monitor
+from telegram_monitor import TelegramMonitor
+
+class FakeAlertIndex:
+    def __init__(self):
+        self.matched = 0
+
+    def match(self, offer):
+        self.matched += 1
+        return [{'_id': 'a1', 'user_id': 'u1'}]
+
+class CrashingAnalyzer:
+    """Simula queda do processo durante a chamada à IA"""
+    market_data = {}
+    market_version = 1
+    budget_scheduler = None
+
+    def __init__(self):
+        self.calls = 0
+
+    async def analyze_opportunity(self, message_data):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError('reinício')
+        return None
+
+@pytest.fixture
+def monitor(monkeypatch):
+    monkeypatch.setattr(database, 'AsyncIOMotorClient', AsyncMongoMockClient)
+    monkeypatch.setattr(telegram_monitor, 'TelegramClient', lambda *args, **kwargs: None)
+    monkeypatch.setattr(telegram_monitor, 'SNAPSHOT_ENABLED', False)
+    monkeypatch.setattr(telegram_monitor, 'LLM_BUDGET_ENABLED', False)
+    return TelegramMonitor(
+        db=database.DatabaseManager(),
+        ai_analyzer=CrashingAnalyzer(),
+        alert_index=FakeAlertIndex()
+    )
+
+def test_resumed_pending_message_does_not_resend_alerts(monitor, monkeypatch):
+    sent = []
+
+    async def send_alert_notification(alert, offer, message_data):
+        sent.append((alert['_id'], message_data['message_id']))
+
+    monkeypatch.setattr(monitor, 'send_alert_notification', send_alert_notification)
+    message = {
+        'channel': 'c', 'message_id': 1, 'text': 'vendo smiles 50k 1 cpf r$14',
+        'offer': {'program': 'smiles', 'side': 'venda', 'quantity': 50000, 'price_per_thousand': 14.0}
+    }
+
+    async def main():
+        await monitor.db.save_telegram_message(dict(message))
+        stored = await monitor.db.telegram_messages.find_one({'message_id': 1})
+        with pytest.raises(RuntimeError):
+            await monitor.analyze_message(stored)
+
+        # Reinício: a mensagem continua pendente e é retomada
+        await monitor.resume_unfinished()
+        return await monitor.db.telegram_messages.find_one({'message_id': 1})
+
+    stored = asyncio.run(main())
+
+    assert sent == [('a1', 1)]
+    assert stored['alerts_sent'] is True
+    assert stored['status'] == 'processed'
+    assert monitor.ai_analyzer.calls == 2
+
+def test_llm_failure_is_stored_as_error_and_retried(monitor, monkeypatch):
+    from ai_analyzer import AIAnalyzer
+    from backtester import load_verdicts
+    from local_classifier import load_training_data
+
+    analyzer = AIAnalyzer()
+    responses = [None, {'is_opportunity': False}]
+
+    async def call_openai(context, raise_errors=False, usage=None):
+        return responses.pop(0)
+
+    monkeypatch.setattr(analyzer, '_call_openai_analysis', call_openai)
+    monitor.ai_analyzer = analyzer
+    message = {
+        'channel': 'c', 'message_id': 1, 'text': 'vendo smiles 50k 1 cpf r$14',
+        'offer': {'program': 'smiles', 'side': 'venda', 'quantity': 50000, 'price_per_thousand': 14.0}
+    }
+
+    async def main():
+        await monitor.db.save_telegram_message(dict(message))
+        await monitor.analyze_message(await monitor.db.telegram_messages.find_one({'message_id': 1}))
+        failed = await monitor.db.telegram_messages.find_one({'message_id': 1})
+
+        # Falha não vira negativo no treino, no backtest nem no rendimento do canal
+        excluded = (
+            await load_training_data(monitor.db),
+            len((await load_verdicts(monitor.db))['time']),
+            await monitor.db.get_channel_yield_counts(failed['processed_at'])
+        )
+
+        await monitor.resume_unfinished()
+        return failed, excluded, await monitor.db.telegram_messages.find_one({'message_id': 1})
+
+    failed, excluded, retried = asyncio.run(main())
+
+    assert failed['status'] == 'error'
+    assert failed['verdict_source'] == 'error'
+    assert 'opportunity' not in failed
+    assert excluded == ([], 0, {})
+    assert retried['status'] == 'processed'
+    assert retried['verdict_source'] == 'llm'